@@ -1,29 +1,108 @@
 # core/admin.py
-from django.contrib import admin
+from django.contrib import admin, messages
 from django import forms
+from django.conf import settings
 from django.db import models
-from .models import DBFUpload, ExcelUpload, TableTemplate, TableTemplateFieldConfig # Импортируем новые модели
+from django.db.models import Avg, Count, Max, Q, Sum
+from django.template.response import TemplateResponse
+from django.urls import path
+from .models import ChunkedUpload, DBFUpload, ExcelUpload, IngestReject, SavedSearch, TableTemplate, TableTemplateFieldConfig, SlowSearchLog # Импортируем новые модели
+from . import catalog, diagnostics, snapshots
+from .signals import template_changed
+
+@admin.action(description='Выгрузить снимок в Parquet')
+def export_snapshot(modeladmin, request, queryset):
+    """
+    Выгрузка таблиц выбранных загрузок в SNAPSHOT_DIR (core/snapshots.py) в фоновом потоке.
+    """
+    available = set(catalog.get_available_tables())
+    table_names = sorted(set(queryset.values_list('table_name', flat=True)) & available)
+    if not table_names:
+        modeladmin.message_user(request, 'Таблиц выбранных загрузок нет в базе.', messages.WARNING)
+        return
+    snapshots.export_in_background(table_names)
+    modeladmin.message_user(
+        request, f'Выгрузка запущена: {", ".join(table_names)}. Файлы появятся в {settings.SNAPSHOT_DIR}.',
+    )
+
+
+@admin.register(DBFUpload)
+class DBFUploadAdmin(admin.ModelAdmin):
+    list_display = ('table_name', 'filename', 'uploaded_at', 'uploaded_by')
+    list_select_related = ('uploaded_by',)
+    search_fields = ('table_name', 'filename')
+    actions = [export_snapshot]
+
+
+@admin.register(ExcelUpload)
+class ExcelUploadAdmin(admin.ModelAdmin):
+    list_display = ('table_name', 'filename', 'uploaded_at', 'uploaded_by')
+    list_select_related = ('uploaded_by',)
+    search_fields = ('table_name', 'filename')
+    actions = [export_snapshot]
 
-# ... (регистрация DBFUpload, ExcelUpload) ...
 
 class TableTemplateFieldConfigInlineForm(forms.ModelForm):
     """
     Форма для одной строки в Inline (одно поле).
+    Имя столбца выбирается из списка столбцов таблицы (кэшируемый каталог),
+    если таблица шаблона уже известна.
+    """
+    def __init__(self, *args, column_choices=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if column_choices:
+            choices = list(column_choices)
+            # Сохраняем текущее значение, даже если столбца уже нет в таблице (его отметит валидация)
+            current = self.initial.get('field_name')
+            if current and (current, current) not in choices:
+                choices.append((current, current))
+            self.fields['field_name'].widget = forms.Select(choices=[('', '---------')] + choices)
+
+
+class TableTemplateFieldConfigFormSet(forms.BaseInlineFormSet):
+    """
+    Набор строк Inline.
+    Столбцы таблицы запрашиваются один раз на весь набор (из каталога),
+    и все строки проверяются по этому одному списку.
     """
-    # field_name = forms.CharField(widget=forms.TextInput(attrs={'size': '20'})) # Опционально: размер поля
-    # field_label = forms.CharField(widget=forms.TextInput(attrs={'size': '20'})) # Опционально: размер поля
-    pass # Пока без изменений, можно добавить валидацию
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        table_name = self.instance.table_name if self.instance else ''
+        columns = catalog.get_table_columns(table_name) if table_name else []
+        self.column_choices = [(col, col) for col in columns]
+
+    def get_form_kwargs(self, index):
+        kwargs = super().get_form_kwargs(index)
+        kwargs['column_choices'] = self.column_choices
+        return kwargs
+
+    def clean(self):
+        super().clean()
+        # К этому моменту instance уже содержит новое имя таблицы из основной формы
+        table_name = self.instance.table_name
+        columns = set(catalog.get_table_columns(table_name)) # Один запрос (или кэш) на все строки
+        if not columns:
+            raise forms.ValidationError(f'Таблица "{table_name}" не найдена или не содержит столбцов.')
+        for form in self.forms:
+            if not hasattr(form, 'cleaned_data') or form.cleaned_data.get('DELETE'):
+                continue
+            field_name = form.cleaned_data.get('field_name')
+            if field_name and field_name not in columns:
+                form.add_error('field_name', f'Столбца "{field_name}" нет в таблице "{table_name}".')
+
 
 class TableTemplateFieldConfigInline(admin.TabularInline): # Используем TabularInline для табличного вида
     model = TableTemplateFieldConfig
     form = TableTemplateFieldConfigInlineForm
+    formset = TableTemplateFieldConfigFormSet
     extra = 1 # Количество пустых строк для добавления
     # min_num = 0 # Минимальное количество (опционально)
     # max_num = 50 # Максимальное количество (опционально)
 
-    # Фильтры для выбора полей (если бы у нас был способ получить список столбцов таблицы заранее)
-    # forms.CharField не позволяет легко задать список вариантов без динамического изменения формы
-    # Пока оставим как есть, пользователь вводит имя столбца вручную, но мы можем добавить валидацию.
+    def get_queryset(self, request):
+        # __str__ строки обращается к table_template — подгружаем его сразу,
+        # иначе на шаблоне с сотнями полей будет по запросу на строку
+        return super().get_queryset(request).select_related('table_template')
 
     def formfield_for_dbfield(self, db_field, request, **kwargs):
         # Увеличим размер полей ввода
@@ -34,22 +113,33 @@ class TableTemplateFieldConfigInline(admin.TabularInline): # Используе
 class TableTemplateAdminForm(forms.ModelForm):
     """
     Форма для админки TableTemplate.
+    Таблица выбирается из кэшируемого каталога импортированных таблиц.
     """
     class Meta:
         model = TableTemplate
         fields = '__all__'
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        tables = catalog.get_available_tables()
+        choices = [(t, t) for t in sorted(tables)]
+        current = self.instance.table_name
+        if current and current not in tables:
+            choices.append((current, current))
+        self.fields['table_name'].widget = forms.Select(choices=[('', '---------')] + choices)
+
 @admin.register(TableTemplate)
 class TableTemplateAdmin(admin.ModelAdmin):
     form = TableTemplateAdminForm
     inlines = [TableTemplateFieldConfigInline] # Добавляем Inline
     list_display = ('table_name', 'created_at', 'created_by')
+    list_select_related = ('created_by',)
     search_fields = ('table_name',)
     readonly_fields = ('created_at',)
 
     fieldsets = (
         (None, {
-            'fields': ('table_name',)
+            'fields': ('table_name', 'use_projection')
         }),
         ('Автор', {
             'fields': ('created_by',),
@@ -66,6 +156,25 @@ class TableTemplateAdmin(admin.ModelAdmin):
             obj.created_by = request.user
         super().save_model(request, obj, form, change)
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Inline-поля уже сохранены — перестраиваем проекцию и т.п.
+        template_changed.send(sender=TableTemplate, table_name=form.instance.table_name)
+        if change and 'table_name' in form.changed_data:
+            # Шаблон перенесён на другую таблицу — убираем объекты старой
+            template_changed.send(sender=TableTemplate, table_name=form.initial['table_name'])
+
+    def delete_model(self, request, obj):
+        table_name = obj.table_name
+        super().delete_model(request, obj)
+        template_changed.send(sender=TableTemplate, table_name=table_name)
+
+    def delete_queryset(self, request, queryset):
+        table_names = list(queryset.values_list('table_name', flat=True))
+        super().delete_queryset(request, queryset)
+        for table_name in table_names:
+            template_changed.send(sender=TableTemplate, table_name=table_name)
+
     # Опционально: добавить валидацию в форме или в модели
     # def clean(self):
     #     cleaned_data = super().clean()
@@ -75,4 +184,89 @@ class TableTemplateAdmin(admin.ModelAdmin):
     #     # Лучше проверять при сохранении в представлении или модели
     #     return cleaned_data
 
-# ... (если есть другие модели) ...
\ No newline at end of file
+
+@admin.register(SlowSearchLog)
+class SlowSearchLogAdmin(admin.ModelAdmin):
+    """
+    Журнал медленных поисков и страница «худших» комбинаций таблица/поля.
+    """
+    list_display = ('created_at', 'table_name', 'search_fields', 'duration_ms', 'plan_execution_ms', 'rows_returned', 'has_seq_scan', 'user')
+    list_filter = ('has_seq_scan', 'table_name')
+    search_fields = ('table_name', 'search_fields')
+    list_select_related = ('user',)
+    readonly_fields = [f.name for f in SlowSearchLog._meta.fields]
+    change_list_template = 'admin/core/slowsearchlog/change_list.html'
+
+    def has_add_permission(self, request):
+        return False # Записи создаются только фоновым потоком диагностики
+
+    def get_urls(self):
+        urls = [
+            path('worst-offenders/', self.admin_site.admin_view(self.worst_offenders_view), name='core_slowsearchlog_worst_offenders'),
+        ]
+        return urls + super().get_urls()
+
+    def worst_offenders_view(self, request):
+        # Группируем по таблице и набору полей, сортируем по суммарному времени
+        offenders = list(
+            SlowSearchLog.objects.values('table_name', 'search_fields')
+            .annotate(
+                total_ms=Sum('duration_ms'),
+                avg_ms=Avg('duration_ms'),
+                max_ms=Max('duration_ms'),
+                samples=Count('id'),
+                seq_scans=Count('id', filter=Q(has_seq_scan=True)),
+                last_seen=Max('created_at'),
+            )
+            .order_by('-total_ms')[:50]
+        )
+        diagnostics.suggest_indexes(offenders)
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Худшие поиски',
+            'offenders': offenders,
+        }
+        return TemplateResponse(request, 'admin/core/slowsearchlog/worst_offenders.html', context)
+
+@admin.register(SavedSearch)
+class SavedSearchAdmin(admin.ModelAdmin):
+    """
+    Сохранённые поиски пользователей. Снимки строит команда refresh_saved_searches.
+    """
+    list_display = ('name', 'user', 'table_name', 'snapshot_generation', 'snapshot_rows', 'refreshed_at')
+    list_filter = ('table_name',)
+    search_fields = ('name', 'table_name', 'user__username')
+    list_select_related = ('user',)
+    readonly_fields = ('created_at', 'snapshot_generation', 'snapshot_rows', 'snapshot_truncated', 'refreshed_at', 'refresh_error')
+
+    def save_model(self, request, obj, form, change):
+        if change and {'table_name', 'filters', 'result_fields'} & set(form.changed_data):
+            obj.snapshot_generation = None # Условия изменились — снимок нужно построить заново
+        super().save_model(request, obj, form, change)
+
+@admin.register(ChunkedUpload)
+class ChunkedUploadAdmin(admin.ModelAdmin):
+    """
+    Загрузки больших файлов по частям. Незавершённые удаляются через CHUNKED_UPLOAD_EXPIRE_HOURS.
+    """
+    list_display = ('filename', 'user', 'status', 'offset', 'size', 'table_name', 'updated_at')
+    list_filter = ('status',)
+    search_fields = ('filename', 'table_name', 'user__username')
+    list_select_related = ('user',)
+    readonly_fields = [field.name for field in ChunkedUpload._meta.fields]
+
+@admin.register(IngestReject)
+class IngestRejectAdmin(admin.ModelAdmin):
+    """
+    Записи файлов, пропущенные при загрузке из-за ошибок. Хранятся до перезагрузки таблицы.
+    """
+    list_display = ('table_name', 'row_number', 'reason', 'filename', 'created_at')
+    list_filter = ('table_name',)
+    search_fields = ('table_name', 'filename', 'reason')
+    readonly_fields = [field.name for field in IngestReject._meta.fields]
+
+    def has_add_permission(self, request):
+        return False # Записи создаются только при загрузке
+
+# ... (если есть другие модели) ...
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        # Подключаем обработчики сигналов table_loaded / template_changed.
+        # catalog — первым: его обработчик увеличивает поколение таблицы.
+        # saved_searches — удаление снимков вместе с сохранёнными поисками,
+        # chunked_uploads — удаление собираемых файлов вместе с загрузками,
+        # entity_links — индекс связей между реестрами
+        from . import catalog, chunked_uploads, entity_links, projections, saved_searches, search_keys  # noqa: F401
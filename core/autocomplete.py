@@ -0,0 +1,75 @@
+# core/autocomplete.py
+"""
+Подсказки (type-ahead) для полей поиска.
+
+Работает только для полей поиска шаблона — по ним есть индекс
+core_search_key (см. search_keys). Различные значения с заданным префиксом
+выбираются «прыжками» по индексу (рекурсивный CTE, эмуляция skip scan):
+на каждую подсказку — одна индексная проба, независимо от размера таблицы.
+Ответы кэшируются по поколению таблицы.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections, transaction
+
+from . import catalog
+from .db_routing import get_read_alias
+from .search_keys import key_expression, like_pattern, normalize_search_value
+
+CACHE_PREFIX = 'core:autocomplete'
+
+
+def _suggestions_sql(table_name, field_name):
+    key = key_expression(field_name)
+    # ORDER BY ... USING ~<~ — порядок индекса text_pattern_ops
+    return f"""
+        WITH RECURSIVE walk AS (
+            (SELECT {key} AS k, "{field_name}"::text AS v FROM "{table_name}"
+             WHERE {key} LIKE %(pattern)s
+             ORDER BY 1 USING ~<~ LIMIT 1)
+            UNION ALL
+            SELECT nxt.k, nxt.v FROM walk, LATERAL (
+                SELECT {key} AS k, "{field_name}"::text AS v FROM "{table_name}"
+                WHERE {key} ~>~ walk.k AND {key} LIKE %(pattern)s
+                ORDER BY 1 USING ~<~ LIMIT 1
+            ) nxt
+        )
+        SELECT v FROM walk LIMIT %(limit)s;
+    """
+
+
+def get_suggestions(table_name, field_name, query, limit):
+    """
+    Возвращает (suggestions, timed_out): до limit различных значений поля,
+    нормализованный ключ которых начинается с query.
+    """
+    normalized = normalize_search_value(query)
+    if len(normalized) < settings.AUTOCOMPLETE_MIN_CHARS:
+        return [], False
+
+    cache_key = ':'.join([
+        CACHE_PREFIX, table_name, str(catalog.get_generation(table_name)), field_name, str(limit),
+        hashlib.md5(normalized.encode('utf-8')).hexdigest(),
+    ])
+    suggestions = cache.get(cache_key)
+    if suggestions is not None:
+        return suggestions, False
+
+    try:
+        alias = get_read_alias()
+        with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+            # Жёсткое ограничение: подсказка не должна занимать backend надолго
+            cursor.execute("SET LOCAL statement_timeout = %s;", [settings.AUTOCOMPLETE_TIMEOUT_MS])
+            cursor.execute(
+                _suggestions_sql(table_name, field_name),
+                {'pattern': like_pattern(normalized), 'limit': limit},
+            )
+            suggestions = [row[0] for row in cursor.fetchall()]
+    except DatabaseError as e:
+        print(f"Warning: autocomplete for {table_name}.{field_name} failed: {e}")
+        return [], True
+
+    cache.set(cache_key, suggestions, settings.AUTOCOMPLETE_CACHE_TIMEOUT)
+    return suggestions, False
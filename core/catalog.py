@@ -0,0 +1,175 @@
+# core/catalog.py
+"""
+Кэшируемый каталог импортированных таблиц и их столбцов.
+
+Список таблиц и столбцов раньше запрашивался из pg_tables/information_schema
+на каждый запрос. Теперь он хранится в кэше Django; ключи включают поколение
+таблицы (TableGeneration), которое увеличивается при каждой перезагрузке,
+поэтому после загрузки все процессы видят новую схему.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, Max
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .db_routing import get_read_connection
+from .models import TableGeneration, TableTemplate, TableTemplateFieldConfig
+from .signals import table_loaded
+from .sql_utils import ROW_ID_COLUMN
+
+CACHE_PREFIX = 'core:catalog'
+
+
+def bump_generation(table_name):
+    """
+    Увеличивает поколение таблицы (после перезагрузки).
+    """
+    updated = TableGeneration.objects.filter(table_name=table_name).update(
+        generation=F('generation') + 1,
+        changed_at=timezone.now(),
+    )
+    if not updated:
+        TableGeneration.objects.get_or_create(table_name=table_name, defaults={'generation': 1})
+
+
+def get_generation(table_name):
+    """
+    Текущее поколение таблицы (0, если таблица ещё не загружалась через приложение).
+    """
+    return TableGeneration.objects.filter(table_name=table_name).values_list('generation', flat=True).first() or 0
+
+
+def get_table_version(table_name):
+    """
+    Версия таблицы вместе с её шаблоном: (версия, время изменения).
+    Меняется после перезагрузки таблицы и после любого сохранения шаблона.
+    Время изменения — None, если ни таблица, ни шаблон через приложение не менялись.
+    """
+    generation, changed_at = TableGeneration.objects.filter(table_name=table_name).values_list(
+        'generation', 'changed_at'
+    ).first() or (0, None)
+    template_id, updated_at = TableTemplate.objects.filter(table_name=table_name).values_list(
+        'pk', 'updated_at'
+    ).first() or (None, None)
+    version = f"{generation}-{template_id}-{updated_at.timestamp() if updated_at else 0:.6f}"
+    last_modified = max((t for t in (changed_at, updated_at) if t), default=None)
+    return version, last_modified
+
+
+def catalog_version():
+    """
+    Версия каталога целиком: меняется при перезагрузке любой таблицы.
+    """
+    stats = TableGeneration.objects.aggregate(last=Max('changed_at'), total=Count('id'))
+    last = stats['last'].timestamp() if stats['last'] else 0
+    return f"{stats['total']}-{last:.6f}"
+
+
+def get_available_tables():
+    """
+    Список импортированных таблиц (без служебных таблиц Django и core).
+    """
+    cache_key = f"{CACHE_PREFIX}:tables:{catalog_version()}"
+    tables = cache.get(cache_key)
+    if tables is None:
+        with get_read_connection().cursor() as cursor:
+            cursor.execute("""
+                SELECT tablename
+                FROM pg_tables
+                WHERE schemaname = 'public'
+                  AND tablename NOT LIKE 'pg_%'
+                  AND tablename NOT LIKE 'sql_%'
+                  AND tablename NOT LIKE 'django_%'
+                  AND tablename NOT LIKE 'auth_%'
+                  AND tablename NOT LIKE 'contenttype_%'
+                  AND tablename NOT LIKE 'core_%' -- <-- Исключаем таблицы core
+                  -- Секции секционированных таблиц показываем только через общую таблицу
+                  AND NOT EXISTS (
+                      SELECT 1 FROM pg_class c
+                      JOIN pg_namespace n ON n.oid = c.relnamespace
+                      WHERE n.nspname = 'public' AND c.relname = tablename AND c.relispartition
+                  );
+            """)
+            tables = [row[0] for row in cursor.fetchall()]
+        cache.set(cache_key, tables, settings.CATALOG_CACHE_TIMEOUT)
+    return tables
+
+
+def get_table_columns(table_name):
+    """
+    Имена столбцов таблицы в порядке ordinal_position (пустой список, если таблицы нет).
+    """
+    cache_key = f"{CACHE_PREFIX}:columns:{table_name}:{get_generation(table_name)}"
+    columns = cache.get(cache_key)
+    if columns is None:
+        with get_read_connection().cursor() as cursor:
+            cursor.execute(
+                "SELECT column_name FROM information_schema.columns "
+                "WHERE table_name = %s AND column_name <> %s ORDER BY ordinal_position;",
+                [table_name, ROW_ID_COLUMN], # Служебный номер строки — не поле таблицы
+            )
+            columns = [row[0] for row in cursor.fetchall()]
+        cache.set(cache_key, columns, settings.CATALOG_CACHE_TIMEOUT)
+    return columns
+
+
+def get_field_metadata(table_name):
+    """
+    Компактное описание полей таблицы для формы поиска:
+    {'version': хэш, 'fields': [{'name': ..., ...}, ...]} в порядке столбцов таблицы.
+
+    Необязательные ключи поля (пишутся, только если отличаются от умолчания):
+    label        — подпись поля поиска (по умолчанию имя столбца);
+    result_label — подпись поля вывода (по умолчанию label);
+    search       — позиция среди полей поиска шаблона;
+    result       — позиция среди полей вывода шаблона;
+    autocomplete — для поля доступны подсказки (поле поиска шаблона).
+    """
+    version, _ = get_table_version(table_name)
+    cache_key = f"{CACHE_PREFIX}:fields:{table_name}:{version}"
+    metadata = cache.get(cache_key)
+    if metadata is not None:
+        return metadata
+
+    positions = {'search': {}, 'result': {}}
+    labels = {'search': {}, 'result': {}}
+    for field_name, field_label, template_type in TableTemplateFieldConfig.objects.filter(
+        table_template__table_name=table_name,
+    ).values_list('field_name', 'field_label', 'template_type'):
+        positions[template_type].setdefault(field_name, len(positions[template_type]))
+        labels[template_type].setdefault(field_name, field_label)
+
+    fields = []
+    for column in get_table_columns(table_name):
+        field = {'name': column}
+        search_label = labels['search'].get(column) or column
+        result_label = labels['result'].get(column) or column
+        if search_label != column:
+            field['label'] = search_label
+        if result_label != search_label:
+            field['result_label'] = result_label
+        if column in positions['search']:
+            field['search'] = positions['search'][column]
+            field['autocomplete'] = True # По полям поиска шаблона строится индекс ключей
+        if column in positions['result']:
+            field['result'] = positions['result'][column]
+        fields.append(field)
+
+    payload = json.dumps(fields, ensure_ascii=False, sort_keys=True)
+    metadata = {
+        'version': hashlib.md5(payload.encode('utf-8')).hexdigest()[:16],
+        'fields': fields,
+    }
+    cache.set(cache_key, metadata, settings.CATALOG_CACHE_TIMEOUT)
+    return metadata
+
+
+# Этот обработчик должен выполняться раньше остальных обработчиков table_loaded,
+# поэтому модуль импортируется первым в CoreConfig.ready()
+@receiver(table_loaded)
+def bump_generation_after_load(sender, table_name, **kwargs):
+    bump_generation(table_name)
@@ -0,0 +1,313 @@
+# core/chunked_uploads.py
+"""
+Загрузка больших DBF/Excel-файлов по частям с возобновлением.
+
+Протокол (представления chunked_upload_*):
+    POST   upload/chunked/                 filename, size[, sha256, partition_table, partition_column,
+                                           dedup, dedup_keys]
+                                           -> {id, url, complete_url, offset, chunk_size}
+    PUT    upload/chunked/<id>/            тело — байты части,
+                                           Content-Range: bytes <начало>-<конец>/<размер>,
+                                           X-Chunk-SHA256: <sha256 части> (необязательно)
+                                           -> {offset}
+    GET    upload/chunked/<id>/            -> {offset, size, status} — откуда продолжать после обрыва
+    DELETE upload/chunked/<id>/            отмена
+    POST   upload/chunked/<id>/complete/   -> загрузка в базу, {table_name, rows, duplicates, redirect};
+                                           409/503 со смещением — таблица занята другой загрузкой
+                                           или нет свободного места, complete можно повторить;
+                                           после ошибки загрузки файл тоже остаётся до
+                                           cleanup_chunked_uploads, complete можно повторить
+
+Части пишутся прямо в файл <CHUNKED_UPLOAD_DIR>/<id><расширение> по своему
+смещению, по мере чтения из запроса (без буферизации части в памяти и без
+промежуточных копий). Части принимаются строго по порядку: начало части должно
+совпадать с числом уже принятых байт, иначе 409 с текущим смещением — клиент
+продолжает с него. Часть с неверной контрольной суммой отбрасывается.
+Пока часть передаётся, строка загрузки не заблокирована: запрос отмечает
+начало записи (writing_since), и вторая часть той же загрузки получает 409.
+Собранный файл загружается в базу (core/ingest.py) прямо с этого пути.
+"""
+import hashlib
+import os
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import ingest
+from .db_routing import pin_to_primary
+from .models import ChunkedUpload
+
+# Сколько байт читать из запроса за раз
+READ_BLOCK_SIZE = 64 * 1024
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+
+class UploadRejected(Exception):
+    """
+    Запрос загрузки отклонён. Текст показывается пользователю, status — код ответа;
+    offset — сколько байт уже принято (клиент продолжает с этого места).
+    """
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+def file_path(upload):
+    # Расширение сохраняем: по нему выбирается способ чтения (DBF / xlsx / xls)
+    extension = os.path.splitext(upload.filename)[1].lower()
+    return os.path.join(settings.CHUNKED_UPLOAD_DIR, f"{upload.pk}{extension}")
+
+
+def _remove_file(upload):
+    try:
+        os.unlink(file_path(upload))
+    except FileNotFoundError:
+        pass
+
+
+def expire_stale():
+    """
+    Удаляет незавершённые и неудачные загрузки старше CHUNKED_UPLOAD_EXPIRE_HOURS вместе с файлами.
+    """
+    cutoff = timezone.now() - timedelta(hours=settings.CHUNKED_UPLOAD_EXPIRE_HOURS)
+    stale = ChunkedUpload.objects.filter(
+        status__in=[ChunkedUpload.STATUS_UPLOADING, ChunkedUpload.STATUS_FAILED], updated_at__lt=cutoff,
+    )
+    for upload in stale:
+        print(f"DEBUG: chunked upload {upload.pk} ({upload.filename}) expired")
+    return stale.delete()[0] # Файлы удаляет обработчик post_delete
+
+
+def _loading_cutoff():
+    return timezone.now() - timedelta(hours=settings.CHUNKED_UPLOAD_LOADING_TIMEOUT_HOURS)
+
+
+def release_stale_loading():
+    """
+    Загрузки, которые «загружаются в базу» дольше CHUNKED_UPLOAD_LOADING_TIMEOUT_HOURS
+    (процесс сервера остановился посреди complete), возвращает в «загружается»:
+    файл на месте, complete можно повторить. Возвращает число таких загрузок.
+    """
+    stale = ChunkedUpload.objects.filter(status=ChunkedUpload.STATUS_LOADING, updated_at__lt=_loading_cutoff())
+    for upload in stale:
+        print(f"Warning: chunked upload {upload.pk} ({upload.filename}) stuck in loading, released")
+    return stale.update(status=ChunkedUpload.STATUS_UPLOADING, updated_at=timezone.now())
+
+
+def start(user, filename, size, sha256='', partition_table='', partition_column='', dedup='', dedup_keys=''):
+    """
+    Начинает загрузку. Имя файла и параметры секции проверяются сразу, чтобы
+    не передавать гигабайты ради ошибки в имени; таблица, которую сейчас
+    загружает другой пользователь, — тоже (409).
+    """
+    if not filename.lower().endswith(ingest.DBF_EXTENSIONS + ingest.EXCEL_EXTENSIONS):
+        raise UploadRejected('Файл должен быть в формате .dbf, .xlsx или .xls.')
+    if size <= 0:
+        raise UploadRejected('Файл пуст.')
+    if size > settings.CHUNKED_UPLOAD_MAX_SIZE:
+        raise UploadRejected(f'Файл больше {settings.CHUNKED_UPLOAD_MAX_SIZE} байт.', status=413)
+    if sha256 and not re.match(r'^[0-9a-f]{64}$', sha256):
+        raise UploadRejected('Неверная контрольная сумма файла.')
+    try:
+        options = ingest.resolve_load_options(filename, partition_table, partition_column, dedup, dedup_keys)
+    except ingest.IngestError as e:
+        raise UploadRejected(str(e)) from e
+    try:
+        with ingest.table_lock(options.get('partition_table') or ingest.table_name_from_filename(filename), wait=False):
+            pass
+    except ingest.IngestBusy as e:
+        raise UploadRejected(str(e), status=e.status) from e
+
+    expire_stale()
+    upload = ChunkedUpload.objects.create(user=user, filename=filename, size=size, sha256=sha256, options=options)
+    os.makedirs(settings.CHUNKED_UPLOAD_DIR, exist_ok=True)
+    open(file_path(upload), 'wb').close()
+    print(f"DEBUG: chunked upload {upload.pk} started: {filename}, {size} bytes")
+    return upload
+
+
+def get_upload(upload_id, user):
+    """
+    Загрузка пользователя из основной базы (offset на реплике может отставать).
+    """
+    with pin_to_primary():
+        upload = ChunkedUpload.objects.filter(pk=upload_id, user=user).first()
+    if upload is None:
+        raise UploadRejected('Загрузка не найдена.', status=404)
+    return upload
+
+
+def parse_content_range(value):
+    match = CONTENT_RANGE_RE.match(value or '')
+    if not match:
+        raise UploadRejected('Нужен заголовок Content-Range: bytes <начало>-<конец>/<размер>.')
+    first, last, total = (int(group) for group in match.groups())
+    if last < first:
+        raise UploadRejected('Неверный диапазон Content-Range.')
+    return first, last, total
+
+
+def _claim_chunk(upload_id, user, first, last, total):
+    """
+    Короткая транзакция: проверяет часть и отмечает, что она пишется (writing_since).
+    Пока отметка стоит, другие части этой загрузки получают 409; отметка старше
+    CHUNKED_UPLOAD_WRITE_TIMEOUT считается оставшейся от прерванного запроса.
+    """
+    with transaction.atomic():
+        upload = ChunkedUpload.objects.select_for_update().filter(pk=upload_id, user=user).first()
+        if upload is None:
+            raise UploadRejected('Загрузка не найдена.', status=404)
+        if upload.status != ChunkedUpload.STATUS_UPLOADING:
+            raise UploadRejected('Загрузка уже завершена.', status=409, offset=upload.offset)
+        if total != upload.size or last >= upload.size:
+            raise UploadRejected('Диапазон части не соответствует размеру файла.')
+        if first != upload.offset:
+            # Часть уже принята (повтор после обрыва) или пропущена — клиент продолжит с offset
+            raise UploadRejected('Часть не по порядку.', status=409, offset=upload.offset)
+        now = timezone.now()
+        if upload.writing_since and now - upload.writing_since < timedelta(seconds=settings.CHUNKED_UPLOAD_WRITE_TIMEOUT):
+            raise UploadRejected('Эта часть уже передаётся.', status=409, offset=upload.offset)
+        upload.writing_since = now
+        upload.save(update_fields=['writing_since', 'updated_at'])
+    return upload
+
+
+def _release_chunk(upload, new_offset=None):
+    """
+    Короткая транзакция: снимает отметку записи части и, если часть принята, сдвигает offset.
+    Если отметку за это время занял другой запрос (наша запись сочтена прерванной)
+    или загрузку отменили — UploadRejected.
+    """
+    with transaction.atomic():
+        current = ChunkedUpload.objects.select_for_update().filter(pk=upload.pk).first()
+        if current is None:
+            raise UploadRejected('Загрузка не найдена.', status=404)
+        if current.writing_since != upload.writing_since:
+            raise UploadRejected('Часть передавалась слишком долго.', status=409, offset=current.offset)
+        current.writing_since = None
+        if new_offset is not None:
+            current.offset = new_offset
+        current.save(update_fields=['writing_since', 'offset', 'updated_at'])
+    return current
+
+
+def write_chunk(upload_id, user, stream, content_range, checksum=''):
+    """
+    Дописывает часть из stream (тело запроса) в файл загрузки. Строка загрузки
+    блокируется только на проверку части и на сдвиг offset; сама часть читается
+    из запроса и пишется в файл без открытой транзакции. Одновременные части
+    одной загрузки отклоняются (409). Возвращает новое смещение.
+    """
+    first, last, total = parse_content_range(content_range)
+    length = last - first + 1
+    if length > settings.CHUNKED_UPLOAD_MAX_CHUNK_SIZE:
+        raise UploadRejected(f'Часть больше {settings.CHUNKED_UPLOAD_MAX_CHUNK_SIZE} байт.', status=413)
+
+    upload = _claim_chunk(upload_id, user, first, last, total)
+    error = None
+    try:
+        digest = hashlib.sha256()
+        received = 0
+        with open(file_path(upload), 'r+b') as part_file:
+            part_file.seek(first)
+            while received < length:
+                block = stream.read(min(READ_BLOCK_SIZE, length - received))
+                if not block:
+                    break
+                digest.update(block)
+                part_file.write(block)
+                received += len(block)
+            if received != length:
+                error = f'Получено {received} байт из {length}.'
+            elif checksum and digest.hexdigest() != checksum.lower():
+                error = 'Контрольная сумма части не совпадает.'
+            if error:
+                # Отбрасываем принятое: следующая попытка начнётся с прежнего смещения
+                part_file.truncate(first)
+            else:
+                part_file.flush()
+                os.fsync(part_file.fileno())
+    except BaseException:
+        _release_chunk(upload)
+        raise
+    if error:
+        _release_chunk(upload)
+        raise UploadRejected(error, offset=upload.offset)
+    return _release_chunk(upload, last + 1).offset
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def complete(upload_id, user):
+    """
+    Загружает собранный файл в базу и удаляет его. Если таблица занята другой
+    загрузкой или нет свободного места загрузки (ingest.IngestBusy) — UploadRejected
+    с кодом 409/503. При любой ошибке файл остаётся (его удалит cleanup_chunked_uploads
+    через CHUNKED_UPLOAD_EXPIRE_HOURS), и complete можно повторить — в том числе
+    после ошибки загрузки (STATUS_FAILED) и после «зависшей» загрузки в базу.
+    Возвращает (имя таблицы, число записей, удалено дубликатов, пропущено записей с ошибками).
+    """
+    with transaction.atomic():
+        upload = ChunkedUpload.objects.select_for_update().filter(pk=upload_id, user=user).first()
+        if upload is None:
+            raise UploadRejected('Загрузка не найдена.', status=404)
+        stale_loading = upload.status == ChunkedUpload.STATUS_LOADING and upload.updated_at < _loading_cutoff()
+        if upload.status == ChunkedUpload.STATUS_LOADING and not stale_loading:
+            raise UploadRejected('Файл уже загружается в базу.', status=409, offset=upload.offset)
+        if upload.status == ChunkedUpload.STATUS_LOADED:
+            raise UploadRejected('Загрузка уже завершена.', status=409, offset=upload.offset)
+        if upload.offset != upload.size or upload.writing_since:
+            raise UploadRejected(f'Принято {upload.offset} байт из {upload.size}.', status=409, offset=upload.offset)
+        # Повторный complete (двойной клик, повтор после таймаута) не загрузит файл второй раз
+        upload.status = ChunkedUpload.STATUS_LOADING
+        upload.error = ''
+        upload.save(update_fields=['status', 'error', 'updated_at'])
+
+    path = file_path(upload)
+    try:
+        if upload.sha256 and _file_sha256(path) != upload.sha256:
+            raise ingest.IngestError('Контрольная сумма собранного файла не совпадает.')
+        table_name, rows, duplicates, rejected = ingest.load_file(path, upload.filename, user, upload.options)
+    except ingest.IngestBusy as e:
+        # Таблица занята другой загрузкой или нет свободного места: complete можно повторить,
+        # не передавая файл заново
+        upload.status = ChunkedUpload.STATUS_UPLOADING
+        upload.save(update_fields=['status', 'updated_at'])
+        raise UploadRejected(str(e), status=e.status, offset=upload.offset) from e
+    except Exception as e:
+        upload.status = ChunkedUpload.STATUS_FAILED
+        upload.error = str(e)
+        upload.save(update_fields=['status', 'error', 'updated_at'])
+        raise
+    _remove_file(upload)
+
+    upload.status = ChunkedUpload.STATUS_LOADED
+    upload.table_name = table_name
+    upload.save(update_fields=['status', 'table_name', 'updated_at'])
+    print(f"DEBUG: chunked upload {upload.pk} loaded into {table_name}: {rows} rows")
+    return table_name, rows, duplicates, rejected
+
+
+def abort(upload_id, user):
+    upload = get_upload(upload_id, user)
+    if upload.status == ChunkedUpload.STATUS_LOADING and upload.updated_at >= _loading_cutoff():
+        raise UploadRejected('Файл уже загружается в базу.', status=409)
+    upload.delete()
+
+
+@receiver(post_delete, sender=ChunkedUpload)
+def remove_file_after_delete(sender, instance, **kwargs):
+    _remove_file(instance)
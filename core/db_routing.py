@@ -0,0 +1,174 @@
+# core/db_routing.py
+"""
+Чтение с реплик.
+
+Поиск, описание столбцов, подсказки и выгрузки читают данные с реплик
+(базы replica1, replica2, ... в settings.DATABASES — см. DB_REPLICA_HOSTS),
+а загрузки, DDL и изменения шаблонов идут в основную базу (default).
+
+Запросы к импортированным таблицам выполняются через connection.cursor(),
+мимо ORM и роутера, поэтому читающий код явно берёт соединение
+connections[get_read_alias()]. Модели приложения core читаются через роутер
+(PrimaryReplicaRouter) по тем же правилам; служебные модели Django (сессии,
+пользователи) всегда читаются из основной базы.
+
+Реплика используется, только если она отвечает и её отставание не больше
+REPLICA_MAX_LAG_SECONDS (проверка кэшируется на REPLICA_CHECK_INTERVAL секунд),
+иначе чтение идёт из основной базы. После любого изменяющего запроса
+пользователя (POST и т.п.) его чтения REPLICA_STICKY_SECONDS секунд идут
+в основную базу — он сразу видит загруженную таблицу или сохранённый шаблон.
+
+Проверка на двух локальных экземплярах PostgreSQL:
+    pg_basebackup -h localhost -p 5432 -U <пользователь> -D /tmp/replica -R -X stream
+    pg_ctl -D /tmp/replica -o '-p 5433' start
+    DB_REPLICA_HOSTS=localhost:5433 python manage.py runserver
+Отставание можно смоделировать на реплике: SELECT pg_wal_replay_pause();
+"""
+import contextvars
+import random
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+REPLICA_PREFIX = 'replica'
+STICKY_COOKIE = 'db_primary_until'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+# Чтения текущего запроса (или блока pin_to_primary) должны идти в основную базу
+_pinned = contextvars.ContextVar('core_db_pinned', default=False)
+# Реплика, выбранная для текущего запроса: все чтения запроса идут в одну базу
+_request_choice = contextvars.ContextVar('core_db_request_choice', default=None)
+
+# Состояние реплик в этом процессе: {alias: (время проверки, исправна)}
+_health = {}
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias.startswith(REPLICA_PREFIX)]
+
+
+def _replica_lag(alias):
+    """
+    Отставание реплики в секундах. Если всё полученное уже применено — 0
+    (иначе при простое основной базы отставание «росло» бы само по себе).
+    Для базы, которая не является репликой, — тоже 0.
+    """
+    with connections[alias].cursor() as cursor:
+        cursor.execute("""
+            SELECT CASE
+                WHEN NOT pg_is_in_recovery() THEN 0
+                WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+            END;
+        """)
+        return float(cursor.fetchone()[0])
+
+
+def is_replica_healthy(alias):
+    """
+    Реплика отвечает и отстаёт не больше REPLICA_MAX_LAG_SECONDS.
+    """
+    now = time.monotonic()
+    checked = _health.get(alias)
+    if checked and now - checked[0] < settings.REPLICA_CHECK_INTERVAL:
+        return checked[1]
+    try:
+        lag = _replica_lag(alias)
+        healthy = lag <= settings.REPLICA_MAX_LAG_SECONDS
+        if not healthy:
+            print(f"Warning: replica {alias} lags {lag:.1f}s, reading from primary")
+    except DatabaseError as e:
+        healthy = False
+        print(f"Warning: replica {alias} is unavailable, reading from primary: {e}")
+        connections[alias].close()
+    _health[alias] = (now, healthy)
+    return healthy
+
+
+def get_read_alias():
+    """
+    Имя базы для чтения: исправная реплика или основная база.
+    В рамках одного запроса возвращает одну и ту же базу.
+    """
+    if _pinned.get():
+        return DEFAULT_DB_ALIAS
+    choice = _request_choice.get()
+    if choice and 'alias' in choice:
+        return choice['alias']
+    healthy = [alias for alias in replica_aliases() if is_replica_healthy(alias)]
+    alias = random.choice(healthy) if healthy else DEFAULT_DB_ALIAS
+    if choice is not None:
+        choice['alias'] = alias
+    return alias
+
+
+def get_read_connection():
+    return connections[get_read_alias()]
+
+
+@contextmanager
+def pin_to_primary():
+    """
+    Все чтения внутри блока — из основной базы (команды загрузки и т.п.).
+    """
+    token = _pinned.set(True)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """
+    Модели core читаются с реплики (get_read_alias), остальные — из основной базы.
+    Запись и миграции — только в основную базу.
+    """
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == 'core':
+            return get_read_alias()
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная база
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class StickyPrimaryMiddleware:
+    """
+    Изменяющие запросы и чтения в течение REPLICA_STICKY_SECONDS после них
+    идут в основную базу («читаю свои записи»). Срок хранится в cookie.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not replica_aliases():
+            return self.get_response(request)
+
+        write = request.method not in SAFE_METHODS
+        try:
+            primary_until = float(request.COOKIES.get(STICKY_COOKIE, 0))
+        except ValueError:
+            primary_until = 0
+        pinned_token = _pinned.set(write or primary_until > time.time())
+        choice_token = _request_choice.set({})
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_choice.reset(choice_token)
+            _pinned.reset(pinned_token)
+
+        if write:
+            response.set_cookie(
+                STICKY_COOKIE, f"{time.time() + settings.REPLICA_STICKY_SECONDS:.0f}",
+                max_age=settings.REPLICA_STICKY_SECONDS, httponly=True, samesite='Lax',
+            )
+        return response
@@ -0,0 +1,331 @@
+# core/dbf_export.py
+"""
+Выгрузка таблиц и результатов поиска обратно в DBF (cp866) для смежных систем.
+
+Описания полей берутся из сохранённых при загрузке описаний (DBFUpload.dbf_fields):
+файл получает те же имена, типы, длины и число знаков после запятой, что и
+загруженный. Для столбцов без сохранённого описания (Excel, таблицы,
+загруженные до появления выгрузки) поле строится по типу столбца PostgreSQL
+(table_fields).
+
+Строки читаются серверным курсором пачками по DBF_EXPORT_FETCH_SIZE, пачка
+переводится в текст записей и кодируется целиком (cp866 однобайтовая: длина
+в символах равна длине в байтах), а в файл пишутся блоки не меньше
+DBF_EXPORT_BLOCK_SIZE. Память ограничена одной пачкой и одним блоком
+независимо от размера таблицы.
+
+Число записей в заголовке известно только в конце, поэтому файл должен
+поддерживать seek (обычный или временный файл).
+
+Запуск: python manage.py export_dbf <таблица> или кнопка «Скачать DBF» на странице поиска.
+"""
+import struct
+from datetime import date
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from . import catalog, partitions
+from .db_routing import get_read_connection
+from .dbf_stream import DBF_ENCODING, END_OF_FILE, HEADER_TERMINATOR, RECORD_ACTIVE
+from .models import DBFUpload
+from .sql_utils import ROW_ID_COLUMN
+
+DBF_VERSION = 0x03 # dBase III без memo
+LANGUAGE_DRIVER_CP866 = 0x65 # Russian MS-DOS
+MAX_FIELD_NAME_LENGTH = 10
+MAX_FIELDS = 255
+MAX_RECORD_LENGTH = 65535
+MAX_CHAR_LENGTH = 254
+
+# Значения логических полей (в таблицах они хранятся текстом 'true'/'false')
+LOGICAL_TRUE = {'t', 'true', 'y', 'yes', '1'}
+LOGICAL_FALSE = {'f', 'false', 'n', 'no', '0'}
+
+# Поле DBF по типу столбца PostgreSQL (information_schema.columns.data_type), если описания нет
+SQL_FIELD_TYPES = {
+    'smallint': ('N', 6, 0),
+    'integer': ('N', 11, 0),
+    'bigint': ('N', 20, 0),
+    'real': ('F', 20, 6),
+    'double precision': ('F', 20, 6),
+    'boolean': ('L', 1, 0),
+    'date': ('D', 8, 0),
+}
+
+
+class DBFExportError(ValueError):
+    pass
+
+
+def _writable_field(name, field_type, length, decimal_count):
+    """
+    Описание поля, которое умеет записать DBFWriter: C, N, F, D, L.
+    Прочие типы загруженного файла (I, Y, memo, дата-время) хранятся в таблице
+    числом или текстом и записываются как N или C.
+    """
+    if field_type in 'I+':
+        return {'name': name, 'type': 'N', 'length': 11, 'decimal_count': 0}
+    if field_type == 'Y':
+        return {'name': name, 'type': 'N', 'length': 20, 'decimal_count': 4}
+    if field_type in ('C', 'N', 'F') or (field_type, length) in (('D', 8), ('L', 1)):
+        return {'name': name, 'type': field_type, 'length': length, 'decimal_count': decimal_count}
+    return {'name': name, 'type': 'C', 'length': MAX_CHAR_LENGTH, 'decimal_count': 0}
+
+
+def _stored_fields(table_name):
+    """
+    {имя поля: описание} из сохранённых описаний загрузок таблицы и её секций.
+    Если поле встречается в нескольких загрузках, берётся наибольшая длина.
+    """
+    stored = {}
+    uploads = DBFUpload.objects.filter(
+        Q(table_name=table_name) | Q(table_name__startswith=f"{table_name}{partitions.PARTITION_SEPARATOR}"),
+    ).values_list('dbf_fields', flat=True)
+    for dbf_fields in uploads:
+        for field in dbf_fields:
+            known = stored.get(field['name'])
+            if known is None or known['type'] != field['type']:
+                stored[field['name']] = dict(field)
+            else:
+                known['length'] = max(known['length'], field['length'])
+                known['decimal_count'] = max(known['decimal_count'], field['decimal_count'])
+    return stored
+
+
+def table_fields(table_name, columns=None):
+    """
+    Описания полей DBF для столбцов таблицы (все столбцы, если columns не задан),
+    в порядке columns: [{name, type, length, decimal_count}, ...].
+    """
+    with get_read_connection().cursor() as cursor:
+        cursor.execute("""
+            SELECT column_name, data_type, character_maximum_length, numeric_scale
+            FROM information_schema.columns
+            WHERE table_schema = 'public' AND table_name = %s AND column_name <> %s
+            ORDER BY ordinal_position;
+        """, [table_name, ROW_ID_COLUMN])
+        sql_columns = {row[0]: row[1:] for row in cursor.fetchall()}
+    if columns is None:
+        columns = list(sql_columns)
+    missing = [column for column in columns if column not in sql_columns]
+    if missing:
+        raise DBFExportError(f'В таблице "{table_name}" нет столбцов: {", ".join(missing)}.')
+
+    stored = _stored_fields(table_name)
+    fields = []
+    for column in columns:
+        field = stored.get(column)
+        if field is not None:
+            fields.append(_writable_field(column, field['type'], field['length'], field['decimal_count']))
+            continue
+        data_type, max_length, numeric_scale = sql_columns[column]
+        if data_type in SQL_FIELD_TYPES:
+            field_type, length, decimal_count = SQL_FIELD_TYPES[data_type]
+        elif data_type == 'numeric':
+            # Масштаб неограниченного NUMERIC неизвестен — 4 знака после запятой
+            field_type, length = 'N', 20
+            decimal_count = numeric_scale if numeric_scale is not None else 4
+        else:
+            field_type, length, decimal_count = 'C', min(max_length or MAX_CHAR_LENGTH, MAX_CHAR_LENGTH), 0
+        fields.append({'name': column, 'type': field_type, 'length': length, 'decimal_count': decimal_count})
+    return fields
+
+
+def _field_names(fields, encoding):
+    """
+    Имена полей в заголовке: не длиннее 10 байт и без повторов после усечения.
+    """
+    names = []
+    used = set()
+    for field in fields:
+        name = field['name'].encode(encoding, 'replace')[:MAX_FIELD_NAME_LENGTH]
+        suffix = 1
+        while name.upper() in used:
+            tail = str(suffix).encode('ascii')
+            name = name[:MAX_FIELD_NAME_LENGTH - len(tail)] + tail
+            suffix += 1
+        used.add(name.upper())
+        names.append(name)
+    return names
+
+
+def _char_formatter(length):
+    blank = ' ' * length
+
+    def format_value(value):
+        if value is None:
+            return blank
+        text = value if isinstance(value, str) else str(value)
+        return text[:length].ljust(length)
+    return format_value
+
+
+def _numeric_formatter(length, decimal_count):
+    blank = ' ' * length
+    overflow = '*' * length # Так dBase записывает число, не помещающееся в поле
+
+    def format_value(value):
+        if value is None or value == '':
+            return blank
+        if isinstance(value, str):
+            value = float(value.replace(',', '.'))
+        if decimal_count:
+            text = f'{value:.{decimal_count}f}'
+        elif isinstance(value, int):
+            text = str(value)
+        else:
+            text = f'{value:.0f}'
+        if len(text) > length:
+            return overflow
+        return text.rjust(length)
+    return format_value
+
+
+def _format_date(value):
+    if value is None or value == '':
+        return ' ' * 8
+    if isinstance(value, date):
+        return f'{value.year:04d}{value.month:02d}{value.day:02d}'
+    # Даты загруженных DBF хранятся текстом 'ГГГГ-ММ-ДД'
+    return str(value).replace('-', '')[:8].ljust(8)
+
+
+def _format_logical(value):
+    if value is None:
+        return '?'
+    if isinstance(value, bool):
+        return 'T' if value else 'F'
+    text = str(value).strip().lower()
+    if text in LOGICAL_TRUE:
+        return 'T'
+    if text in LOGICAL_FALSE:
+        return 'F'
+    return '?'
+
+
+def _formatter(field):
+    if field['type'] == 'C':
+        return _char_formatter(field['length'])
+    if field['type'] in 'NF':
+        return _numeric_formatter(field['length'], field['decimal_count'])
+    if field['type'] == 'D':
+        return _format_date
+    return _format_logical
+
+
+class DBFWriter:
+    """
+    Запись DBF в файл: write_rows(пачка строк) пишет записи блоками,
+    close() дописывает конец файла и число записей в заголовок.
+    Строки — последовательности значений в порядке fields.
+    """
+    def __init__(self, fileobj, fields, encoding=DBF_ENCODING, block_size=None):
+        if not fields:
+            raise DBFExportError('Нет полей для выгрузки.')
+        if len(fields) > MAX_FIELDS:
+            raise DBFExportError(f'В DBF может быть не больше {MAX_FIELDS} полей, выбрано {len(fields)}.')
+        record_length = 1 + sum(field['length'] for field in fields)
+        if record_length > MAX_RECORD_LENGTH:
+            raise DBFExportError(f'Длина записи ({record_length} байт) больше допустимой в DBF.')
+        self.fileobj = fileobj
+        self.fields = fields
+        self.encoding = encoding
+        self.block_size = block_size or settings.DBF_EXPORT_BLOCK_SIZE
+        self.record_length = record_length
+        self.rows = 0
+        self._start = fileobj.tell()
+        self._formatters = [_formatter(field) for field in fields]
+        self._block = bytearray()
+        self._write_header()
+
+    def _header(self):
+        today = date.today()
+        header_length = 32 + 32 * len(self.fields) + 1
+        return struct.pack(
+            '<BBBBLHH17xB2x', DBF_VERSION, today.year - 1900, today.month, today.day,
+            self.rows, header_length, self.record_length, LANGUAGE_DRIVER_CP866,
+        )
+
+    def _write_header(self):
+        parts = [self._header()]
+        for field, name in zip(self.fields, _field_names(self.fields, self.encoding)):
+            length, decimal_count = field['length'], field['decimal_count']
+            if field['type'] == 'C':
+                # Длина символьного поля больше 255 — старший байт в decimal_count (как читает dbf_stream)
+                length, decimal_count = length & 0xFF, length >> 8
+            parts.append(struct.pack(
+                '<11sc4xBB14x', name, field['type'].encode('ascii'), length, decimal_count,
+            ))
+        parts.append(bytes([HEADER_TERMINATOR]))
+        self.fileobj.write(b''.join(parts))
+
+    def write_rows(self, rows):
+        formatters = self._formatters
+        active = chr(RECORD_ACTIVE)
+        records = [
+            active + ''.join([format_value(value) for format_value, value in zip(formatters, row)])
+            for row in rows
+        ]
+        # Символы, которых нет в cp866, заменяются на '?' — длина записи не меняется
+        self._block += ''.join(records).encode(self.encoding, 'replace')
+        self.rows += len(records)
+        if len(self._block) >= self.block_size:
+            self.fileobj.write(self._block)
+            self._block = bytearray()
+
+    def close(self):
+        self._block.append(END_OF_FILE)
+        self.fileobj.write(self._block)
+        self._block = bytearray()
+        end = self.fileobj.tell()
+        self.fileobj.seek(self._start)
+        self.fileobj.write(self._header())
+        self.fileobj.seek(end)
+        self.fileobj.flush()
+
+
+def export_query(fileobj, sql_query, params, fields):
+    """
+    Записывает результат запроса (столбцы — в порядке fields) в fileobj.
+    Читает с реплики серверным курсором. Возвращает число записей.
+    """
+    writer = DBFWriter(fileobj, fields)
+    connection = get_read_connection()
+    # Серверный курсор вне транзакции объявляется WITH HOLD, и PostgreSQL
+    # материализует весь результат ещё до первой пачки
+    with transaction.atomic(using=connection.alias), connection.chunked_cursor() as cursor:
+        cursor.execute(sql_query, params)
+        while True:
+            rows = cursor.fetchmany(settings.DBF_EXPORT_FETCH_SIZE)
+            if not rows:
+                break
+            writer.write_rows(rows)
+    writer.close()
+    return writer.rows
+
+
+def export_table(table_name, fileobj, columns=None):
+    """
+    Выгружает таблицу (все столбцы или columns) в fileobj. Возвращает число записей.
+    """
+    if table_name not in catalog.get_available_tables():
+        raise DBFExportError(f'Таблица "{table_name}" не найдена.')
+    fields = table_fields(table_name, columns)
+    select_cols = ', '.join(f'"{field["name"]}"' for field in fields)
+    rows = export_query(fileobj, f'SELECT {select_cols} FROM "{table_name}";', [], fields)
+    print(f"DEBUG: DBF export of {table_name}: {rows} rows")
+    return rows
+
+
+def export_search(query, fileobj):
+    """
+    Выгружает результат поиска (SearchQuery — те же условия, что у представления search)
+    в fileobj. Возвращает число записей.
+    """
+    if not query.result_fields or query.is_empty:
+        raise DBFExportError('В таблице нет выбранных полей или не заполнено ни одно поле поиска.')
+    rows = export_query(fileobj, query.sql, query.params, table_fields(query.table_name, query.result_fields))
+    print(f"DEBUG: DBF export of search in {query.table_name}: {rows} rows")
+    return rows
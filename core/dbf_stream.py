@@ -0,0 +1,309 @@
+# core/dbf_stream.py
+"""
+Разбор DBF-файла по мере поступления байтов.
+
+DBF — заголовок (описания полей) и записи фиксированной длины, поэтому
+записи можно разбирать, не дожидаясь конца файла: DBFStreamParser получает
+произвольные куски файла (части тела запроса, блоки с диска) и возвращает
+записи, которые в них поместились целиком. Значения разбираются так же, как
+в dbfread.FieldParser (редкие типы — им самим), и сразу приводятся к типам
+столбцов, так что записи можно передавать в COPY без второго прохода.
+
+Типы столбцов определяются по описаниям полей в заголовке (sql_field_types),
+а не по значениям: таблицу нужно создать до того, как придут записи.
+
+Запись, значение которой не разбирается или не подходит к типу столбца
+(неверная дата, дробное число в целом поле), не прерывает разбор: она
+попадает в rejected с номером записи в файле и причиной.
+"""
+from datetime import date
+from types import SimpleNamespace
+
+DBF_ENCODING = 'cp866' # Кодировка DOS
+HEADER_TERMINATOR = 0x0D
+RECORD_ACTIVE = 0x20 # ' ' — запись; '*' — удалённая запись
+END_OF_FILE = 0x1A
+
+# Наименьшая длина VARCHAR, как при загрузке до появления потокового разбора
+MIN_VARCHAR_LENGTH = 255
+# N без дробной части длиной до 9 цифр помещается в INTEGER
+MAX_INTEGER_DIGITS = 9
+
+
+class DBFFormatError(ValueError):
+    pass
+
+
+def sql_field_types(fields):
+    """
+    {имя поля: тип SQL} по описаниям полей DBF:
+    C — VARCHAR(длина, не меньше 255); N/F без дробной части — INTEGER
+    (длинные — NUMERIC), с дробной — NUMERIC; I — INTEGER; Y — NUMERIC;
+    остальное (даты, логические, memo) — VARCHAR(255) с текстом значения.
+    """
+    field_types = {}
+    for field in fields:
+        if field.type == 'C':
+            field_types[field.name] = f'VARCHAR({max(MIN_VARCHAR_LENGTH, field.length)})'
+        elif field.type in 'NF':
+            if field.decimal_count == 0 and field.length <= MAX_INTEGER_DIGITS:
+                field_types[field.name] = 'INTEGER'
+            else:
+                field_types[field.name] = 'NUMERIC'
+        elif field.type in 'I+':
+            field_types[field.name] = 'INTEGER'
+        elif field.type == 'Y':
+            field_types[field.name] = 'NUMERIC'
+        else:
+            field_types[field.name] = f'VARCHAR({MIN_VARCHAR_LENGTH})'
+    return field_types
+
+
+def field_descriptors(fields):
+    """
+    Описания полей для хранения (DBFUpload.dbf_fields): по ним core/dbf_export.py
+    записывает DBF с теми же полями, что и у загруженного файла.
+    """
+    return [
+        {'name': field.name, 'type': field.type, 'length': field.length, 'decimal_count': field.decimal_count}
+        for field in fields
+    ]
+
+
+def _as_text(value):
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, bool):
+        return 'true' if value else 'false' # Так же, как приведение boolean к varchar в PostgreSQL
+    return str(value)
+
+
+def _as_integer(value):
+    # «12.0» в числовом поле разбирается как float
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+# Разбор по тексту поля: запись декодируется целиком (см. DBFStreamParser.feed).
+# Результат — как у dbfread.FieldParser, приведённый к типу столбца.
+
+def _parse_char(text):
+    return text.rstrip('\0 ')
+
+
+def _strip_nul(value):
+    # Символ \0 внутри текста PostgreSQL не принимает
+    return value.replace('\0', '') if isinstance(value, str) else value
+
+
+def _parse_numeric(text):
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    # Поле бывает дополнено звёздочками; пустое поле — NULL
+    text = text.strip().strip('*')
+    if not text:
+        return None
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text.replace(',', '.'))
+    except ValueError:
+        raise ValueError(f'неверное число {text!r}') from None
+
+
+def _parse_integer(text):
+    value = _as_integer(_parse_numeric(text))
+    if isinstance(value, float):
+        raise ValueError(f'дробное число {text.strip()!r} в целом поле')
+    return value
+
+
+def _parse_date(text):
+    try:
+        return date(int(text[:4]), int(text[4:6]), int(text[6:8])).isoformat()
+    except ValueError:
+        # Пробелы и нули — пустая дата
+        if not text.strip(' 0\0'):
+            return None
+        raise ValueError(f'неверная дата {text!r}') from None
+
+
+def _parse_logical(text):
+    if text in 'TtYy':
+        return 'true'
+    if text in 'FfNn':
+        return 'false'
+    if text in '? \0':
+        return None
+    raise ValueError(f'неверное логическое значение {text!r}')
+
+
+def _column_parser(field, field_type, field_parser, encoding):
+    if field.type == 'C':
+        return _parse_char
+    if field.type in 'NF':
+        return _parse_integer if field_type == 'INTEGER' else _parse_numeric
+    if field.type == 'D' and field.length == 8:
+        return _parse_date
+    if field.type == 'L' and field.length == 1:
+        return _parse_logical
+    # Остальные типы (в том числе двоичные) — разбором dbfread по исходным байтам
+    parse = field_parser._lookup.get(field.type)
+    if parse is None:
+        raise DBFFormatError(f'Неизвестный тип поля DBF: {field.type!r}.')
+    if field_type == 'INTEGER':
+        convert = _as_integer
+    elif field_type == 'NUMERIC':
+        convert = lambda value: value
+    else:
+        convert = _as_text
+    return lambda text: convert(parse(field, text.encode(encoding)))
+
+
+class DBFStreamParser:
+    """
+    Потоковый разбор DBF. feed(данные) возвращает список записей (кортежей
+    значений в порядке полей), полностью поместившихся в уже полученные данные;
+    после заголовка становятся доступны fields, field_names и field_types.
+    Значения уже приведены к field_types (даты и логические — текстом).
+    Записи с ошибками пропускаются и добавляются в rejected:
+    [(номер записи в файле, причина, текст записи)]; вызывающий забирает их после feed().
+
+    Кодировка должна быть однобайтовой: запись декодируется целиком, и смещения
+    полей в байтах совпадают со смещениями в символах.
+    """
+    def __init__(self, encoding=DBF_ENCODING):
+        if len(bytes(range(256)).decode(encoding)) != 256:
+            raise ValueError(f'Кодировка {encoding} не однобайтовая.')
+        self.encoding = encoding
+        self.header = None
+        self.fields = None
+        self.field_names = None
+        self.field_types = None
+        self.finished = False
+        self.bytes_received = 0
+        self.rejected = []
+        # Записей файла до начала буфера (включая удалённые) — для номеров отклонённых записей
+        self._records_before = 0
+        self._buffer = bytearray()
+        self._layout = None
+
+    @property
+    def header_ready(self):
+        return self.fields is not None
+
+    def _read_header(self):
+        """
+        Разбирает заголовок, когда он получен целиком. False — данных пока мало.
+        """
+        # dbfread нужен только при загрузке — не при старте веб-процесса
+        from dbfread.dbf import DBFField, DBFHeader
+        from dbfread.field_parser import FieldParser
+
+        if len(self._buffer) < DBFHeader.size:
+            return False
+        header = DBFHeader.unpack(bytes(self._buffer[:DBFHeader.size]))
+        if header.headerlen <= DBFHeader.size or header.recordlen < 1:
+            raise DBFFormatError('Файл не похож на DBF: неверный заголовок.')
+        if len(self._buffer) < header.headerlen:
+            return False
+
+        fields = []
+        position = DBFHeader.size
+        while position + DBFField.size <= header.headerlen and self._buffer[position] not in (HEADER_TERMINATOR, 0x0A):
+            field = DBFField.unpack(bytes(self._buffer[position:position + DBFField.size]))
+            position += DBFField.size
+            field.type = chr(ord(field.type))
+            # Для символьных полей длиннее 255 байт старший байт длины хранится в decimal_count
+            if field.type == 'C':
+                field.length |= field.decimal_count << 8
+                field.decimal_count = 0
+            # Имя поля заканчивается на b'\0'
+            field.name = field.name.split(b'\0')[0].decode(self.encoding)
+            fields.append(field)
+        if not fields:
+            raise DBFFormatError('В заголовке DBF нет описаний полей.')
+        if sum(field.length for field in fields) + 1 > header.recordlen:
+            raise DBFFormatError('Файл не похож на DBF: длина записи не совпадает с описаниями полей.')
+
+        self.header = header
+        self.fields = fields
+        self.field_names = [field.name for field in fields]
+        self.field_types = sql_field_types(fields)
+        # FieldParser нужны только кодировка и версия — как у dbfread.DBF
+        field_parser = FieldParser(SimpleNamespace(header=header, encoding=self.encoding, char_decode_errors='strict'))
+        # (функция разбора, начало, конец) внутри записи; первый символ — признак удаления
+        layout = []
+        offset = 1
+        for field in fields:
+            parse = _column_parser(field, self.field_types[field.name], field_parser, self.encoding)
+            layout.append((parse, offset, offset + field.length))
+            offset += field.length
+        self._layout = layout
+        del self._buffer[:header.headerlen]
+        return True
+
+    def feed(self, data):
+        self.bytes_received += len(data)
+        if self.finished:
+            return []
+        self._buffer += data
+        if not self.header_ready and not self._read_header():
+            return []
+
+        records = []
+        record_length = self.header.recordlen
+        buffer = self._buffer
+        layout = self._layout
+        encoding = self.encoding
+        position = 0
+        end = len(buffer) - record_length
+        while position <= end:
+            flag = buffer[position]
+            if flag == END_OF_FILE:
+                self.finished = True
+                break
+            if flag == RECORD_ACTIVE:
+                record = buffer[position:position + record_length].decode(encoding)
+                try:
+                    values = tuple([parse(record[start:stop]) for parse, start, stop in layout])
+                except Exception as e:
+                    self._reject(position // record_length, record, e)
+                else:
+                    if '\0' in record:
+                        values = tuple([_strip_nul(value) for value in values])
+                    records.append(values)
+            position += record_length
+        if position < len(buffer) and buffer[position] == END_OF_FILE:
+            self.finished = True
+        self._records_before += position // record_length
+        del buffer[:position]
+        return records
+
+    def _reject(self, index, record, error):
+        """
+        Запоминает запись с ошибкой: index — номер записи в буфере (с нуля).
+        Причина — по первому полю, которое не разбирается.
+        """
+        reason = str(error)
+        for name, (parse, start, stop) in zip(self.field_names, self._layout):
+            try:
+                parse(record[start:stop])
+            except Exception as e:
+                reason = f'{name}: {e}'
+                break
+        self.rejected.append((self._records_before + index + 1, reason, _strip_nul(record[1:]).rstrip()))
+
+    def close(self):
+        """
+        Конец данных. Проверяет, что файл не оборван посреди заголовка или записи.
+        """
+        if not self.header_ready:
+            raise DBFFormatError('Файл DBF оборван: заголовок получен не полностью.')
+        if not self.finished and self._buffer:
+            raise DBFFormatError(f'Файл DBF оборван: последняя запись неполная ({len(self._buffer)} байт).')
@@ -0,0 +1,169 @@
+# core/dedup.py
+"""
+Удаление дубликатов записей при загрузке DBF (core/ingest.py).
+
+В исходных файлах часто встречаются одинаковые записи или записи, которые
+отличаются только регистром, Ё/Е и пробелами. RowDeduplicator в том же
+потоковом проходе, что и COPY, считает для каждой записи 64-битный хэш
+нормализованных значений (всех столбцов или ключевых) и пропускает записи,
+хэш которых уже встречался. Режимы:
+
+- drop  — повторы отбрасываются;
+- count — повторы отбрасываются, а у первой записи в столбце DUP_COUNT
+          остаётся число её вхождений в файле.
+
+Хэши хранятся множеством целых чисел в памяти; когда их больше
+INGEST_DEDUP_MEMORY_KEYS, множество переносится в файл SQLite на диске
+(INGEST_DEDUP_SPILL_DIR) и дальше проверяется пачками — память не растёт
+с размером файла. Числа повторов (режим count) переносятся вместе с хэшами
+(столбец n) и дальше прибавляются в файле. Вероятность ложного совпадения 64-битных хэшей для
+10^8 записей — порядка 10^-3.
+"""
+import hashlib
+import os
+import sqlite3
+import tempfile
+
+from django.conf import settings
+
+from .search_keys import normalize_search_value
+
+MODE_DROP = 'drop'
+MODE_COUNT = 'count'
+MODES = (MODE_DROP, MODE_COUNT)
+# Число вхождений записи (режим count)
+COUNT_COLUMN = 'DUP_COUNT'
+# Хэш записи в промежуточной таблице (режим count), удаляется после загрузки
+HASH_COLUMN = 'core_dedup_hash'
+# Сколько хэшей проверять в файле одним запросом (ограничение SQLite на число параметров)
+SPILL_QUERY_SIZE = 900
+# Сколько чисел повторов отдавать одной пачкой (iter_repeat_counts)
+REPEAT_COUNTS_BATCH_SIZE = 10000
+NULL_MARK = '\0'
+VALUE_SEPARATOR = '\x1f'
+
+
+def normalize_value(value):
+    """
+    Значение для сравнения записей: текст — как ключи поиска (регистр, Ё/Е, пробелы),
+    числа — без различия 12 и 12.0.
+    """
+    if value is None:
+        return NULL_MARK
+    if isinstance(value, str):
+        return normalize_search_value(value)
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def parse_keys(text):
+    """
+    'FAM, IM DR' -> ['FAM', 'IM', 'DR'].
+    """
+    return [key for key in text.replace(',', ' ').split() if key]
+
+
+class RowDeduplicator:
+    """
+    filter(пачка записей) возвращает записи, которые встретились впервые
+    (в режиме count — с хэшем записи, см. ingest.DBFStreamLoad), и считает
+    отброшенные в duplicates; iter_repeat_counts() — числа отброшенных
+    повторов по хэшам (режим count). Используется в одном потоке.
+    """
+    def __init__(self, field_names, mode, keys=()):
+        if mode not in MODES:
+            raise ValueError(f'Неизвестный режим удаления дубликатов: {mode!r}.')
+        unknown = [key for key in keys if key not in field_names]
+        if unknown:
+            raise ValueError(f'В файле нет ключевых полей: {", ".join(unknown)}.')
+        self.mode = mode
+        self.key_indexes = [field_names.index(key) for key in keys] or list(range(len(field_names)))
+        self.memory_keys = settings.INGEST_DEDUP_MEMORY_KEYS
+        self.duplicates = 0
+        # Режим count: {хэш: сколько повторов отброшено} — только для записей с повторами
+        # и только для хэшей в памяти; у перенесённых в файл — столбец n
+        self.repeat_counts = {}
+        self._seen = set()
+        self._spill = None
+        self._spill_path = None
+
+    def row_hash(self, record):
+        text = VALUE_SEPARATOR.join([normalize_value(record[index]) for index in self.key_indexes])
+        # Знаковое 64-битное число — помещается в BIGINT и INTEGER PRIMARY KEY SQLite
+        return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'big', signed=True)
+
+    def _spilled(self, hashes):
+        """
+        Какие из хэшей уже перенесены в файл.
+        """
+        found = set()
+        hashes = list(hashes)
+        for start in range(0, len(hashes), SPILL_QUERY_SIZE):
+            part = hashes[start:start + SPILL_QUERY_SIZE]
+            placeholders = ', '.join('?' * len(part))
+            found.update(row[0] for row in self._spill.execute(f'SELECT h FROM seen WHERE h IN ({placeholders})', part))
+        return found
+
+    def _spill_to_disk(self):
+        if self._spill is None:
+            fd, self._spill_path = tempfile.mkstemp(prefix='core_dedup_', suffix='.sqlite3', dir=settings.INGEST_DEDUP_SPILL_DIR)
+            os.close(fd)
+            self._spill = sqlite3.connect(self._spill_path)
+            # Файл временный: надёжность записи не нужна
+            self._spill.execute('PRAGMA journal_mode = OFF')
+            self._spill.execute('PRAGMA synchronous = OFF')
+            self._spill.execute('CREATE TABLE seen (h INTEGER PRIMARY KEY, n INTEGER NOT NULL) WITHOUT ROWID')
+        repeat_counts = self.repeat_counts
+        self._spill.executemany('INSERT INTO seen VALUES (?, ?)', ((h, repeat_counts.get(h, 0)) for h in self._seen))
+        self._spill.commit()
+        print(f"DEBUG: dedup spilled {len(self._seen)} hashes to {self._spill_path}")
+        self._seen = set()
+        self.repeat_counts = {}
+
+    def filter(self, records):
+        hashes = [self.row_hash(record) for record in records]
+        spilled = self._spilled(set(hashes) - self._seen) if self._spill is not None else ()
+        seen = self._seen
+        counting = self.mode == MODE_COUNT
+        spilled_repeats = {}
+        unique = []
+        for record, row_hash in zip(records, hashes):
+            if row_hash in seen:
+                self.duplicates += 1
+                if counting:
+                    self.repeat_counts[row_hash] = self.repeat_counts.get(row_hash, 0) + 1
+                continue
+            if row_hash in spilled:
+                self.duplicates += 1
+                if counting:
+                    spilled_repeats[row_hash] = spilled_repeats.get(row_hash, 0) + 1
+                continue
+            seen.add(row_hash)
+            unique.append(record + (1, row_hash) if counting else record)
+        if spilled_repeats:
+            self._spill.executemany('UPDATE seen SET n = n + ? WHERE h = ?', ((n, h) for h, n in spilled_repeats.items()))
+            self._spill.commit()
+        if len(seen) >= self.memory_keys:
+            self._spill_to_disk()
+        return unique
+
+    def iter_repeat_counts(self):
+        """
+        Режим count: пачки [(хэш, сколько повторов отброшено)] по записям с повторами —
+        из памяти и из файла (не больше REPEAT_COUNTS_BATCH_SIZE за раз).
+        """
+        items = list(self.repeat_counts.items())
+        for start in range(0, len(items), REPEAT_COUNTS_BATCH_SIZE):
+            yield items[start:start + REPEAT_COUNTS_BATCH_SIZE]
+        if self._spill is not None:
+            rows = self._spill.execute('SELECT h, n FROM seen WHERE n > 0')
+            for batch in iter(lambda: rows.fetchmany(REPEAT_COUNTS_BATCH_SIZE), []):
+                yield batch
+
+    def close(self):
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+            os.unlink(self._spill_path)
+        self._seen = set()
@@ -0,0 +1,152 @@
+# core/diagnostics.py
+"""
+Диагностика медленных поисков.
+
+Поиск, превысивший порог SLOW_SEARCH_THRESHOLD_MS, с вероятностью
+SLOW_SEARCH_SAMPLE_RATE отправляется в фоновый поток, который выполняет
+EXPLAIN (ANALYZE, BUFFERS) и сохраняет план в SlowSearchLog.
+Запрос пользователя при этом не ждёт снятия плана.
+"""
+import json
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from . import search_keys
+
+# Один фоновый поток: EXPLAIN ANALYZE повторно выполняет запрос,
+# поэтому параллельно снимать несколько планов не стоит
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='core-explain')
+# Ограничение очереди: если планов ждёт слишком много, новые просто пропускаем
+_pending = threading.BoundedSemaphore(settings.SLOW_SEARCH_MAX_PENDING)
+
+
+def should_capture(duration_ms):
+    """
+    Нужно ли снимать план для поиска с указанной длительностью.
+    """
+    if duration_ms < settings.SLOW_SEARCH_THRESHOLD_MS:
+        return False
+    return random.random() < settings.SLOW_SEARCH_SAMPLE_RATE
+
+
+def capture_slow_search(table_name, search_fields, sql_query, params, duration_ms, rows_returned=0, user_id=None,
+                        using=DEFAULT_DB_ALIAS):
+    """
+    Ставит в очередь снятие плана для медленного поиска.
+    using — база, в которой выполнялся поиск (план снимается там же).
+    Возвращает True, если задача поставлена в очередь.
+    """
+    if not should_capture(duration_ms):
+        return False
+    if not _pending.acquire(blocking=False):
+        print(f"DEBUG: diagnostics - queue is full, skipping plan for table {table_name}")
+        return False
+    try:
+        _executor.submit(
+            _explain_and_store,
+            table_name, ','.join(sorted(search_fields)), sql_query, list(params),
+            duration_ms, rows_returned, user_id, using,
+        )
+    except RuntimeError:
+        # Пул уже остановлен (завершение процесса)
+        _pending.release()
+        return False
+    return True
+
+
+def _walk_plan(node):
+    """
+    Обходит дерево плана (формат JSON) и возвращает все узлы.
+    """
+    yield node
+    for child in node.get('Plans', []):
+        yield from _walk_plan(child)
+
+
+def _explain_and_store(table_name, search_fields, sql_query, params, duration_ms, rows_returned, user_id, using):
+    from .models import SlowSearchLog
+
+    plan = None
+    plan_execution_ms = None
+    has_seq_scan = False
+    error = ''
+    try:
+        with connections[using].cursor() as cursor:
+            # Поток использует своё соединение. client_encoding не меняем:
+            # план в формате JSON разбирается драйвером как UTF-8
+            cursor.execute("SET statement_timeout = %s;", [settings.SLOW_SEARCH_EXPLAIN_TIMEOUT_MS])
+            cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql_query}", params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        top = plan[0]
+        plan_execution_ms = top.get('Execution Time')
+        has_seq_scan = any(node.get('Node Type') == 'Seq Scan' for node in _walk_plan(top['Plan']))
+    except Exception as e:
+        error = str(e)
+        print(f"Warning: could not capture plan for table '{table_name}': {error}")
+
+    try:
+        SlowSearchLog.objects.create(
+            table_name=table_name,
+            search_fields=search_fields,
+            duration_ms=duration_ms,
+            plan_execution_ms=plan_execution_ms,
+            rows_returned=rows_returned,
+            has_seq_scan=has_seq_scan,
+            sql_query=sql_query,
+            plan=plan,
+            error=error,
+            user_id=user_id,
+        )
+    except Exception as e:
+        print(f"Warning: could not store slow search log for table '{table_name}': {e}")
+    finally:
+        # Соединения потока больше не нужны — не держим их открытыми
+        connections.close_all()
+        _pending.release()
+
+
+def suggest_indexes(offenders):
+    """
+    Подсказки по индексам для списка «худших» комбинаций поиска.
+    offenders — список словарей с ключами table_name и search_fields.
+    Настройки полей из TableTemplateFieldConfig загружаются одним запросом.
+    """
+    from .models import TableTemplateFieldConfig
+
+    tables = {row['table_name'] for row in offenders}
+    configured = {}
+    for table_name, field_name in TableTemplateFieldConfig.objects.filter(
+        template_type='search',
+        table_template__table_name__in=tables,
+    ).values_list('table_template__table_name', 'field_name'):
+        configured.setdefault(table_name, set()).add(field_name)
+
+    for row in offenders:
+        table_name = row['table_name']
+        table_fields = configured.get(table_name, set())
+        suggestions = []
+        for field_name in filter(None, row['search_fields'].split(',')):
+            if field_name in table_fields:
+                # Поле шаблона ищется по нормализованному ключу: индекс должен быть,
+                # а Seq Scan обычно означает поиск с ведущим '*' (по подстроке)
+                suggestions.append(
+                    f'CREATE INDEX IF NOT EXISTS "{search_keys.index_name(table_name, field_name)}" '
+                    f'ON "{table_name}" ({search_keys.key_expression(field_name)} text_pattern_ops);'
+                )
+                suggestions.append(
+                    f'-- Для поиска по подстроке в "{field_name}": '
+                    f'CREATE INDEX CONCURRENTLY ON "{table_name}" USING gin ({search_keys.key_expression(field_name)} gin_trgm_ops);'
+                )
+            else:
+                suggestions.append(
+                    f'-- Поле "{field_name}" не входит в шаблон поиска: добавьте его в шаблон '
+                    f'(будет построен индекс по нормализованному ключу) или уберите из формы.'
+                )
+        row['suggestions'] = suggestions
+    return offenders
@@ -0,0 +1,283 @@
+# core/entity_links.py
+"""
+Индекс связей: один и тот же человек в разных реестрах.
+
+Один человек встречается в нескольких импортированных таблицах под разными
+именами столбцов. Какие столбцы содержат фамилию, имя, дату рождения и
+документ, задают роли полей шаблона (TableTemplateFieldConfig.role) — те же,
+что и для поиска по всем таблицам (core/federated.py). После загрузки таблицы
+и изменения шаблона её строки заносятся в общую таблицу EntityLink:
+нормализованный ключ -> (таблица, секция, номер строки core_row_id). Ключи:
+
+- person   — фамилия + первая буква имени + дата рождения (отчество в ключ
+             не входит: во многих реестрах его нет);
+- document — номер документа без пробелов и знаков.
+
+Ключи вычисляют SQL-функции core_person_key / core_document_key (миграция
+0018_core_link_keys) — и при построении индекса, и при поиске.
+
+Связанные записи находятся одной пробой по индексу ключа вместо поиска по
+каждой таблице; строки затем читаются по core_row_id (столбец с индексом,
+заполняется при загрузке, см. core/sql_utils.py). При перезагрузке строки
+получают новые номера, а строка ещё и проверяется повторным вычислением
+ключа — записи индекса, оставшиеся от прежней версии таблицы или шаблона,
+просто не находят строк.
+
+Индекс перестраивается в фоновом потоке (rebuild_in_background) после
+фиксации загрузки или изменения шаблона — не в запросе и не под блокировкой
+загрузки таблицы. Перестроения одной таблицы выполняются по очереди.
+"""
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import DatabaseError, connection, connections, transaction
+from django.dispatch import receiver
+from django.utils.http import urlencode
+
+from . import catalog
+from .db_routing import get_read_alias, pin_to_primary
+from .models import EntityLink, TableTemplateFieldConfig
+from .signals import table_loaded, template_changed
+from .sql_utils import ROW_ID_COLUMN, ROW_ID_COLUMN_SQL, short_identifier
+
+# Пространство рекомендательных блокировок перестроения индекса (ключ — hashtext(таблица))
+LINKS_LOCK_SPACE = 0x1D800
+
+# (вид ключа, описание, роли полей, SQL-функция ключа)
+LINK_KEYS = (
+    ('person', 'Фамилия, имя, дата рождения', ('last_name', 'first_name', 'birth_date'), 'core_person_key'),
+    ('document', 'Документ', ('document',), 'core_document_key'),
+)
+KEY_LABELS = {kind: label for kind, label, _, _ in LINK_KEYS}
+# Роли, из которых строятся ключи, в порядке ROLE_CHOICES
+LINK_ROLES = [
+    role for role, _ in TableTemplateFieldConfig.ROLE_CHOICES
+    if any(role in roles for _, _, roles, _ in LINK_KEYS)
+]
+
+
+def get_link_roles(table_name):
+    """
+    {роль: поле} по шаблону таблицы (поля поиска и вывода).
+    """
+    roles = {}
+    for field_name, role in TableTemplateFieldConfig.objects.filter(
+        table_template__table_name=table_name,
+    ).exclude(role='').values_list('field_name', 'role'):
+        roles.setdefault(role, field_name)
+    return roles
+
+
+def key_expressions(roles):
+    """
+    [(вид ключа, SQL-выражение ключа строки)] для ключей, все роли которых есть среди roles.
+    """
+    expressions = []
+    for kind, _, key_roles, function in LINK_KEYS:
+        if all(role in roles for role in key_roles):
+            arguments = ', '.join(f'"{roles[role]}"::text' for role in key_roles)
+            expressions.append((kind, f'{function}({arguments})'))
+    return expressions
+
+
+def link_query(values):
+    """
+    Параметры ссылки на связанные записи по значениям ролей строки
+    ('' — не заполнен ни один ключ целиком).
+    """
+    values = {role: values[role] for role in LINK_ROLES if values.get(role) not in (None, '')}
+    if not any(all(role in values for role in key_roles) for _, _, key_roles, _ in LINK_KEYS):
+        return ''
+    return urlencode(values)
+
+
+def ensure_row_ids(cursor, table_name):
+    """
+    Столбец core_row_id и индекс по нему. Таблицам, загруженным до появления
+    столбца, он добавляется (таблица перезаписывается — один раз).
+    """
+    cursor.execute(
+        "SELECT 1 FROM information_schema.columns WHERE table_schema = 'public' AND table_name = %s AND column_name = %s;",
+        [table_name, ROW_ID_COLUMN],
+    )
+    if cursor.fetchone() is None:
+        print(f"DEBUG: adding {ROW_ID_COLUMN} to {table_name}")
+        cursor.execute(f'ALTER TABLE "{table_name}" ADD COLUMN {ROW_ID_COLUMN_SQL};')
+    index_name = short_identifier(f"{table_name}_{ROW_ID_COLUMN}_idx")
+    cursor.execute(f'CREATE INDEX IF NOT EXISTS "{index_name}" ON "{table_name}" ("{ROW_ID_COLUMN}");')
+
+
+def build_links(table_name, relation=None):
+    """
+    (Пере)строит записи индекса связей для таблицы или, если задана relation,
+    только для этой её секции. Возвращает число записей индекса.
+    """
+    roles = get_link_roles(table_name)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT column_name FROM information_schema.columns WHERE table_schema = 'public' AND table_name = %s;",
+            [table_name],
+        )
+        table_columns = {row[0] for row in cursor.fetchall()}
+    expressions = key_expressions({role: f for role, f in roles.items() if f in table_columns})
+
+    if expressions:
+        # Столбец и индекс номеров строк — отдельной транзакцией: исключительная
+        # блокировка таблицы не держится до конца построения индекса связей
+        with transaction.atomic(), connection.cursor() as cursor:
+            ensure_row_ids(cursor, table_name)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Перестроения одной таблицы — по очереди (две загрузки подряд, загрузка и команда)
+        cursor.execute("SELECT pg_advisory_xact_lock(%s, hashtext(%s));", [LINKS_LOCK_SPACE, table_name])
+        links = EntityLink.objects.filter(table_name=table_name)
+        if relation:
+            links = links.filter(relation=relation)
+        links.delete()
+        if not expressions:
+            return 0 # Таблицы нет или в шаблоне нет полей для ключей
+
+        # Все ключи строки — за один проход по таблице; имя секции — по tableoid строки
+        keys_sql = ', '.join(f'({expression})' for _, expression in expressions)
+        cursor.execute(f"""
+            INSERT INTO "{EntityLink._meta.db_table}" (key, table_name, relation, row_id)
+            SELECT k.key, %s, c.relname, t."{ROW_ID_COLUMN}"
+            FROM "{relation or table_name}" t
+            JOIN pg_class c ON c.oid = t.tableoid
+            CROSS JOIN LATERAL (VALUES {keys_sql}) AS k(key)
+            WHERE k.key IS NOT NULL;
+        """, [table_name])
+        total = cursor.rowcount
+    print(f"DEBUG: entity links for {relation or table_name}: {total} keys ({', '.join(kind for kind, _ in expressions)})")
+    return total
+
+
+def rebuild_in_background(table_name, relation=None):
+    """
+    build_links в отдельном потоке после фиксации текущей транзакции:
+    загрузка и сохранение шаблона не ждут перестроения индекса.
+    """
+    def run():
+        try:
+            # Роли шаблона — из основной базы: реплика может ещё не видеть только что сохранённый шаблон
+            with pin_to_primary():
+                build_links(table_name, relation)
+        except Exception as e:
+            print(f"Warning: entity links for {relation or table_name} failed: {e}")
+        finally:
+            connections.close_all()
+
+    def start():
+        threading.Thread(target=run, name='core-entity-links', daemon=True).start()
+
+    transaction.on_commit(start)
+
+
+def _result_columns(table_name):
+    """
+    [(столбец, подпись)]: поля вывода шаблона в заданном порядке или, если их нет, все столбцы.
+    """
+    fields = catalog.get_field_metadata(table_name)['fields']
+    result_fields = sorted((field for field in fields if 'result' in field), key=lambda field: field['result'])
+    return [
+        (field['name'], field.get('result_label') or field.get('label') or field['name'])
+        for field in result_fields or fields
+    ]
+
+
+def _fetch_rows(cursor, table_name, relations, keys):
+    """
+    Строки таблицы по номерам: relations — {секция: {номер строки: виды ключей}}.
+    Возвращает (столбцы, строки); строки, ключ которых уже не совпадает, пропускаются.
+    """
+    columns = _result_columns(table_name)
+    table_columns = set(catalog.get_table_columns(table_name))
+    expressions = key_expressions({role: f for role, f in get_link_roles(table_name).items() if f in table_columns})
+    if not expressions:
+        return columns, []
+
+    select_cols = ', '.join(f'"{name}"' for name, _ in columns)
+    recheck = ' OR '.join(f'{expression} = ANY(%s::text[])' for _, expression in expressions)
+    rows = []
+    for relation, matches in relations.items():
+        cursor.execute(
+            f'SELECT "{ROW_ID_COLUMN}", {select_cols} FROM "{relation}" '
+            f'WHERE "{ROW_ID_COLUMN}" = ANY(%s::bigint[]) AND ({recheck});',
+            [list(matches)] + [keys] * len(expressions),
+        )
+        for row in cursor.fetchall():
+            kinds = matches[row[0]]
+            rows.append({
+                'values': list(row[1:]),
+                'matched': [label for kind, label in KEY_LABELS.items() if kind in kinds],
+            })
+    return columns, rows
+
+
+def find_linked(criteria, limit=None):
+    """
+    Связанные записи во всех таблицах по значениям ролей.
+
+    criteria — {роль: значение}; ключ участвует в поиске, только если заполнены все его роли.
+    Возвращает {'kinds': [описания использованных ключей], 'tables': [...], 'truncated': bool},
+    tables — [{'table', 'columns': [(столбец, подпись)], 'rows': [{'values', 'matched'}], 'error'}]
+    в порядке имён таблиц.
+    """
+    criteria = {role: (value or '').strip() for role, value in criteria.items()}
+    limit = limit or settings.ENTITY_LINKS_MAX_ROWS
+    wanted = [
+        (kind, f'{function}({", ".join(["%s"] * len(key_roles))})', [criteria[role] for role in key_roles])
+        for kind, _, key_roles, function in LINK_KEYS
+        if all(criteria.get(role) for role in key_roles)
+    ]
+    outcome = {'kinds': [KEY_LABELS[kind] for kind, _, _ in wanted], 'tables': [], 'truncated': False}
+    if not wanted:
+        return outcome
+
+    values_sql = ', '.join(f'(%s, {expression})' for _, expression, _ in wanted)
+    params = [param for kind, _, values in wanted for param in [kind] + values]
+    alias = get_read_alias()
+    with connections[alias].cursor() as cursor:
+        # Одна проба по индексу ключа на каждый вид ключа
+        cursor.execute(f"""
+            SELECT w.kind, l.key, l.table_name, l.relation, l.row_id
+            FROM (VALUES {values_sql}) AS w(kind, key)
+            JOIN "{EntityLink._meta.db_table}" l ON l.key = w.key
+            ORDER BY l.table_name, l.relation, l.row_id
+            LIMIT %s;
+        """, params + [limit + 1])
+        links = cursor.fetchall()
+        outcome['truncated'] = len(links) > limit
+
+        # {таблица: {секция: {номер строки: виды ключей}}}
+        found = defaultdict(lambda: defaultdict(lambda: defaultdict(set)))
+        keys = set()
+        for kind, key, table_name, relation, row_id in links[:limit]:
+            found[table_name][relation][row_id].add(kind)
+            keys.add(key)
+
+        available = set(catalog.get_available_tables())
+        for table_name in sorted(found):
+            if table_name not in available:
+                continue # Таблица удалена, записи индекса остались
+            table = {'table': table_name, 'columns': [], 'rows': [], 'error': None}
+            try:
+                table['columns'], table['rows'] = _fetch_rows(cursor, table_name, found[table_name], sorted(keys))
+            except DatabaseError as e:
+                table['error'] = str(e)
+                print(f"Warning: linked records in {table_name} failed: {e}")
+            if table['rows'] or table['error']:
+                outcome['tables'].append(table)
+    return outcome
+
+
+@receiver(table_loaded)
+def rebuild_after_load(sender, table_name, partition=None, **kwargs):
+    # После загрузки секции перестраиваются только её записи
+    rebuild_in_background(table_name, partition)
+
+
+@receiver(template_changed)
+def rebuild_after_template_change(sender, table_name, **kwargs):
+    rebuild_in_background(table_name)
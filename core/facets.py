@@ -0,0 +1,94 @@
+# core/facets.py
+"""
+Фасеты: счётчики значений для полей шаблона, отмеченных is_facet.
+
+Для текущего набора фильтров поиска счётчики всех фасетных полей считаются
+одним запросом GROUP BY GROUPING SETS, по FACET_MAX_VALUES самых частых
+значений на поле. Результат кэшируется по поколению таблицы, поэтому
+повторное «сужение» поиска не порождает новых широких запросов.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import catalog
+from .db_routing import get_read_connection
+from .models import TableTemplateFieldConfig
+
+CACHE_PREFIX = 'core:facets'
+# Параметр ссылки «сузить поиск»: facet__<поле>=значение — точное совпадение со значением фасета
+# (в отличие от поиска по полю: по началу значения или по части строки)
+FACET_PARAM_PREFIX = 'facet__'
+
+
+def get_facet_fields(table_name):
+    """
+    Фасетные поля шаблона: [(имя поля, подпись), ...] без повторов, в порядке шаблона.
+    """
+    fields = {}
+    for field_name, field_label in TableTemplateFieldConfig.objects.filter(
+        table_template__table_name=table_name,
+        is_facet=True,
+    ).values_list('field_name', 'field_label'):
+        fields.setdefault(field_name, field_label)
+    return list(fields.items())
+
+
+def _facets_sql(source_table, facet_fields, where_clause):
+    columns = ', '.join(f'"{f}"' for f in facet_fields)
+    values = ', '.join(f'"{f}"::text' for f in facet_fields)
+    sets = ', '.join(f'("{f}")' for f in facet_fields)
+    where_sql = f'WHERE {where_clause}' if where_clause else ''
+    # В строке набора i все поля, кроме i-го, равны NULL, поэтому COALESCE даёт значение i-го поля.
+    # GROUPING(...) — битовая маска, по ней определяем, к какому полю относится строка.
+    return f"""
+        SELECT grp, value, cnt FROM (
+            SELECT grp, value, cnt, row_number() OVER (PARTITION BY grp ORDER BY cnt DESC, value) AS rn
+            FROM (
+                SELECT GROUPING({columns}) AS grp, COALESCE({values}) AS value, count(*) AS cnt
+                FROM "{source_table}"
+                {where_sql}
+                GROUP BY GROUPING SETS ({sets})
+            ) grouped
+        ) ranked
+        WHERE rn <= %s;
+    """
+
+
+def compute_facets(table_name, source_table, where_parts, params, facet_fields):
+    """
+    Счётчики значений фасетных полей для текущих условий поиска.
+    source_table — таблица или её проекция (та же, что и для самого поиска).
+    Возвращает {поле: [(значение, количество), ...]}.
+    """
+    if not facet_fields:
+        return {}
+    where_clause = ' AND '.join(where_parts)
+
+    fingerprint = json.dumps([source_table, facet_fields, where_clause, params], ensure_ascii=False, default=str)
+    cache_key = ':'.join([
+        CACHE_PREFIX, table_name, str(catalog.get_generation(table_name)),
+        hashlib.md5(fingerprint.encode('utf-8')).hexdigest(),
+    ])
+    facets = cache.get(cache_key)
+    if facets is not None:
+        return facets
+
+    n = len(facet_fields)
+    full_mask = (1 << n) - 1
+    # Номер поля по маске GROUPING: у поля i сброшен бит (n - 1 - i)
+    field_by_mask = {full_mask ^ (1 << (n - 1 - i)): field_name for i, field_name in enumerate(facet_fields)}
+
+    facets = {field_name: [] for field_name in facet_fields}
+    with get_read_connection().cursor() as cursor:
+        cursor.execute(
+            _facets_sql(source_table, facet_fields, where_clause),
+            list(params) + [settings.FACET_MAX_VALUES],
+        )
+        for grp, value, cnt in cursor.fetchall():
+            facets[field_by_mask[grp]].append((value, cnt))
+
+    cache.set(cache_key, facets, settings.FACET_CACHE_TIMEOUT)
+    return facets
@@ -0,0 +1,190 @@
+# core/federated.py
+"""
+Поиск сразу по всем импортированным таблицам (федеративный поиск).
+
+Оператор вводит общие критерии (фамилия, дата рождения и т.п.). Какое поле
+таблицы соответствует критерию, задаётся ролью поля в шаблоне
+(TableTemplateFieldConfig.role). В поиске участвуют таблицы, в шаблоне которых
+есть поля для всех введённых критериев.
+
+Запросы к таблицам выполняются параллельно в ограниченном пуле потоков
+(FEDERATED_MAX_WORKERS), у каждого — свой statement_timeout
+(FEDERATED_TIMEOUT_MS) и ограничение числа строк. Медленная таблица
+не задерживает остальные дольше своего тайм-аута.
+
+Дата рождения в реестрах хранится по-разному (DATE, 'ДД.ММ.ГГГГ', 'ГГГГММДД'),
+поэтому для роли birth_date обе стороны приводятся к ГГГГ-ММ-ДД: столбец —
+SQL-функцией core_link_date (миграция 0018, та же, что в индексе связей),
+введённое значение — normalize_birth_date до передачи в запрос.
+"""
+import contextvars
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+from django.utils.http import urlencode
+
+from . import catalog, governor, projections, query_builder
+from .db_routing import get_read_alias
+from .models import TableTemplateFieldConfig
+
+ROLE_LABELS = dict(TableTemplateFieldConfig.ROLE_CHOICES)
+
+BIRTH_DATE_ROLE = 'birth_date'
+# Введённая дата -> (шаблон, полная ли дата); неполная (год, месяц) сравнивается по началу
+BIRTH_DATE_FORMATS = (
+    (re.compile(r'^(?P<d>\d{2})\.(?P<m>\d{2})\.(?P<y>\d{4})$'), True),
+    (re.compile(r'^(?P<y>\d{4})-(?P<m>\d{2})-(?P<d>\d{2})$'), True),
+    (re.compile(r'^(?P<y>\d{4})(?P<m>\d{2})(?P<d>\d{2})$'), True),
+    (re.compile(r'^(?P<m>\d{2})\.(?P<y>\d{4})$'), False),
+    (re.compile(r'^(?P<y>\d{4})-(?P<m>\d{2})$'), False),
+    (re.compile(r'^(?P<y>\d{4})$'), False),
+)
+
+
+def normalize_birth_date(value):
+    """
+    Введённая дата рождения в виде, который даёт core_link_date: (ГГГГ-ММ-ДД, True)
+    для полной даты, (ГГГГ-ММ или ГГГГ, False) для месяца или года; None, если это не дата.
+    """
+    for pattern, exact in BIRTH_DATE_FORMATS:
+        match = pattern.match(value.strip())
+        if match:
+            parts = match.groupdict()
+            return '-'.join(parts[key] for key in ('y', 'm', 'd') if key in parts), exact
+    return None
+
+
+def birth_date_condition(field_name, value):
+    """
+    Условие по дате рождения: (sql, params) или None, если значение не похоже на дату
+    (тогда поле ищется как обычное).
+    """
+    normalized = normalize_birth_date(value)
+    if normalized is None:
+        return None
+    date, exact = normalized
+    expression = f'core_link_date("{field_name}"::text)'
+    if exact:
+        return f'{expression} = %s', [date]
+    return f'{expression} LIKE %s', [f'{date}%'] # Только цифры и дефисы — экранировать нечего
+
+
+def get_table_mappings():
+    """
+    Роли полей по таблицам: {таблица: {'roles': {роль: поле}, 'key_fields': set(...)}}.
+    Только существующие таблицы, у шаблона которых есть хотя бы одно поле с ролью.
+    """
+    available = set(catalog.get_available_tables())
+    mappings = {}
+    for table_name, field_name, template_type, role in TableTemplateFieldConfig.objects.values_list(
+        'table_template__table_name', 'field_name', 'template_type', 'role',
+    ):
+        if table_name not in available:
+            continue
+        mapping = mappings.setdefault(table_name, {'roles': {}, 'key_fields': set()})
+        if template_type == 'search':
+            mapping['key_fields'].add(field_name)
+        if role:
+            mapping['roles'].setdefault(role, field_name)
+    return {table_name: mapping for table_name, mapping in mappings.items() if mapping['roles']}
+
+
+def _search_table(alias, table_name, mapping, criteria, limit, timeout_ms):
+    """
+    Поиск по одной таблице (выполняется в потоке пула).
+    Строки возвращаются с ключами-ролями, чтобы их можно было свести в одну таблицу.
+    alias — база для чтения, выбранная для запроса; задача выполняется в копии контекста запроса,
+    поэтому каталог и проекции читаются из той же базы.
+    """
+    started = time.monotonic()
+    roles = mapping['roles']
+    search_values = {roles[role]: value for role, value in criteria.items()}
+    # Дата рождения сравнивается по core_link_date, остальные роли — как в обычном поиске
+    date_condition = None
+    if BIRTH_DATE_ROLE in criteria:
+        date_condition = birth_date_condition(roles[BIRTH_DATE_ROLE], criteria[BIRTH_DATE_ROLE])
+    outcome = {
+        'table': table_name,
+        'rows': [],
+        'truncated': False,
+        'timed_out': False,
+        'error': None,
+        # Ссылка на обычный поиск по этой таблице с теми же значениями
+        'search_query': urlencode({'table': table_name, **search_values}),
+    }
+    try:
+        columns = set(catalog.get_table_columns(table_name))
+        missing = [f for f in roles.values() if f not in columns]
+        if missing:
+            outcome['error'] = f"В таблице нет столбцов: {', '.join(missing)}"
+            return outcome
+
+        # Проекция подходит, только если в ней есть все поля с ролями
+        projection = projections.get_projection(table_name)
+        if not (projection and set(roles.values()) <= projection['columns']):
+            projection = None
+        source_table = projection['name'] if projection else table_name
+
+        condition_values = dict(search_values)
+        if date_condition:
+            del condition_values[roles[BIRTH_DATE_ROLE]]
+        where_parts, params = query_builder.build_conditions(condition_values, mapping['key_fields'], projection)
+        if date_condition:
+            where_parts.append(date_condition[0])
+            params += date_condition[1]
+        if not where_parts:
+            return outcome
+
+        select_cols = ', '.join(f'"{field_name}" AS "{role}"' for role, field_name in roles.items())
+        sql_query = f'SELECT {select_cols} FROM "{source_table}" WHERE {" AND ".join(where_parts)} LIMIT %s;'
+        with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+            cursor.execute("SET LOCAL statement_timeout = %s;", [timeout_ms])
+            cursor.execute(sql_query, params + [limit + 1])
+            names = [col[0] for col in cursor.description]
+            rows = [dict(zip(names, row)) for row in cursor.fetchall()]
+        outcome['truncated'] = len(rows) > limit
+        outcome['rows'] = rows[:limit]
+    except DatabaseError as e:
+        if governor.is_canceled(e):
+            outcome['timed_out'] = True
+        else:
+            outcome['error'] = str(e)
+        print(f"Warning: federated search in {table_name} failed: {e}")
+    finally:
+        outcome['duration_ms'] = round((time.monotonic() - started) * 1000, 1)
+        # У каждого потока свои соединения — закрываем, чтобы не копились
+        connections.close_all()
+    return outcome
+
+
+def federated_search(criteria):
+    """
+    Поиск по всем таблицам с полями для введённых критериев.
+
+    criteria — {роль: значение}; пустые значения игнорируются.
+    Возвращает список результатов по таблицам (в порядке имён таблиц):
+    [{'table', 'rows', 'truncated', 'timed_out', 'error', 'duration_ms', 'search_query'}, ...].
+    """
+    criteria = {role: value.strip() for role, value in criteria.items() if role in ROLE_LABELS and value and value.strip()}
+    if not criteria:
+        return []
+
+    targets = sorted(
+        (table_name, mapping) for table_name, mapping in get_table_mappings().items()
+        if set(criteria) <= set(mapping['roles'])
+    )
+    if not targets:
+        return []
+
+    alias = get_read_alias()
+    limit = settings.FEDERATED_MAX_ROWS_PER_TABLE
+    timeout_ms = settings.FEDERATED_TIMEOUT_MS
+    with ThreadPoolExecutor(max_workers=min(settings.FEDERATED_MAX_WORKERS, len(targets))) as pool:
+        futures = [
+            pool.submit(contextvars.copy_context().run, _search_table, alias, table_name, mapping, criteria, limit, timeout_ms)
+            for table_name, mapping in targets
+        ]
+        return [future.result() for future in futures]
@@ -0,0 +1,217 @@
+# core/governor.py
+"""
+Ограничения пользовательских поисков.
+
+- statement_timeout по роли пользователя: обычный пользователь — SEARCH_TIMEOUT_MS,
+  is_staff — SEARCH_TIMEOUT_STAFF_MS, суперпользователь — SEARCH_TIMEOUT_SUPERUSER_MS.
+  Устанавливается через SET LOCAL, поэтому действует только до конца транзакции поиска.
+- Отмена запроса в базе, если клиент закрыл соединение (ушёл со страницы, нажал
+  «стоп»): пока запрос выполняется, фоновый поток проверяет сокет клиента и
+  при его закрытии отменяет запрос (cancel на соединении с базой).
+- Тяжёлые поиски (условия, для которых индекс не используется: ILIKE '%...%',
+  шаблон с * в начале) ограничиваются по числу одновременных — не больше
+  SEARCH_HEAVY_PER_USER у одного пользователя и SEARCH_HEAVY_GLOBAL всего.
+  Места — рекомендательные блокировки (pg_try_advisory_lock) в основной базе:
+  они общие для всех процессов и освобождаются сами, если процесс упал.
+  Если мест нет, запрос ждёт в очереди до SEARCH_QUEUE_TIMEOUT секунд, затем
+  получает отказ (SearchRejected) с понятным сообщением.
+"""
+import select
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, transaction
+
+# SQLSTATE query_canceled — statement_timeout или отмена запроса
+QUERY_CANCELED = '57014'
+
+# Пространства ключей рекомендательных блокировок (первый аргумент pg_try_advisory_lock):
+# общие места — (GLOBAL_LOCK_SPACE, номер места), места пользователя — (USER_LOCK_SPACE + номер места, id пользователя)
+GLOBAL_LOCK_SPACE = 0x5EA00
+USER_LOCK_SPACE = 0x5EB00
+
+# Как часто проверять места в очереди и сокет клиента (секунды)
+QUEUE_POLL_INTERVAL = 0.2
+DISCONNECT_POLL_INTERVAL = 0.5
+
+
+class SearchRejected(Exception):
+    """
+    Поиск не выполнен: превышен лимит одновременных поисков, время ожидания
+    или клиент отключился. Текст исключения показывается пользователю.
+    """
+    def __init__(self, message, status=429):
+        super().__init__(message)
+        self.status = status
+
+
+def statement_timeout_ms(user):
+    if user.is_superuser:
+        return settings.SEARCH_TIMEOUT_SUPERUSER_MS
+    if user.is_staff:
+        return settings.SEARCH_TIMEOUT_STAFF_MS
+    return settings.SEARCH_TIMEOUT_MS
+
+
+def is_heavy(params):
+    """
+    Тяжёлый поиск — хотя бы одно условие с шаблоном, начинающимся с %:
+    такое условие не использует индекс и читает таблицу целиком.
+    """
+    return any(isinstance(value, str) and value.startswith('%') for value in params)
+
+
+def is_canceled(error):
+    cause = error.__cause__
+    return getattr(cause, 'sqlstate', None) == QUERY_CANCELED or getattr(cause, 'pgcode', None) == QUERY_CANCELED
+
+
+def acquire_lock(cursor, candidates, deadline):
+    """
+    Первая свободная рекомендательная блокировка из candidates [(пространство, ключ), ...]
+    (сессионная, на соединении cursor). Если свободных нет — ждёт до deadline;
+    None, если не дождались. Используется и для очереди загрузок (core/ingest.py).
+    """
+    while True:
+        for space, key in candidates:
+            cursor.execute("SELECT pg_try_advisory_lock(%s, %s);", [space, key])
+            if cursor.fetchone()[0]:
+                return space, key
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(QUEUE_POLL_INTERVAL)
+
+
+@contextmanager
+def admit(user, heavy=True):
+    """
+    Место для тяжёлого поиска: одно из SEARCH_HEAVY_PER_USER мест пользователя
+    и одно из SEARCH_HEAVY_GLOBAL общих. Лёгкие поиски (heavy=False) проходят сразу.
+    Если за SEARCH_QUEUE_TIMEOUT секунд место не освободилось — SearchRejected.
+    """
+    if not heavy:
+        yield
+        return
+
+    held = []
+    deadline = time.monotonic() + settings.SEARCH_QUEUE_TIMEOUT
+    # Блокировки сессионные — держим их на соединении с основной базой до конца поиска
+    with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+        try:
+            # Сначала место пользователя, чтобы его лишние поиски не занимали общую очередь
+            lock = acquire_lock(
+                cursor, [(USER_LOCK_SPACE + slot, user.id) for slot in range(settings.SEARCH_HEAVY_PER_USER)], deadline,
+            )
+            if lock is None:
+                raise SearchRejected(
+                    f"У вас уже выполняется тяжёлых поисков: {settings.SEARCH_HEAVY_PER_USER}. "
+                    "Дождитесь их завершения или уточните критерии (поиск по началу значения выполняется быстрее)."
+                )
+            held.append(lock)
+            lock = acquire_lock(
+                cursor, [(GLOBAL_LOCK_SPACE, slot) for slot in range(settings.SEARCH_HEAVY_GLOBAL)], deadline,
+            )
+            if lock is None:
+                raise SearchRejected(
+                    "Сервер занят другими тяжёлыми поисками. Повторите поиск через минуту "
+                    "или уточните критерии (поиск по началу значения выполняется быстрее).",
+                    status=503,
+                )
+            held.append(lock)
+            yield
+        finally:
+            for space, key in reversed(held):
+                cursor.execute("SELECT pg_advisory_unlock(%s, %s);", [space, key])
+
+
+def client_socket(request):
+    """
+    Сокет клиента, если сервер его предоставляет: gunicorn кладёт его в environ,
+    у runserver (wsgiref) он доступен через поток тела запроса. Иначе None.
+    """
+    sock = request.META.get('gunicorn.socket')
+    if sock is None:
+        # LimitedStream -> BufferedReader -> SocketIO -> socket
+        # (LimitedStream Django 4.2 хранит только методы исходного потока)
+        stream = request.META.get('wsgi.input')
+        sock = getattr(stream, 'stream', None) or getattr(getattr(stream, '_read', None), '__self__', stream)
+        for attr in ('raw', '_sock'):
+            sock = getattr(sock, attr, sock)
+    return sock if isinstance(sock, socket.socket) else None
+
+
+def _client_gone(sock):
+    """
+    Клиент закрыл соединение: сокет читается, но данных нет (EOF).
+    """
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+        return bool(readable) and sock.recv(1, socket.MSG_PEEK) == b''
+    except (OSError, ValueError):
+        return True
+
+
+@contextmanager
+def cancel_on_disconnect(request, alias):
+    """
+    Пока выполняется блок, следит за сокетом клиента и при его закрытии отменяет
+    текущий запрос на соединении alias. Возвращает словарь {'disconnected': bool}.
+    """
+    state = {'disconnected': False}
+    sock = client_socket(request)
+    if sock is None:
+        yield state
+        return
+
+    db_connection = connections[alias].connection
+    done = threading.Event()
+
+    def watch():
+        while not done.wait(DISCONNECT_POLL_INTERVAL):
+            if _client_gone(sock):
+                state['disconnected'] = True
+                print(f"DEBUG: client disconnected, canceling search on {alias}")
+                try:
+                    db_connection.cancel()
+                except Exception as e:
+                    print(f"Warning: could not cancel search on {alias}: {e}")
+                return
+
+    watcher = threading.Thread(target=watch, name='search-disconnect-watch', daemon=True)
+    watcher.start()
+    try:
+        yield state
+    finally:
+        done.set()
+        watcher.join()
+
+
+@contextmanager
+def governed_search(request, alias, heavy):
+    """
+    Выполнение поиска пользователя на базе alias: место в очереди (для тяжёлых),
+    транзакция с statement_timeout по роли и отмена при отключении клиента.
+    Возвращает курсор; все запросы поиска (включая фасеты) выполняются внутри блока.
+    Отменённый запрос — SearchRejected с сообщением для пользователя.
+    """
+    timeout_ms = statement_timeout_ms(request.user)
+    state = {'disconnected': False}
+    with admit(request.user, heavy):
+        try:
+            with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+                cursor.execute("SET LOCAL statement_timeout = %s;", [timeout_ms])
+                with cancel_on_disconnect(request, alias) as state:
+                    yield cursor
+        except DatabaseError as e:
+            if not is_canceled(e):
+                raise
+            if state['disconnected']:
+                raise SearchRejected("Поиск отменён: клиент закрыл соединение.", status=499) from e
+            raise SearchRejected(
+                f"Поиск прерван: он выполнялся дольше {timeout_ms / 1000:g} с. "
+                "Уточните критерии (поиск по началу значения выполняется быстрее).",
+                status=504,
+            ) from e
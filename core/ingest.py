@@ -0,0 +1,648 @@
+# core/ingest.py
+"""
+Загрузка DBF- и Excel-файлов в таблицы PostgreSQL.
+
+DBF загружается потоково (DBFStreamLoad): записи разбираются по мере
+поступления байтов и сразу пишутся в базу через COPY. Форма upload_dbf
+подключает обработчик core/upload_handlers.py — загрузка идёт, пока тело
+запроса ещё принимается; файлы с диска (собранные из частей,
+core/chunked_uploads.py) читаются блоками через тот же разбор.
+
+Excel читается с диска по пути: это временный файл, который Django уже
+записал при приёме формы (TemporaryUploadedFile), или файл, собранный из частей.
+pandas импортируется только при загрузке Excel: модуль подключается при старте
+каждого веб-процесса (обработчики загрузки), а pandas — это около 100 МБ памяти.
+
+Записи с ошибками (значение не разбирается или не подходит к столбцу) не
+прерывают загрузку: они пропускаются и сохраняются в IngestReject с номером
+записи в файле и причиной. Если таких записей больше INGEST_MAX_REJECTS,
+загрузка прерывается сразу, и таблица не создаётся.
+
+Одновременные загрузки разводятся рекомендательными блокировками PostgreSQL
+(как очередь тяжёлых поисков, core/governor.py):
+
+- таблица — одна загрузка за раз: замена таблицы (или секции — тогда
+  блокируется общая таблица) ждёт до INGEST_TABLE_LOCK_TIMEOUT секунд,
+  пока закончится другая загрузка в ту же таблицу, затем отказ (IngestBusy);
+- не больше INGEST_MAX_CONCURRENT загрузок пишут в базу одновременно
+  (COPY DBF, чтение и запись Excel); остальные ждут места до
+  INGEST_QUEUE_TIMEOUT секунд. Пока DBF из формы ждёт места, приём тела
+  запроса приостанавливается (очередь пачек заполнена).
+
+Блокировки сессионные: если процесс упал, они освобождаются вместе с соединением.
+"""
+import json
+import os
+import queue
+import re
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.utils import timezone
+
+from . import catalog, dbf_stream, dedup, governor, partitions, profiling, projections
+from .models import DBFUpload, ExcelUpload, IngestReject
+from .signals import table_loaded
+from .sql_utils import ROW_ID_COLUMN_SQL, short_identifier
+
+TABLE_NAME_RE = re.compile(r'^[a-zA-Z_][a-zA-Z0-9_]*$')
+DBF_EXTENSIONS = ('.dbf',)
+EXCEL_EXTENSIONS = ('.xlsx', '.xls')
+
+# Промежуточные таблицы потоковой загрузки (префикс core_ — не видны в каталоге)
+STAGING_PREFIX = 'core_ingest_'
+# Как часто проверять очередь и отмену (секунды)
+QUEUE_POLL_INTERVAL = 0.5
+_END_OF_DATA = object()
+
+# Пространства ключей рекомендательных блокировок (первый аргумент pg_try_advisory_lock):
+# таблица — (TABLE_LOCK_SPACE, hashtext(имя таблицы)), места загрузки — (SLOT_LOCK_SPACE, номер места)
+TABLE_LOCK_SPACE = 0x1D600
+SLOT_LOCK_SPACE = 0x1D700
+
+
+class IngestError(Exception):
+    """
+    Файл или параметры загрузки не подходят. Текст показывается пользователю.
+    """
+
+
+class IngestBusy(IngestError):
+    """
+    Загрузка не дождалась своей очереди: таблица занята другой загрузкой (409)
+    или заняты все места загрузки (503). Файл можно загрузить повторно позже.
+    """
+    def __init__(self, message, status=409):
+        super().__init__(message)
+        self.status = status
+
+
+@contextmanager
+def table_lock(table_name, wait=True):
+    """
+    Исключительная блокировка загрузки в таблицу table_name на соединении текущего потока.
+    Ждёт до INGEST_TABLE_LOCK_TIMEOUT секунд (wait=False — не ждёт); если таблица
+    так и не освободилась — IngestBusy.
+    Вложенные блокировки той же таблицы в одном потоке допустимы (блокировки сессии повторные).
+    """
+    deadline = time.monotonic() + (settings.INGEST_TABLE_LOCK_TIMEOUT if wait else 0)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT hashtext(%s);", [table_name])
+        lock = governor.acquire_lock(cursor, [(TABLE_LOCK_SPACE, cursor.fetchone()[0])], deadline)
+        if lock is None:
+            raise IngestBusy(
+                f'Таблица "{table_name}" сейчас загружается другим пользователем. '
+                'Повторите загрузку после её завершения.'
+            )
+        try:
+            yield
+        finally:
+            cursor.execute("SELECT pg_advisory_unlock(%s, %s);", list(lock))
+
+
+@contextmanager
+def ingest_slot():
+    """
+    Одно из INGEST_MAX_CONCURRENT мест загрузки на соединении текущего потока.
+    Ждёт до INGEST_QUEUE_TIMEOUT секунд; если места не освободились — IngestBusy.
+    """
+    deadline = time.monotonic() + settings.INGEST_QUEUE_TIMEOUT
+    with connection.cursor() as cursor:
+        lock = governor.acquire_lock(
+            cursor, [(SLOT_LOCK_SPACE, slot) for slot in range(settings.INGEST_MAX_CONCURRENT)], deadline,
+        )
+        if lock is None:
+            raise IngestBusy(
+                f'Сервер занят другими загрузками ({settings.INGEST_MAX_CONCURRENT}). Повторите загрузку через несколько минут.',
+                status=503,
+            )
+        try:
+            yield
+        finally:
+            cursor.execute("SELECT pg_advisory_unlock(%s, %s);", list(lock))
+
+
+def table_name_from_filename(filename):
+    """
+    Имя таблицы — имя файла без расширения (только буквы, цифры, подчёркивания).
+    """
+    table_name = os.path.splitext(filename)[0]
+    if not TABLE_NAME_RE.match(table_name):
+        raise IngestError('Имя файла содержит недопустимые символы для имени таблицы.')
+    return table_name
+
+
+def resolve_partition_target(table_name, partition_table, partition_column):
+    """
+    Проверяет параметры загрузки секции и возвращает столбец секционирования
+    ('' — обычная загрузка, без секций).
+    """
+    if not partition_table:
+        if partitions.get_partition_column(table_name):
+            # Обычная загрузка удалила бы таблицу вместе со всеми секциями
+            raise IngestError(f'Таблица "{table_name}" секционирована — загрузите файл как её секцию.')
+        return ''
+    if not TABLE_NAME_RE.match(partition_table):
+        raise IngestError('Недопустимое имя секционированной таблицы.')
+    existing_column = partitions.get_partition_column(partition_table)
+    if existing_column is None and partition_table in catalog.get_available_tables():
+        raise IngestError(f'Таблица "{partition_table}" уже существует и не секционирована.')
+    if existing_column and partition_column and partition_column != existing_column:
+        raise IngestError(f'Таблица "{partition_table}" секционирована по столбцу "{existing_column}".')
+    partition_column = existing_column or partition_column
+    if not partition_column:
+        raise IngestError('Укажите столбец секционирования для новой таблицы.')
+    return partition_column
+
+
+def resolve_dedup_options(dedup_mode, dedup_keys):
+    """
+    Проверяет параметры удаления дубликатов: (режим или '' — без удаления, [ключевые поля]).
+    Ключевые поля — строка 'FAM, IM, DR' или список; без них сравниваются записи целиком.
+    """
+    if isinstance(dedup_keys, str):
+        dedup_keys = dedup.parse_keys(dedup_keys)
+    if not dedup_mode:
+        return '', []
+    if dedup_mode not in dedup.MODES:
+        raise IngestError('Неизвестный режим удаления дубликатов.')
+    return dedup_mode, list(dedup_keys)
+
+
+def resolve_load_options(filename, partition_table='', partition_column='', dedup_mode='', dedup_keys=''):
+    """
+    Проверяет имя файла и параметры загрузки до приёма файла и возвращает options
+    для load_file (для Excel — пустые: секции и удаление дубликатов только у DBF).
+    """
+    table_name = table_name_from_filename(filename)
+    options = {}
+    if filename.lower().endswith(DBF_EXTENSIONS):
+        partition_column = resolve_partition_target(table_name, partition_table, partition_column)
+        if partition_table:
+            options = {'partition_table': partition_table, 'partition_column': partition_column}
+        dedup_mode, dedup_keys = resolve_dedup_options(dedup_mode, dedup_keys)
+        if dedup_mode:
+            options.update(dedup=dedup_mode, dedup_keys=dedup_keys)
+    return options
+
+
+@contextmanager
+def uploaded_file_path(uploaded_file, suffix):
+    """
+    Путь к загруженному файлу на диске. Большие файлы Django уже записал
+    во временный файл — используем его; маленькие (в памяти) записываем.
+    """
+    if hasattr(uploaded_file, 'temporary_file_path'):
+        yield uploaded_file.temporary_file_path()
+        return
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
+        for chunk in uploaded_file.chunks():
+            temp_file.write(chunk)
+    try:
+        yield temp_file.name
+    finally:
+        os.unlink(temp_file.name)
+
+
+def describe_rejects(rejects, limit=3):
+    """
+    Первые записи с ошибками для сообщения: 'запись 12: DR: неверная дата ...; ...'.
+    """
+    text = '; '.join(f'запись {row_number}: {reason}' for row_number, reason, _ in rejects[:limit])
+    return f'{text}; …' if len(rejects) > limit else text
+
+
+def check_rejects(rejects):
+    """
+    Прерывает загрузку, если записей с ошибками больше INGEST_MAX_REJECTS.
+    """
+    if len(rejects) > settings.INGEST_MAX_REJECTS:
+        raise IngestError(
+            f'В файле больше {settings.INGEST_MAX_REJECTS} записей с ошибками, загрузка прервана. '
+            f'Первые ошибки: {describe_rejects(rejects)}'
+        )
+
+
+def save_rejects(table_name, filename, rejects):
+    """
+    Заменяет сохранённые записи с ошибками таблицы записями последней загрузки.
+    rejects — [(номер записи, причина, исходные данные)].
+    """
+    IngestReject.objects.filter(table_name=table_name).delete()
+    IngestReject.objects.bulk_create(
+        [
+            IngestReject(table_name=table_name, filename=filename, row_number=row_number, reason=reason, data=data)
+            for row_number, reason, data in rejects
+        ],
+        batch_size=1000,
+    )
+
+
+def _create_table(cursor, table_name, field_types):
+    # Проекция зависит от таблицы — удаляем её первой (пересоздаётся по сигналу table_loaded)
+    projections.drop_projection(cursor, table_name)
+    # --- УДАЛЯЕМ ТАБЛИЦУ, ЕСЛИ ОНА СУЩЕСТВУЕТ ---
+    cursor.execute(f"DROP TABLE IF EXISTS \"{table_name}\";")
+    # Экранируем имена полей, на случай если они совпадают с ключевыми словами
+    create_sql_parts = [f'"{field_name}" {field_type}' for field_name, field_type in field_types.items()]
+    create_sql_parts.append(ROW_ID_COLUMN_SQL)
+    cursor.execute(f"CREATE TABLE \"{table_name}\" ({', '.join(create_sql_parts)});")
+
+
+class DBFStreamLoad:
+    """
+    Потоковая загрузка DBF в промежуточную таблицу core_ingest_<...>.
+
+    feed() получает куски файла по мере поступления (части тела запроса или
+    блоки с диска) и разбирает записи; отдельный поток пишет их в базу через
+    COPY. Между ними — очередь не больше INGEST_QUEUE_BATCHES пачек: если база
+    не успевает, feed() ждёт, и чтение запроса приостанавливается, а память
+    не растёт. Когда файл получен целиком, почти все записи уже в базе.
+
+    Промежуточная таблица создаётся и заполняется в одной транзакции потока
+    записи: при ошибке её нет. После finish() таблицу забирает publish_dbf
+    или удаляет discard().
+
+    dedup_mode ('drop' или 'count', см. core/dedup.py) — повторяющиеся записи
+    отбрасываются в потоке записи; их число — в duplicates.
+
+    Записи, которые не удалось разобрать, собираются в rejects и в базу не пишутся.
+    """
+    def __init__(self, filename, dedup_mode='', dedup_keys=()):
+        self.filename = filename
+        self.parser = dbf_stream.DBFStreamParser()
+        self.staging = short_identifier(f"{STAGING_PREFIX}{uuid.uuid4().hex}")
+        self.dedup_mode = dedup_mode
+        self.dedup_keys = list(dedup_keys)
+        self.deduplicator = None
+        self.field_types = None
+        self.profiler = None
+        self.rows = 0
+        self.duplicates = 0
+        self.rejects = []
+        self.error = None
+        self.published = False
+        self._queue = queue.Queue(maxsize=settings.INGEST_QUEUE_BATCHES)
+        self._stop = threading.Event()
+        self._writer = None
+
+    def _fail(self, error):
+        if self.error is None:
+            self.error = error
+        self._stop.set()
+
+    def _put(self, item):
+        # Ждём место в очереди, пока поток записи работает (backpressure)
+        while self.error is None:
+            try:
+                self._queue.put(item, timeout=QUEUE_POLL_INTERVAL)
+                return
+            except queue.Full:
+                continue
+
+    def _start_writer(self):
+        self.field_types = dict(self.parser.field_types)
+        if self.dedup_mode:
+            try:
+                self.deduplicator = dedup.RowDeduplicator(self.parser.field_names, self.dedup_mode, self.dedup_keys)
+            except ValueError as e:
+                raise IngestError(str(e)) from e
+            if self.dedup_mode == dedup.MODE_COUNT:
+                if dedup.COUNT_COLUMN in self.field_types:
+                    raise IngestError(f'В файле уже есть поле {dedup.COUNT_COLUMN}.')
+                self.field_types[dedup.COUNT_COLUMN] = 'INTEGER'
+        # Статистика — по столбцам файла (DUP_COUNT дописывается после загрузки)
+        self.profiler = profiling.TableProfiler(self.parser.field_names)
+        self._writer = threading.Thread(target=self._write, name='core-ingest-copy', daemon=True)
+        self._writer.start()
+
+    def feed(self, data):
+        if self.error is not None:
+            return # После ошибки остаток файла только вычитывается
+        try:
+            records = self.parser.feed(data)
+            if self.parser.rejected:
+                self.rejects += self.parser.rejected
+                self.parser.rejected = []
+                check_rejects(self.rejects)
+            if self._writer is None and self.parser.header_ready:
+                self._start_writer()
+        except Exception as e:
+            self._fail(e)
+            return
+        if records:
+            self._put(records)
+
+    def finish(self):
+        """
+        Конец файла: ждёт, пока поток записи допишет очередь и зафиксирует таблицу.
+        При ошибке удаляет промежуточную таблицу и пробрасывает ошибку.
+        """
+        if self.error is None:
+            try:
+                self.parser.close()
+            except dbf_stream.DBFFormatError as e:
+                self._fail(e)
+        if self._writer is not None:
+            self._put(_END_OF_DATA)
+            self._writer.join()
+        if self.error is None and self.rows == 0:
+            if self.rejects:
+                self._fail(IngestError(f'Во всех записях файла ошибки: {describe_rejects(self.rejects)}'))
+            else:
+                self._fail(IngestError('Файл DBF пуст.'))
+        if self.error is not None:
+            self.discard()
+            raise self.error
+
+    def discard(self):
+        """
+        Отменяет загрузку и удаляет промежуточную таблицу.
+        """
+        self._stop.set()
+        if self._writer is not None:
+            self._writer.join()
+        if not self.published:
+            with connection.cursor() as cursor:
+                cursor.execute(f'DROP TABLE IF EXISTS "{self.staging}";')
+
+    def _next_batch(self):
+        """
+        Следующая пачка записей из очереди (_END_OF_DATA — конец файла).
+        IngestError, если загрузку отменили или передача файла прервалась.
+        """
+        idle_since = time.monotonic()
+        while True:
+            if self._stop.is_set():
+                raise IngestError('Загрузка отменена.')
+            try:
+                return self._queue.get(timeout=QUEUE_POLL_INTERVAL)
+            except queue.Empty:
+                if time.monotonic() - idle_since > settings.INGEST_STALL_TIMEOUT:
+                    raise IngestError('Передача файла прервалась.')
+
+    def _write(self):
+        field_names = list(self.field_types)
+        columns_sql = ', '.join(f'"{name}" {field_type}' for name, field_type in self.field_types.items())
+        # Номер строки заполняется по умолчанию (в COPY не участвует)
+        columns_sql += f', {ROW_ID_COLUMN_SQL}'
+        counting = self.dedup_mode == dedup.MODE_COUNT
+        if counting:
+            # Хэш записи — чтобы дописать число вхождений первым записям после загрузки
+            field_names.append(dedup.HASH_COLUMN)
+            columns_sql += f', "{dedup.HASH_COLUMN}" BIGINT'
+        try:
+            # Место загрузки поток записи занимает, только когда готова первая пачка:
+            # пока клиент передаёт начало файла, место свободно для других загрузок.
+            # Без места очередь заполняется и feed() ждёт — приём файла приостанавливается
+            batch = self._next_batch()
+            with ingest_slot(), transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(f'CREATE TABLE "{self.staging}" ({columns_sql});')
+                with copy_rows(cursor, self.staging, field_names) as write_rows:
+                    while batch is not _END_OF_DATA:
+                        if self.deduplicator is not None:
+                            batch = self.deduplicator.filter(batch)
+                        self.profiler.add_rows(batch)
+                        write_rows(batch)
+                        self.rows += len(batch)
+                        batch = self._next_batch()
+                if self.deduplicator is not None:
+                    self.duplicates = self.deduplicator.duplicates
+                if counting:
+                    self._apply_repeat_counts(cursor)
+        except Exception as e:
+            self._fail(e)
+        finally:
+            if self.deduplicator is not None:
+                self.deduplicator.close()
+            connections.close_all()
+
+    def _apply_repeat_counts(self, cursor):
+        """
+        Режим count: прибавляет отброшенные повторы к DUP_COUNT первых записей
+        и удаляет столбец хэша.
+        """
+        batches = self.deduplicator.iter_repeat_counts()
+        first_batch = next(batches, None)
+        if first_batch:
+            cursor.execute('CREATE TEMPORARY TABLE core_dedup_counts (h BIGINT PRIMARY KEY, n INTEGER) ON COMMIT DROP;')
+            with copy_rows(cursor, 'core_dedup_counts', ['h', 'n']) as write_rows:
+                write_rows(first_batch)
+                for batch in batches:
+                    write_rows(batch)
+            cursor.execute(
+                f'UPDATE "{self.staging}" AS s SET "{dedup.COUNT_COLUMN}" = s."{dedup.COUNT_COLUMN}" + c.n '
+                f'FROM core_dedup_counts AS c WHERE s."{dedup.HASH_COLUMN}" = c.h;'
+            )
+        cursor.execute(f'ALTER TABLE "{self.staging}" DROP COLUMN "{dedup.HASH_COLUMN}";')
+
+
+@contextmanager
+def copy_rows(cursor, table_name, field_names):
+    """
+    Функция записи пачки строк в таблицу: COPY FROM STDIN (psycopg 3),
+    с psycopg2 — executemany.
+    """
+    columns = ', '.join(f'"{name}"' for name in field_names)
+    raw_cursor = cursor.cursor
+    if hasattr(raw_cursor, 'copy'):
+        with raw_cursor.copy(f'COPY "{table_name}" ({columns}) FROM STDIN') as copy:
+            def write_rows(rows):
+                for row in rows:
+                    copy.write_row(row)
+            yield write_rows
+        return
+    placeholders = ', '.join(['%s'] * len(field_names))
+    yield lambda rows: cursor.executemany(f'INSERT INTO "{table_name}" ({columns}) VALUES ({placeholders});', rows)
+
+
+def publish_dbf(load, filename, user, partition_table='', partition_column=''):
+    """
+    Делает загруженную промежуточную таблицу таблицей с именем файла или,
+    если задана partition_table, — секцией общей таблицы. Замена таблицы,
+    запись о загрузке и обработчики table_loaded выполняются под блокировкой
+    таблицы (для секции — общей таблицы): одновременная загрузка в ту же
+    таблицу ждёт своей очереди.
+    Возвращает (имя загруженной таблицы, число записей, удалено дубликатов, пропущено записей с ошибками).
+    """
+    table_name = table_name_from_filename(filename)
+    try:
+        with table_lock(partition_table or table_name):
+            return _publish_dbf(load, table_name, filename, user, partition_table, partition_column)
+    finally:
+        if not load.published:
+            load.discard()
+
+
+def _publish_dbf(load, table_name, filename, user, partition_table, partition_column):
+    if partition_table:
+        # Секция заменяется целиком в одной транзакции, остальные секции не трогаем
+        with transaction.atomic(), connection.cursor() as cursor:
+            table_name = partitions.load_partition(
+                cursor, partition_table, partition_column, load.field_types, load.staging,
+            )
+            cursor.execute(f'DROP TABLE "{load.staging}";')
+        loaded_table = partition_table
+    else:
+        # Читатели видят прежнюю таблицу до конца транзакции, затем сразу новую
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Проекция зависит от таблицы — удаляем её первой (пересоздаётся по сигналу table_loaded)
+            projections.drop_projection(cursor, table_name)
+            cursor.execute(f'DROP TABLE IF EXISTS "{table_name}";')
+            cursor.execute(f'ALTER TABLE "{load.staging}" RENAME TO "{table_name}";')
+        loaded_table = table_name
+    load.published = True
+
+    # Сохраняем запись о загрузке (table_name уникален — при перезагрузке обновляем)
+    dbf_upload, _ = DBFUpload.objects.update_or_create(
+        table_name=table_name,
+        defaults={
+            'filename': filename, 'uploaded_by': user, 'uploaded_at': timezone.now(),
+            'dbf_fields': dbf_stream.field_descriptors(load.parser.fields),
+        },
+    )
+    load.profiler.save(loaded_table, partition=table_name if partition_table else '', dbf_upload=dbf_upload)
+    # Записи с ошибками — по таблице или секции, которую заменил файл
+    save_rejects(table_name, filename, load.rejects)
+
+    # Сообщаем подписчикам (проекции и т.п.), что таблица перезагружена.
+    # Для секции проекция, индексы ключей и кэши относятся к общей таблице
+    table_loaded.send(sender=DBFUpload, table_name=loaded_table, partition=table_name if partition_table else None)
+    print(f"DEBUG: {filename} loaded into {loaded_table}: {load.rows} rows, {load.duplicates} duplicates removed, {len(load.rejects)} rejected")
+    return loaded_table, load.rows, load.duplicates, len(load.rejects)
+
+
+def load_dbf(path, filename, user, partition_table='', partition_column='', dedup_mode='', dedup_keys=()):
+    """
+    Загружает DBF-файл с диска (cp866) в таблицу с именем файла или, если задана
+    partition_table, — как секцию общей таблицы. Файл читается блоками через
+    тот же потоковый разбор, что и при приёме формы (DBFStreamLoad).
+    Возвращает (имя загруженной таблицы, число записей, удалено дубликатов, пропущено записей с ошибками).
+    """
+    table_name = table_name_from_filename(filename)
+    # Таблица занята другой загрузкой — отказ до чтения файла, а не после
+    with table_lock(partition_table or table_name):
+        load = DBFStreamLoad(filename, dedup_mode, dedup_keys)
+        with open(path, 'rb') as dbf_file:
+            for block in iter(lambda: dbf_file.read(settings.INGEST_READ_BLOCK_SIZE), b''):
+                load.feed(block)
+                if load.error is not None:
+                    break
+        load.finish()
+        return publish_dbf(load, filename, user, partition_table, partition_column)
+
+
+def _check_excel_row(field_names, row):
+    """
+    Проверяет строку Excel перед записью: (строка, причина ошибки или None).
+    Символы \0 удаляются; символ, которого нет в cp866 (кодировка соединения
+    при записи), — ошибка строки.
+    """
+    if any(isinstance(value, str) and '\0' in value for value in row):
+        row = tuple(value.replace('\0', '') if isinstance(value, str) else value for value in row)
+    for name, value in zip(field_names, row):
+        if value is None:
+            continue
+        try:
+            value.encode(dbf_stream.DBF_ENCODING)
+        except UnicodeEncodeError as e:
+            return row, f'{name}: символ {value[e.start]!r} нельзя записать в кодировке {dbf_stream.DBF_ENCODING}'
+    return row, None
+
+
+def load_excel(path, filename, user):
+    """
+    Загружает Excel-файл в таблицу с именем файла; все столбцы — VARCHAR.
+    Таблица создаётся и заполняется в одной транзакции: при ошибке прежняя остаётся.
+    Чтение файла и запись выполняются под блокировкой таблицы и на месте загрузки.
+    Возвращает (имя таблицы, число записей, пропущено записей с ошибками).
+    """
+    table_name = table_name_from_filename(filename)
+    with table_lock(table_name), ingest_slot():
+        return _load_excel(path, filename, user, table_name)
+
+
+def _load_excel(path, filename, user, table_name):
+    import pandas as pd # Используем pandas для удобного чтения Excel (импорт тяжёлый — только здесь)
+
+    # Читаем Excel файл с помощью pandas; dtype=str заставляет pandas читать ВСЁ как строки
+    print(f"DEBUG: Attempting to read file with pandas (force_strings=True): {filename}") # <-- Отладка
+    df = pd.read_excel(path, engine='openpyxl' if filename.endswith('.xlsx') else 'xlrd', dtype=str)
+    print(f"DEBUG: Successfully read file. DataFrame shape: {df.shape}") # <-- Отладка
+    print(f"DEBUG: DataFrame columns: {df.columns.tolist()}") # <-- Отладка: имена колонок
+
+    if df.empty:
+        raise IngestError(f'Файл Excel {filename} пуст (DataFrame пуст).')
+
+    # --- Определение типов полей для SQL: ВСЕ как VARCHAR ---
+    field_types = {}
+    for col_name in df.columns:
+        # Определяем максимальную длину строки в колонке
+        # (NaN при astype(str) становится строкой 'nan' длиной 3)
+        max_len = df[col_name].astype(str).str.len().max()
+        # Устанавливаем минимальную длину 255, как в DBF
+        final_length = max(255, max_len if pd.notna(max_len) else 3)
+        field_types[col_name] = f'VARCHAR({final_length})'
+
+    print(f"DEBUG: Final field_types (all VARCHAR): {field_types}") # <-- Отладка
+
+    # Все данные уже строки (dtype=str), но NaN нужно заменить на None (NULL в SQL).
+    # astype(object): в строковом типе pandas where(..., None) оставляет NaN
+    df_for_insert = df.astype(object).where(pd.notna(df), None)
+
+    # Преобразуем в список кортежей, заодно проверяя строки и собирая статистику по столбцам
+    field_names = list(df.columns)
+    profiler = profiling.TableProfiler(field_names)
+    records_to_insert = []
+    rejects = []
+    # Первая строка листа — заголовки, данные начинаются со второй
+    for row_number, row in enumerate(df_for_insert.values, start=2):
+        row_tuple, reason = _check_excel_row(field_names, tuple(row))
+        if reason is not None:
+            rejects.append((row_number, reason, json.dumps(row_tuple, ensure_ascii=False)))
+            check_rejects(rejects)
+            continue
+        profiler.add_row(row_tuple)
+        records_to_insert.append(row_tuple)
+    if not records_to_insert:
+        raise IngestError(f'Во всех строках файла ошибки: {describe_rejects(rejects)}')
+
+    # --- Создание таблицы в PostgreSQL ---
+    with transaction.atomic(), connection.cursor() as cursor:
+        _create_table(cursor, table_name, field_types)
+        # client_encoding cp866 — только до конца транзакции: после неё соединение
+        # снова в UTF-8 (иначе следующие запросы с символами вне cp866 падают)
+        cursor.execute("SET LOCAL client_encoding = 'WIN866';") # Или 'cp866'
+        with copy_rows(cursor, table_name, field_names) as write_rows:
+            write_rows(records_to_insert)
+        print(f"DEBUG: Successfully inserted {len(records_to_insert)} records, {len(rejects)} rejected") # <-- Отладка
+
+    # --- Создание записи о загрузке Excel ---
+    excel_upload = ExcelUpload.objects.create(filename=filename, table_name=table_name, uploaded_by=user)
+    profiler.save(table_name, excel_upload=excel_upload)
+    save_rejects(table_name, filename, rejects)
+    table_loaded.send(sender=ExcelUpload, table_name=table_name)
+    return table_name, len(records_to_insert), len(rejects)
+
+
+def load_file(path, filename, user, options=None):
+    """
+    Загружает файл по расширению имени (DBF или Excel). options — параметры
+    загрузки DBF (partition_table, partition_column, dedup, dedup_keys).
+    Возвращает (имя загруженной таблицы, число записей, удалено дубликатов, пропущено записей с ошибками).
+    """
+    options = options or {}
+    if filename.lower().endswith(DBF_EXTENSIONS):
+        return load_dbf(
+            path, filename, user, options.get('partition_table', ''), options.get('partition_column', ''),
+            options.get('dedup', ''), options.get('dedup_keys', ()),
+        )
+    if filename.lower().endswith(EXCEL_EXTENSIONS):
+        table_name, rows, rejected = load_excel(path, filename, user)
+        return table_name, rows, 0, rejected
+    raise IngestError('Файл должен быть в формате .dbf, .xlsx или .xls.')
@@ -0,0 +1,112 @@
+# core/management/commands/benchmark_engines.py
+"""
+Микробенчмарки общих движков: каталог таблиц (core/catalog.py), поиск
+(core/search_query.py) и разбор DBF при загрузке (core/dbf_stream.py).
+
+Каждая операция выполняется --repeat раз; показываются минимум, медиана
+и максимум. Команда только читает данные — её можно запускать на рабочей
+базе, чтобы сравнить время до и после изменения движка:
+
+    python manage.py benchmark_engines --table people
+    python manage.py benchmark_engines --table people --filter FAM=иванов --filter DR=1956
+    python manage.py benchmark_engines --file /data/in/people.dbf --repeat 5
+"""
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from core import catalog
+from core.db_routing import get_read_alias
+from core.dbf_stream import DBFStreamParser
+from core.search_query import SearchQuery
+
+
+def measure(function, repeat):
+    """
+    Время выполнения function (мс) для каждого из repeat запусков и результат последнего.
+    """
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings, result
+
+
+def parse_dbf(path):
+    """
+    Разбор файла блоками, как при загрузке, без записи в базу. Возвращает (записей, отклонено).
+    """
+    parser = DBFStreamParser()
+    records = 0
+    with open(path, 'rb') as dbf_file:
+        for block in iter(lambda: dbf_file.read(settings.INGEST_READ_BLOCK_SIZE), b''):
+            records += len(parser.feed(block))
+    parser.close()
+    return records, len(parser.rejected)
+
+
+class Command(BaseCommand):
+    help = 'Микробенчмарки каталога таблиц, построения и выполнения поиска и разбора DBF.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--table', help='Таблица для бенчмарков каталога и поиска.')
+        parser.add_argument('--filter', action='append', dest='filters', default=[],
+                            help='Условие поиска ПОЛЕ=значение (можно указать несколько раз).')
+        parser.add_argument('--file', help='DBF-файл для бенчмарка разбора.')
+        parser.add_argument('--repeat', type=int, default=20, help='Сколько раз выполнить каждую операцию.')
+
+    def report(self, name, timings, note=''):
+        self.stdout.write(
+            f'{name:<28} min {min(timings):9.2f} мс   медиана {statistics.median(timings):9.2f} мс   '
+            f'max {max(timings):9.2f} мс{f"   {note}" if note else ""}'
+        )
+
+    def handle(self, *args, **options):
+        table_name = options['table']
+        repeat = max(1, options['repeat'])
+        if not table_name and not options['file']:
+            raise CommandError('Укажите --table и/или --file.')
+
+        if table_name:
+            if table_name not in catalog.get_available_tables():
+                raise CommandError(f'Таблица "{table_name}" не найдена.')
+            # Каталог: запросы из кэша (первый вызов выше уже заполнил его)
+            self.report('catalog.tables', measure(catalog.get_available_tables, repeat)[0])
+            self.report('catalog.columns', measure(lambda: catalog.get_table_columns(table_name), repeat)[0])
+            self.report('catalog.field_metadata', measure(lambda: catalog.get_field_metadata(table_name), repeat)[0])
+
+            filters = {}
+            for item in options['filters']:
+                field_name, sep, value = item.partition('=')
+                if not sep:
+                    raise CommandError(f'Условие должно иметь вид ПОЛЕ=значение: {item}.')
+                filters[field_name] = value
+            timings, query = measure(lambda: SearchQuery(table_name, filters), repeat)
+            if query.missing_fields:
+                raise CommandError(f'В таблице нет полей: {", ".join(sorted(query.missing_fields))}.')
+            self.report('search.build', timings, f'источник: {query.source_table}')
+
+            if query.is_empty:
+                self.stdout.write('search.execute пропущен: не задано ни одно условие (--filter).')
+            else:
+                alias = get_read_alias()
+
+                def execute():
+                    with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+                        return query.fetch(cursor)
+
+                timings, (_, rows, _) = measure(execute, repeat)
+                self.report('search.execute', timings, f'строк: {len(rows)}')
+
+        if options['file']:
+            try:
+                timings, (records, rejected) = measure(lambda: parse_dbf(options['file']), repeat)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'Файл не разобран: {e}') from e
+            rate = records / (statistics.median(timings) / 1000) if records else 0
+            self.report('ingest.parse_dbf', timings, f'записей: {records}, отклонено: {rejected}, {rate:,.0f} записей/с')
@@ -0,0 +1,24 @@
+# core/management/commands/cleanup_chunked_uploads.py
+"""
+Обслуживание загрузок по частям (core/chunked_uploads.py), запускается по расписанию:
+
+- загрузки, которые «загружаются в базу» дольше CHUNKED_UPLOAD_LOADING_TIMEOUT_HOURS
+  (сервер остановился посреди complete), возвращаются в «загружается» — файл
+  на месте, complete можно повторить;
+- незавершённые и неудачные загрузки старше CHUNKED_UPLOAD_EXPIRE_HOURS
+  удаляются вместе с файлами.
+
+    python manage.py cleanup_chunked_uploads
+"""
+from django.core.management.base import BaseCommand
+
+from core import chunked_uploads
+
+
+class Command(BaseCommand):
+    help = 'Возвращает зависшие загрузки по частям и удаляет устаревшие вместе с файлами.'
+
+    def handle(self, *args, **options):
+        released = chunked_uploads.release_stale_loading()
+        expired = chunked_uploads.expire_stale()
+        self.stdout.write(self.style.SUCCESS(f'Возвращено зависших загрузок: {released}, удалено устаревших: {expired}.'))
@@ -0,0 +1,39 @@
+# core/management/commands/export_dbf.py
+"""
+Выгружает импортированную таблицу в DBF (core/dbf_export.py) для смежных систем.
+
+    python manage.py export_dbf people                      # -> people.dbf в текущем каталоге
+    python manage.py export_dbf people --output /data/out/PEOPLE.DBF
+    python manage.py export_dbf people --field FAM --field IM --field DR
+"""
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import dbf_export
+
+
+class Command(BaseCommand):
+    help = 'Выгружает импортированную таблицу в файл DBF (cp866).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('table', help='Имя таблицы.')
+        parser.add_argument('--output', help='Путь к файлу (по умолчанию <таблица>.dbf в текущем каталоге).')
+        parser.add_argument('--field', action='append', dest='fields', default=[],
+                            help='Выгружать только этот столбец (можно указать несколько раз, порядок сохраняется).')
+
+    def handle(self, *args, **options):
+        table_name = options['table']
+        path = options['output'] or f'{table_name}.dbf'
+        # Файл пишется под временным именем — недописанный файл не подменит прежний
+        temp_path = f'{path}.tmp'
+        try:
+            with open(temp_path, 'wb') as f:
+                rows = dbf_export.export_table(table_name, f, options['fields'] or None)
+            os.replace(temp_path, path)
+        except dbf_export.DBFExportError as e:
+            raise CommandError(str(e)) from e
+        finally:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+        self.stdout.write(self.style.SUCCESS(f'{table_name}: {rows} записей -> {path}'))
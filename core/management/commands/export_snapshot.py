@@ -0,0 +1,44 @@
+# core/management/commands/export_snapshot.py
+"""
+Выгружает импортированные таблицы в Parquet (core/snapshots.py) для аналитики.
+
+    python manage.py export_snapshot                  # все таблицы
+    python manage.py export_snapshot people preg --output /data/snapshots
+    python manage.py export_snapshot people --row-group-size 50000 --compression snappy
+
+Запускается по расписанию (cron) — например, ночью, после загрузок.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from core import catalog, snapshots
+
+
+class Command(BaseCommand):
+    help = 'Выгружает импортированные таблицы в файлы Parquet.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('tables', nargs='*', help='Таблицы для выгрузки (по умолчанию — все импортированные).')
+        parser.add_argument('--output', help='Каталог для файлов (по умолчанию SNAPSHOT_DIR).')
+        parser.add_argument('--row-group-size', type=int, help='Строк в группе строк (по умолчанию SNAPSHOT_ROW_GROUP_SIZE).')
+        parser.add_argument('--compression', choices=['zstd', 'snappy', 'gzip', 'brotli', 'lz4', 'none'],
+                            help='Сжатие (по умолчанию SNAPSHOT_COMPRESSION).')
+
+    def handle(self, *args, **options):
+        available = catalog.get_available_tables()
+        tables = options['tables'] or sorted(available)
+        unknown = [table for table in tables if table not in available]
+        if unknown:
+            raise CommandError(f'Таблицы не найдены: {", ".join(unknown)}.')
+
+        exported = failed = 0
+        for table_name, result in snapshots.export_tables(
+            tables, options['output'], options['row_group_size'], options['compression'],
+        ).items():
+            if isinstance(result, Exception):
+                failed += 1
+                self.stderr.write(f'{table_name}: {result}')
+                continue
+            exported += 1
+            path, rows = result
+            self.stdout.write(f'{table_name}: {rows} строк -> {path}')
+        self.stdout.write(self.style.SUCCESS(f'Выгружено таблиц: {exported}, ошибок: {failed}.'))
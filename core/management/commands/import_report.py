@@ -0,0 +1,114 @@
+# core/management/commands/import_report.py
+"""
+Отчёт о старте веб-процесса: время импорта, память и тяжёлые библиотеки.
+
+Запускает отдельный процесс Python с -X importtime, который делает то же,
+что веб-процесс до первого запроса (django.setup() и загрузка URLconf
+с представлениями), и показывает:
+
+- время старта и память процесса (max RSS);
+- тяжёлые библиотеки (pandas, openpyxl, pyarrow, ...), загруженные при старте,
+  и какой модуль их импортировал — они должны импортироваться только
+  в функциях загрузки и выгрузки;
+- импорты верхнего уровня, занявшие больше всего времени.
+
+    python manage.py import_report
+    python manage.py import_report --top 30
+    python manage.py import_report --check     # ошибка, если при старте загружается тяжёлая библиотека (для CI)
+"""
+import json
+import re
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Библиотеки загрузки и выгрузки файлов: веб-процессу поиска они не нужны
+HEAVY_MODULES = ('pandas', 'numpy', 'openpyxl', 'xlrd', 'pyarrow', 'dbfread')
+
+STARTUP_SCRIPT = """
+import json, resource, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns  # URLconf импортирует представления — как при первом запросе
+print(json.dumps({
+    'seconds': time.perf_counter() - started,
+    'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'modules': sorted(sys.modules),
+}))
+"""
+
+# import time:       self |  cumulative | <отступ по 2 пробела на уровень>имя
+IMPORT_TIME_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)$')
+
+
+def parse_import_times(output):
+    """
+    Строки -X importtime -> [(уровень вложенности, модуль, суммарное время в мкс)] в порядке вывода
+    (вложенные импорты выводятся раньше импортировавшего их модуля).
+    """
+    imports = []
+    for line in output.splitlines():
+        match = IMPORT_TIME_RE.match(line)
+        if match:
+            _, cumulative, indent, name = match.groups()
+            imports.append(((len(indent) - 2) // 2, name, int(cumulative)))
+    return imports
+
+
+def importer_of(imports, name):
+    """
+    Модуль, импортировавший name (ближайший следующий импорт уровнем выше), или None.
+    Подмодули самого пакета пропускаются: import pkg.sub сначала импортирует pkg.
+    """
+    for index, (level, module, _) in enumerate(imports):
+        if module != name:
+            continue
+        for parent_level, parent, _ in imports[index + 1:]:
+            if parent_level < level:
+                if not parent.startswith(f'{name}.'):
+                    return parent
+                level = parent_level
+        return None
+    return None
+
+
+class Command(BaseCommand):
+    help = 'Показывает время импорта и память веб-процесса при старте и тяжёлые библиотеки, загруженные заранее.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=15, help='Сколько самых долгих импортов показать.')
+        parser.add_argument('--check', action='store_true',
+                            help='Завершиться с ошибкой, если при старте загружается тяжёлая библиотека.')
+
+    def handle(self, *args, **options):
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', STARTUP_SCRIPT],
+            cwd=settings.BASE_DIR, capture_output=True, text=True,
+        )
+        if process.returncode != 0:
+            raise CommandError(f'Процесс не запустился:\n{process.stderr[-2000:]}')
+        report = json.loads(process.stdout.strip().splitlines()[-1])
+        imports = parse_import_times(process.stderr)
+
+        self.stdout.write(f"Старт: {report['seconds']:.2f} с, память (max RSS): {report['max_rss_kb'] // 1024} МБ")
+
+        modules = set(report['modules'])
+        heavy = [name for name in HEAVY_MODULES if name in modules]
+        if heavy:
+            self.stdout.write(self.style.WARNING('Тяжёлые библиотеки, загруженные при старте:'))
+            for name in heavy:
+                self.stdout.write(f'  {name} <- {importer_of(imports, name) or "?"}')
+        else:
+            self.stdout.write(self.style.SUCCESS('Тяжёлые библиотеки при старте не загружаются.'))
+
+        self.stdout.write('Самые долгие импорты верхнего уровня:')
+        top_level = sorted((item for item in imports if item[0] == 0), key=lambda item: item[2], reverse=True)
+        for _, name, cumulative in top_level[:options['top']]:
+            self.stdout.write(f'  {cumulative / 1000:8.1f} мс  {name}')
+
+        if options['check'] and heavy:
+            raise CommandError(f'При старте загружаются: {", ".join(heavy)}.')
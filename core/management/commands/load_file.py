@@ -0,0 +1,53 @@
+# core/management/commands/load_file.py
+"""
+Загружает DBF или Excel с диска сервера тем же путём, что и формы загрузки
+(ingest.load_file): проверки имени и параметров, потоковый разбор DBF,
+отклонённые записи, секции и удаление дубликатов.
+
+    python manage.py load_file /data/in/people.dbf --user admin
+    python manage.py load_file /data/in/preg_2022.dbf --user admin --partition-table preg --partition-column YR
+    python manage.py load_file /data/in/people.dbf --user admin --dedup drop --dedup-keys "FAM, IM, DR"
+"""
+import os
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from core import ingest
+from core.db_routing import pin_to_primary
+
+
+class Command(BaseCommand):
+    help = 'Загружает файл DBF или Excel в таблицу (как формы загрузки).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу; имя таблицы — имя файла без расширения.')
+        parser.add_argument('--user', required=True, help='Пользователь, от имени которого загружается файл.')
+        parser.add_argument('--partition-table', default='', help='Загрузить как секцию этой таблицы (только DBF).')
+        parser.add_argument('--partition-column', default='', help='Столбец секционирования новой общей таблицы.')
+        parser.add_argument('--dedup', default='', help='Удаление дубликатов (только DBF): drop — удалить, count — оставить одну запись с числом вхождений.')
+        parser.add_argument('--dedup-keys', default='', help='Ключевые поля для удаления дубликатов: "FAM, IM, DR".')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        filename = os.path.basename(path)
+        if not os.path.isfile(path):
+            raise CommandError(f'Файл не найден: {path}.')
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f'Пользователь "{options["user"]}" не найден.')
+
+        # Команда пишет в основную базу — и проверяет таблицы по ней же
+        with pin_to_primary():
+            try:
+                load_options = ingest.resolve_load_options(
+                    filename, options['partition_table'], options['partition_column'],
+                    options['dedup'], options['dedup_keys'],
+                )
+                table_name, rows, duplicates, rejected = ingest.load_file(path, filename, user, load_options)
+            except ingest.IngestError as e:
+                raise CommandError(str(e)) from e
+
+        self.stdout.write(f'Удалено дубликатов: {duplicates}, пропущено записей с ошибками: {rejected}.')
+        self.stdout.write(self.style.SUCCESS(f'{filename} -> {table_name}: {rows} записей'))
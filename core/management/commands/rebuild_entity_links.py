@@ -0,0 +1,36 @@
+# core/management/commands/rebuild_entity_links.py
+"""
+Перестраивает индекс связей между таблицами (core/entity_links.py).
+
+Индекс обновляется сам (в фоне) после загрузки таблицы и изменения шаблона;
+команда нужна для таблиц, загруженных до появления индекса или столбца
+core_row_id (он добавляется, таблица перезаписывается), и после ручных правок в базе:
+    python manage.py rebuild_entity_links                 # все таблицы
+    python manage.py rebuild_entity_links people preg
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from core import catalog, entity_links
+from core.db_routing import pin_to_primary
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает индекс связанных записей по ролям полей шаблонов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('tables', nargs='*', help='Таблицы (по умолчанию — все импортированные).')
+
+    def handle(self, *args, **options):
+        with pin_to_primary():
+            available = catalog.get_available_tables()
+            tables = options['tables'] or sorted(available)
+            unknown = [table for table in tables if table not in available]
+            if unknown:
+                raise CommandError(f'Таблицы не найдены: {", ".join(unknown)}.')
+
+            total = 0
+            for table_name in tables:
+                keys = entity_links.build_links(table_name)
+                total += keys
+                self.stdout.write(f'{table_name}: {keys} ключей')
+        self.stdout.write(self.style.SUCCESS(f'Таблиц: {len(tables)}, ключей: {total}.'))
@@ -0,0 +1,48 @@
+# core/management/commands/refresh_saved_searches.py
+"""
+Перестраивает снимки результатов сохранённых поисков (core/saved_searches.py).
+
+Запускается по расписанию (cron) или после загрузки таблиц:
+    python manage.py refresh_saved_searches
+    python manage.py refresh_saved_searches --table people --force
+
+По умолчанию перестраиваются только устаревшие снимки — построенные
+для прежнего поколения таблицы или ещё не построенные.
+"""
+from django.core.management.base import BaseCommand
+
+from core import saved_searches
+from core.db_routing import pin_to_primary
+from core.models import SavedSearch
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает устаревшие снимки результатов сохранённых поисков.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--table', action='append', dest='tables', default=[],
+                            help='Только сохранённые поиски по этой таблице (можно указать несколько раз).')
+        parser.add_argument('--force', action='store_true', help='Перестроить и актуальные снимки.')
+
+    def handle(self, *args, **options):
+        refreshed = skipped = failed = 0
+        # Команда пишет в основную базу — и читает из неё же
+        with pin_to_primary():
+            queryset = SavedSearch.objects.order_by('table_name', 'pk')
+            if options['tables']:
+                queryset = queryset.filter(table_name__in=options['tables'])
+            for saved_search in queryset:
+                if not options['force'] and saved_searches.is_fresh(saved_search):
+                    skipped += 1
+                    continue
+                try:
+                    rows = saved_searches.refresh_snapshot(saved_search)
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f'{saved_search.pk} "{saved_search.name}" ({saved_search.table_name}): {e}')
+                    continue
+                refreshed += 1
+                self.stdout.write(f'{saved_search.pk} "{saved_search.name}" ({saved_search.table_name}): {rows} строк')
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлено снимков: {refreshed}, актуальных: {skipped}, ошибок: {failed}.'
+        ))
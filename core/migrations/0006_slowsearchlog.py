@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-19 12:39
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0005_remove_tabletemplate_default_result_fields_order_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowSearchLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('table_name', models.CharField(db_index=True, max_length=255)),
+                ('search_fields', models.CharField(help_text='Отсортированный список полей поиска через запятую.', max_length=2048)),
+                ('duration_ms', models.FloatField(help_text='Время выполнения поиска в представлении (мс).')),
+                ('plan_execution_ms', models.FloatField(blank=True, help_text='Execution Time из EXPLAIN ANALYZE (мс).', null=True)),
+                ('rows_returned', models.PositiveIntegerField(default=0)),
+                ('has_seq_scan', models.BooleanField(default=False, help_text='В плане есть Seq Scan.')),
+                ('sql_query', models.TextField()),
+                ('plan', models.JSONField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['table_name', 'search_fields'], name='core_slowse_table_n_df0bcc_idx')],
+            },
+        ),
+    ]
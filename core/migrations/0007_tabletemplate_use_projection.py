@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 12:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_slowsearchlog'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tabletemplate',
+            name='use_projection',
+            field=models.BooleanField(default=False, help_text='Строить узкую проекцию (материализованное представление) только с полями шаблона и искать по ней.'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    SQL-функция нормализованного ключа поиска (см. core/search_keys.py):
+    нижний регистр, Ё -> Е, пробелы схлопнуты и обрезаны.
+    IMMUTABLE — чтобы по ней можно было строить индексы по выражению.
+    """
+
+    dependencies = [
+        ('core', '0007_tabletemplate_use_projection'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="""
+                CREATE OR REPLACE FUNCTION core_search_key(value text) RETURNS text
+                LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE
+                AS $$ SELECT btrim(regexp_replace(translate(lower(value), 'ё', 'е'), '\\s+', ' ', 'g')) $$;
+            """,
+            reverse_sql="DROP FUNCTION IF EXISTS core_search_key(text);",
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-19 12:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_core_search_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TableGeneration',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('table_name', models.CharField(max_length=255, unique=True)),
+                ('generation', models.PositiveIntegerField(default=0)),
+                ('changed_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-19 12:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_tablegeneration'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TableStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('table_name', models.CharField(db_index=True, max_length=255)),
+                ('row_count', models.PositiveBigIntegerField(default=0)),
+                ('computed_at', models.DateTimeField(auto_now_add=True)),
+                ('dbf_upload', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='core.dbfupload')),
+                ('excel_upload', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='core.excelupload')),
+            ],
+            options={
+                'ordering': ['-computed_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ColumnStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('column_name', models.CharField(max_length=255)),
+                ('position', models.PositiveIntegerField(default=0)),
+                ('null_count', models.PositiveBigIntegerField(default=0)),
+                ('min_length', models.PositiveIntegerField(blank=True, null=True)),
+                ('max_length', models.PositiveIntegerField(blank=True, null=True)),
+                ('approx_distinct', models.PositiveBigIntegerField(default=0, help_text='Оценка HyperLogLog.')),
+                ('top_values', models.JSONField(blank=True, default=list, help_text='Самые частые значения: [[значение, количество], ...].')),
+                ('table_stats', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='columns', to='core.tablestats')),
+            ],
+            options={
+                'ordering': ['position'],
+            },
+        ),
+    ]
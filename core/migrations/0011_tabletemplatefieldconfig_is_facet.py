@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 12:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_tablestats_columnstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tabletemplatefieldconfig',
+            name='is_facet',
+            field=models.BooleanField(default=False, help_text='Показывать в результатах поиска количество записей по значениям поля (фасет).'),
+        ),
+    ]
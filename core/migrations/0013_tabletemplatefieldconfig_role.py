@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 12:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_tabletemplate_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tabletemplatefieldconfig',
+            name='role',
+            field=models.CharField(blank=True, choices=[('last_name', 'Фамилия'), ('first_name', 'Имя'), ('middle_name', 'Отчество'), ('birth_date', 'Дата рождения'), ('document', 'Документ'), ('address', 'Адрес')], default='', help_text='Какой общий критерий поиска по всем таблицам соответствует полю.', max_length=20),
+        ),
+    ]
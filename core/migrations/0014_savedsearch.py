@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-19 13:04
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0013_tabletemplatefieldconfig_role'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SavedSearch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('table_name', models.CharField(db_index=True, max_length=255)),
+                ('filters', models.JSONField(default=dict, help_text='Значения полей поиска: {поле: значение}.')),
+                ('result_fields', models.JSONField(default=list, help_text='Поля вывода в порядке показа.')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('snapshot_generation', models.PositiveIntegerField(blank=True, null=True)),
+                ('snapshot_rows', models.PositiveIntegerField(default=0)),
+                ('snapshot_truncated', models.BooleanField(default=False)),
+                ('refreshed_at', models.DateTimeField(blank=True, null=True)),
+                ('refresh_error', models.TextField(blank=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saved_searches', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='savedsearch',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='core_savedsearch_user_name_uniq'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-19 13:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0014_savedsearch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChunkedUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('filename', models.CharField(max_length=255)),
+                ('size', models.PositiveBigIntegerField(help_text='Полный размер файла в байтах.')),
+                ('offset', models.PositiveBigIntegerField(default=0, help_text='Сколько байт уже принято.')),
+                ('sha256', models.CharField(blank=True, help_text='Контрольная сумма всего файла (необязательно).', max_length=64)),
+                ('options', models.JSONField(blank=True, default=dict, help_text='Параметры загрузки (секция DBF и т.п.).')),
+                ('status', models.CharField(choices=[('uploading', 'Загружается'), ('loading', 'Загружается в базу'), ('loaded', 'Загружен в базу'), ('failed', 'Ошибка')], default='uploading', max_length=20)),
+                ('error', models.TextField(blank=True)),
+                ('table_name', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunked_uploads', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
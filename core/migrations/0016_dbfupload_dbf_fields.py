@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 13:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_chunkedupload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dbfupload',
+            name='dbf_fields',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-19 13:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_dbfupload_dbf_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EntityLink',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.TextField()),
+                ('table_name', models.CharField(max_length=255)),
+                ('relation', models.CharField(max_length=255)),
+                ('row_ctid', models.CharField(max_length=32)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['key'], name='core_entitylink_key_idx'), models.Index(fields=['table_name', 'relation'], name='core_entitylink_table_idx')],
+            },
+        ),
+    ]
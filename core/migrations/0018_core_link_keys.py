@@ -0,0 +1,53 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    SQL-функции ключей индекса связей (см. core/entity_links.py).
+    По ним строится индекс при загрузке и вычисляются ключи при поиске,
+    поэтому нормализация в обоих местах одна и та же.
+
+    core_link_date     — дата рождения к виду ГГГГ-ММ-ДД (из ГГГГ-ММ-ДД..., ДД.ММ.ГГГГ, ГГГГММДД);
+    core_person_key    — 'p:' фамилия, первая буква имени и дата (фамилия и имя — как core_search_key);
+    core_document_key  — 'd:' номер документа без пробелов, знаков и регистра.
+    Пустые части дают NULL — такие строки в индекс не попадают.
+    """
+
+    dependencies = [
+        ('core', '0017_entitylink'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="""
+                CREATE OR REPLACE FUNCTION core_link_date(value text) RETURNS text
+                LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE
+                AS $$
+                    SELECT CASE
+                        WHEN v ~ '^\\d{4}-\\d{2}-\\d{2}' THEN left(v, 10)
+                        WHEN v ~ '^\\d{2}\\.\\d{2}\\.\\d{4}' THEN substr(v, 7, 4) || '-' || substr(v, 4, 2) || '-' || left(v, 2)
+                        WHEN v ~ '^\\d{8}$' THEN left(v, 4) || '-' || substr(v, 5, 2) || '-' || substr(v, 7, 2)
+                        ELSE NULLIF(v, '')
+                    END
+                    FROM btrim(value) AS v
+                $$;
+
+                CREATE OR REPLACE FUNCTION core_person_key(last_name text, first_name text, birth_date text) RETURNS text
+                LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE
+                AS $$
+                    SELECT 'p:' || NULLIF(core_search_key(last_name), '')
+                        || ' ' || NULLIF(left(core_search_key(first_name), 1), '')
+                        || ' ' || core_link_date(birth_date)
+                $$;
+
+                CREATE OR REPLACE FUNCTION core_document_key(value text) RETURNS text
+                LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE
+                AS $$ SELECT 'd:' || NULLIF(regexp_replace(translate(lower(value), 'ё', 'е'), '[^0-9a-zа-я]', '', 'g'), '') $$;
+            """,
+            reverse_sql="""
+                DROP FUNCTION IF EXISTS core_document_key(text);
+                DROP FUNCTION IF EXISTS core_person_key(text, text, text);
+                DROP FUNCTION IF EXISTS core_link_date(text);
+            """,
+        ),
+    ]
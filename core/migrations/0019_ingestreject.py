@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-19 13:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_core_link_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestReject',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('table_name', models.CharField(db_index=True, max_length=255)),
+                ('filename', models.CharField(max_length=255)),
+                ('row_number', models.PositiveBigIntegerField(help_text='Номер записи в файле (в Excel — номер строки листа).')),
+                ('reason', models.TextField()),
+                ('data', models.TextField(blank=True, help_text='Исходная запись: текст записи DBF или значения строки Excel (JSON).')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'отклонённая запись',
+                'verbose_name_plural': 'отклонённые записи',
+                'ordering': ['table_name', 'row_number'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 14:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_ingestreject'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chunkedupload',
+            name='writing_since',
+            field=models.DateTimeField(blank=True, help_text='Когда началась запись текущей части (пусто — часть не пишется).', null=True),
+        ),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    Постоянный номер строки импортированных таблиц (core_row_id, см. core/sql_utils.py)
+    и индекс связей по нему вместо ctid.
+
+    core_row_id_seq — общая последовательность номеров строк всех таблиц.
+    Прежние записи индекса связей (по ctid) удаляются: индекс перестраивается
+    в фоне после загрузки или командой rebuild_entity_links, которая заодно
+    добавляет core_row_id таблицам, загруженным раньше.
+    """
+
+    dependencies = [
+        ('core', '0020_chunkedupload_writing_since'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql='CREATE SEQUENCE IF NOT EXISTS core_row_id_seq;',
+            reverse_sql='DROP SEQUENCE IF EXISTS core_row_id_seq;',
+        ),
+        migrations.RunSQL(sql='DELETE FROM core_entitylink;', reverse_sql=migrations.RunSQL.noop),
+        migrations.RemoveField(
+            model_name='entitylink',
+            name='row_ctid',
+        ),
+        migrations.AddField(
+            model_name='entitylink',
+            name='row_id',
+            field=models.BigIntegerField(default=0),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 14:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_entitylink_row_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tablestats',
+            name='partition',
+            field=models.CharField(blank=True, default='', help_text='Секция, загрузкой которой собрана статистика (пусто — вся таблица).', max_length=255),
+        ),
+    ]
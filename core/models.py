@@ -1,4 +1,6 @@
 # core/models.py
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import User
 
@@ -10,6 +12,8 @@ class DBFUpload(models.Model):
     table_name = models.CharField(max_length=255, unique=True) # Имя таблицы в БД
     uploaded_at = models.DateTimeField(auto_now_add=True)
     uploaded_by = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Описания полей файла [{name, type, length, decimal_count}, ...] — для выгрузки обратно в DBF
+    dbf_fields = models.JSONField(default=list, blank=True)
 
     def __str__(self):
         return f"{self.filename} -> {self.table_name}"
@@ -44,6 +48,8 @@ class TableTemplate(models.Model):
         help_text="Имя таблицы в базе данных (например, 'my_table_name')."
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    # Время последнего изменения — версия шаблона для кэша (Excel-шаблоны и т.п.)
+    updated_at = models.DateTimeField(auto_now=True)
     created_by = models.ForeignKey(
         User,
         on_delete=models.SET_NULL,
@@ -51,6 +57,10 @@ class TableTemplate(models.Model):
         blank=True,
         help_text="Пользователь, который создал шаблон."
     )
+    use_projection = models.BooleanField(
+        default=False,
+        help_text="Строить узкую проекцию (материализованное представление) только с полями шаблона и искать по ней."
+    )
 
     def __str__(self):
         return f"Шаблон для {self.table_name}"
@@ -69,6 +79,16 @@ class TableTemplateFieldConfig(models.Model):
         ('search', 'Поиск'),
         ('result', 'Вывод'),
     ]
+    # Общие критерии поиска по всем таблицам (core/federated.py):
+    # поле с ролью получает значение соответствующего критерия
+    ROLE_CHOICES = [
+        ('last_name', 'Фамилия'),
+        ('first_name', 'Имя'),
+        ('middle_name', 'Отчество'),
+        ('birth_date', 'Дата рождения'),
+        ('document', 'Документ'),
+        ('address', 'Адрес'),
+    ]
 
     table_template = models.ForeignKey(
         TableTemplate,
@@ -90,6 +110,18 @@ class TableTemplateFieldConfig(models.Model):
     )
     # Порядок поля (если нужно сохранить порядок)
     order = models.PositiveIntegerField(default=0, help_text="Порядок поля в шаблоне.")
+    # Счётчики значений в результатах поиска (для полей с небольшим числом различных значений)
+    is_facet = models.BooleanField(
+        default=False,
+        help_text="Показывать в результатах поиска количество записей по значениям поля (фасет)."
+    )
+    role = models.CharField(
+        max_length=20,
+        choices=ROLE_CHOICES,
+        blank=True,
+        default='',
+        help_text="Какой общий критерий поиска по всем таблицам соответствует полю."
+    )
 
     class Meta:
         app_label = 'core'
@@ -97,4 +129,225 @@ class TableTemplateFieldConfig(models.Model):
         ordering = ['template_type', 'order'] # Сортировка по типу и порядку
 
     def __str__(self):
-        return f"{self.table_template.table_name} - {self.field_name} ({self.template_type}) -> {self.field_label}"
\ No newline at end of file
+        return f"{self.table_template.table_name} - {self.field_name} ({self.template_type}) -> {self.field_label}"
+
+class SlowSearchLog(models.Model):
+    """
+    Журнал медленных поисков.
+    Для выборки поисков, превысивших порог SLOW_SEARCH_THRESHOLD_MS,
+    в фоне снимается план EXPLAIN (ANALYZE, BUFFERS).
+    """
+    table_name = models.CharField(max_length=255, db_index=True)
+    search_fields = models.CharField(
+        max_length=2048,
+        help_text="Отсортированный список полей поиска через запятую."
+    )
+    duration_ms = models.FloatField(help_text="Время выполнения поиска в представлении (мс).")
+    plan_execution_ms = models.FloatField(null=True, blank=True, help_text="Execution Time из EXPLAIN ANALYZE (мс).")
+    rows_returned = models.PositiveIntegerField(default=0)
+    has_seq_scan = models.BooleanField(default=False, help_text="В плане есть Seq Scan.")
+    sql_query = models.TextField()
+    plan = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        app_label = 'core'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['table_name', 'search_fields']),
+        ]
+
+    def __str__(self):
+        return f"{self.table_name} [{self.search_fields}] {self.duration_ms:.0f} мс"
+
+
+class TableGeneration(models.Model):
+    """
+    Поколение импортированной таблицы.
+    Увеличивается при каждой перезагрузке таблицы (сигнал table_loaded)
+    и используется как часть ключей кэша (схема, счётчики и т.п.).
+    """
+    table_name = models.CharField(max_length=255, unique=True)
+    generation = models.PositiveIntegerField(default=0)
+    changed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        app_label = 'core'
+
+    def __str__(self):
+        return f"{self.table_name} #{self.generation}"
+
+
+class TableStats(models.Model):
+    """
+    Статистика таблицы, собранная при загрузке (core/profiling.py).
+    Для секционированной таблицы — по одной записи на секцию (table_name — общая таблица).
+    """
+    table_name = models.CharField(max_length=255, db_index=True)
+    partition = models.CharField(max_length=255, blank=True, default='', help_text="Секция, загрузкой которой собрана статистика (пусто — вся таблица).")
+    dbf_upload = models.ForeignKey(DBFUpload, on_delete=models.CASCADE, null=True, blank=True, related_name='stats')
+    excel_upload = models.ForeignKey(ExcelUpload, on_delete=models.CASCADE, null=True, blank=True, related_name='stats')
+    row_count = models.PositiveBigIntegerField(default=0)
+    computed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        app_label = 'core'
+        ordering = ['-computed_at']
+
+    def __str__(self):
+        return f"{self.partition or self.table_name}: {self.row_count} строк"
+
+    @property
+    def column_list(self):
+        """
+        Статистика столбцов; у сводной статистики секций (profiling.get_latest_stats) задаётся напрямую.
+        """
+        column_list = getattr(self, '_column_list', None)
+        return list(self.columns.all()) if column_list is None else column_list
+
+
+class ColumnStats(models.Model):
+    """
+    Статистика одного столбца таблицы.
+    """
+    table_stats = models.ForeignKey(TableStats, on_delete=models.CASCADE, related_name='columns')
+    column_name = models.CharField(max_length=255)
+    position = models.PositiveIntegerField(default=0)
+    null_count = models.PositiveBigIntegerField(default=0)
+    min_length = models.PositiveIntegerField(null=True, blank=True)
+    max_length = models.PositiveIntegerField(null=True, blank=True)
+    approx_distinct = models.PositiveBigIntegerField(default=0, help_text="Оценка HyperLogLog.")
+    top_values = models.JSONField(default=list, blank=True, help_text="Самые частые значения: [[значение, количество], ...].")
+
+    class Meta:
+        app_label = 'core'
+        ordering = ['position']
+
+    def __str__(self):
+        return f"{self.table_stats.table_name}.{self.column_name}"
+
+    @property
+    def null_percent(self):
+        row_count = self.table_stats.row_count
+        return 100.0 * self.null_count / row_count if row_count else 0.0
+
+
+class SavedSearch(models.Model):
+    """
+    Сохранённый поиск пользователя: таблица, значения полей поиска и поля вывода.
+    Результаты заранее вычисляются командой refresh_saved_searches в таблицу-снимок
+    (core/saved_searches.py). Снимок актуален, пока поколение таблицы
+    (TableGeneration) равно snapshot_generation.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='saved_searches')
+    name = models.CharField(max_length=255)
+    table_name = models.CharField(max_length=255, db_index=True)
+    filters = models.JSONField(default=dict, help_text="Значения полей поиска: {поле: значение}.")
+    result_fields = models.JSONField(default=list, help_text="Поля вывода в порядке показа.")
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Снимок результатов (None — ещё не построен или поиск изменён)
+    snapshot_generation = models.PositiveIntegerField(null=True, blank=True)
+    snapshot_rows = models.PositiveIntegerField(default=0)
+    snapshot_truncated = models.BooleanField(default=False)
+    refreshed_at = models.DateTimeField(null=True, blank=True)
+    refresh_error = models.TextField(blank=True)
+
+    class Meta:
+        app_label = 'core'
+        ordering = ['name']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'name'], name='core_savedsearch_user_name_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.table_name})"
+
+
+class ChunkedUpload(models.Model):
+    """
+    Загрузка большого DBF/Excel-файла по частям (core/chunked_uploads.py).
+    Части дописываются в файл <CHUNKED_UPLOAD_DIR>/<id>.part; offset — сколько
+    байт уже принято, с этого места клиент продолжает после обрыва.
+    """
+    STATUS_UPLOADING = 'uploading'
+    STATUS_LOADING = 'loading'
+    STATUS_LOADED = 'loaded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_UPLOADING, 'Загружается'),
+        (STATUS_LOADING, 'Загружается в базу'),
+        (STATUS_LOADED, 'Загружен в базу'),
+        (STATUS_FAILED, 'Ошибка'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chunked_uploads')
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField(help_text="Полный размер файла в байтах.")
+    offset = models.PositiveBigIntegerField(default=0, help_text="Сколько байт уже принято.")
+    writing_since = models.DateTimeField(null=True, blank=True, help_text="Когда началась запись текущей части (пусто — часть не пишется).")
+    sha256 = models.CharField(max_length=64, blank=True, help_text="Контрольная сумма всего файла (необязательно).")
+    options = models.JSONField(default=dict, blank=True, help_text="Параметры загрузки (секция DBF и т.п.).")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_UPLOADING)
+    error = models.TextField(blank=True)
+    table_name = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        app_label = 'core'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.filename}: {self.offset}/{self.size}"
+
+
+class IngestReject(models.Model):
+    """
+    Запись файла, пропущенная при загрузке из-за ошибки (core/ingest.py):
+    номер записи в файле, причина и исходные данные. При перезагрузке таблицы
+    прежние записи удаляются.
+    """
+    table_name = models.CharField(max_length=255, db_index=True)
+    filename = models.CharField(max_length=255)
+    row_number = models.PositiveBigIntegerField(help_text="Номер записи в файле (в Excel — номер строки листа).")
+    reason = models.TextField()
+    data = models.TextField(blank=True, help_text="Исходная запись: текст записи DBF или значения строки Excel (JSON).")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        app_label = 'core'
+        ordering = ['table_name', 'row_number']
+        verbose_name = 'отклонённая запись'
+        verbose_name_plural = 'отклонённые записи'
+
+    def __str__(self):
+        return f"{self.table_name} #{self.row_number}: {self.reason}"
+
+
+class EntityLink(models.Model):
+    """
+    Запись индекса связей (core/entity_links.py): нормализованный ключ человека
+    (фамилия + инициал + дата рождения, номер документа) -> строка импортированной таблицы.
+    relation — таблица, в которой лежит строка (для секционированной таблицы — секция),
+    row_id — постоянный номер строки (столбец core_row_id, см. core/sql_utils.py);
+    при перезагрузке записи таблицы перестраиваются.
+    """
+    key = models.TextField()
+    table_name = models.CharField(max_length=255)
+    relation = models.CharField(max_length=255)
+    row_id = models.BigIntegerField()
+
+    class Meta:
+        app_label = 'core'
+        indexes = [
+            # Поиск связанных записей — одна проба по ключу
+            models.Index(fields=['key'], name='core_entitylink_key_idx'),
+            # Перестроение записей таблицы или секции
+            models.Index(fields=['table_name', 'relation'], name='core_entitylink_table_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.key} -> {self.relation} {self.row_id}"
@@ -0,0 +1,159 @@
+# core/partitions.py
+"""
+Секционированные таблицы.
+
+Реестры, которые перезагружаются по годам или по регионам, можно хранить
+одной таблицей PostgreSQL, секционированной по списку значений столбца
+(PARTITION BY LIST). Каждый DBF-файл содержит одну секцию (одно значение
+столбца секционирования): он загружается в отдельную таблицу, которая затем
+подключается к общей (ATTACH PARTITION) вместо прежней секции с тем же
+значением (DETACH + DROP). Остальные секции при этом не перестраиваются.
+
+Поиск с условием на столбец секционирования сравнивает его точным
+совпадением, чтобы PostgreSQL отбросил лишние секции (partition pruning).
+"""
+import hashlib
+import re
+
+from .db_routing import get_read_connection
+from .sql_utils import ROW_ID_COLUMN_SQL, short_identifier
+
+PARTITION_SEPARATOR = '__p_'
+
+# Типы загруженных столбцов (core/dbf_stream.py) -> типы information_schema
+BASE_TYPES = {
+    'INTEGER': 'integer',
+    'NUMERIC': 'numeric',
+    'VARCHAR': 'character varying',
+}
+
+
+def get_partition_column(table_name):
+    """
+    Столбец секционирования таблицы или None, если таблица не секционирована (или её нет).
+    """
+    with get_read_connection().cursor() as cursor:
+        cursor.execute("""
+            SELECT a.attname
+            FROM pg_partitioned_table p
+            JOIN pg_class c ON c.oid = p.partrelid
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            JOIN pg_attribute a ON a.attrelid = p.partrelid AND a.attnum = p.partattrs[0]
+            WHERE n.nspname = 'public'
+              AND c.relname = %s
+              AND p.partnatts = 1;
+        """, [table_name])
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def partition_name(table_name, value):
+    """
+    Имя секции для значения столбца секционирования: people__p_2023.
+    Если значение содержит недопустимые символы, к имени добавляется хэш значения.
+    """
+    text = str(value)
+    slug = re.sub(r'[^a-zA-Z0-9_]', '_', text)
+    if slug != text:
+        slug = f"{slug}_{hashlib.md5(text.encode('utf-8')).hexdigest()[:6]}"
+    return short_identifier(f"{table_name}{PARTITION_SEPARATOR}{slug}")
+
+
+def _parse_type(sql_type):
+    """
+    'VARCHAR(300)' -> ('character varying', 300); 'INTEGER' -> ('integer', None).
+    """
+    match = re.match(r'^(\w+)(?:\((\d+)\))?$', sql_type)
+    return BASE_TYPES.get(match.group(1), match.group(1).lower()), int(match.group(2)) if match.group(2) else None
+
+
+def _align_columns(cursor, table_name, field_types):
+    """
+    Приводит столбцы общей таблицы к новому файлу: добавляет недостающие столбцы
+    и расширяет VARCHAR (изменение длины не перезаписывает секции).
+    Несовместимые типы — ошибка.
+    """
+    cursor.execute(
+        "SELECT column_name, data_type, character_maximum_length FROM information_schema.columns WHERE table_name = %s;",
+        [table_name],
+    )
+    existing = {name: (data_type, max_length) for name, data_type, max_length in cursor.fetchall()}
+    for field_name, field_type in field_types.items():
+        if field_name not in existing:
+            cursor.execute(f'ALTER TABLE "{table_name}" ADD COLUMN "{field_name}" {field_type};')
+            continue
+        new_type, new_length = _parse_type(field_type)
+        old_type, old_length = existing[field_name]
+        if old_type == 'character varying':
+            if new_type == old_type and old_length and new_length and new_length > old_length:
+                cursor.execute(f'ALTER TABLE "{table_name}" ALTER COLUMN "{field_name}" TYPE {field_type};')
+        elif not (new_type == old_type or (old_type == 'numeric' and new_type == 'integer')):
+            raise ValueError(
+                f'Тип столбца "{field_name}" в файле ({field_type}) не совместим с таблицей "{table_name}" ({old_type}).'
+            )
+
+
+def load_partition(cursor, table_name, partition_column, field_types, source_table):
+    """
+    Загружает одну секцию из таблицы source_table (промежуточная таблица
+    загрузки файла) и подключает её к таблице table_name вместо прежней секции
+    с тем же значением. Если таблицы ещё нет, она создаётся.
+
+    field_types — {столбец: тип SQL} в порядке столбцов файла.
+    Вызывается внутри транзакции. Возвращает имя секции.
+    """
+    field_names = list(field_types)
+    if partition_column not in field_types:
+        raise ValueError(f'В файле нет столбца секционирования "{partition_column}".')
+    cursor.execute(
+        f'SELECT count(DISTINCT "{partition_column}"), count(*) FILTER (WHERE "{partition_column}" IS NULL), '
+        f'min("{partition_column}") FROM "{source_table}";'
+    )
+    value_count, null_count, value = cursor.fetchone()
+    if null_count:
+        value_count += 1
+    if value_count != 1 or null_count:
+        raise ValueError(
+            f'Файл должен содержать одно непустое значение столбца "{partition_column}", найдено значений: {value_count}.'
+        )
+
+    cursor.execute("SELECT 1 FROM pg_tables WHERE schemaname = 'public' AND tablename = %s;", [table_name])
+    if cursor.fetchone() is None:
+        columns_sql = ', '.join(f'"{name}" {field_type}' for name, field_type in field_types.items())
+        columns_sql += f', {ROW_ID_COLUMN_SQL}' # Секции (LIKE общей таблицы) нумеруют строки по умолчанию
+        cursor.execute(f'CREATE TABLE "{table_name}" ({columns_sql}) PARTITION BY LIST ("{partition_column}");')
+    else:
+        _align_columns(cursor, table_name, field_types)
+
+    # Новая секция загружается рядом, прежняя остаётся доступной до замены
+    partition = partition_name(table_name, value)
+    staging = short_identifier(f"{partition}__new")
+    constraint = short_identifier(f"{staging}_bound")
+    cursor.execute(f'DROP TABLE IF EXISTS "{staging}";')
+    cursor.execute(f'CREATE TABLE "{staging}" (LIKE "{table_name}" INCLUDING DEFAULTS);')
+    # CHECK совпадает с границей секции — ATTACH PARTITION не будет сканировать таблицу для проверки
+    cursor.execute(
+        f'ALTER TABLE "{staging}" ADD CONSTRAINT "{constraint}" '
+        f'CHECK ("{partition_column}" IS NOT NULL AND "{partition_column}" = %s);',
+        [value],
+    )
+    columns = ', '.join(f'"{name}"' for name in field_names)
+    cursor.execute(f'INSERT INTO "{staging}" ({columns}) SELECT {columns} FROM "{source_table}";')
+
+    # Заменяем секцию: DETACH + DROP старой, ATTACH новой
+    cursor.execute("""
+        SELECT 1
+        FROM pg_inherits i
+        JOIN pg_class child ON child.oid = i.inhrelid
+        JOIN pg_class parent ON parent.oid = i.inhparent
+        WHERE parent.relname = %s AND child.relname = %s;
+    """, [table_name, partition])
+    if cursor.fetchone():
+        cursor.execute(f'ALTER TABLE "{table_name}" DETACH PARTITION "{partition}";')
+        cursor.execute(f'DROP TABLE "{partition}";')
+    cursor.execute(f'ALTER TABLE "{staging}" RENAME TO "{partition}";')
+    cursor.execute(f'ALTER TABLE "{table_name}" ATTACH PARTITION "{partition}" FOR VALUES IN (%s);', [value])
+    cursor.execute(f'ALTER TABLE "{partition}" DROP CONSTRAINT "{constraint}";')
+    cursor.execute(f'ANALYZE "{partition}";')
+    print(f"DEBUG: partition {partition} ({partition_column} = {value!r}) attached to {table_name}")
+    return partition
@@ -0,0 +1,256 @@
+# core/profiling.py
+"""
+Профилирование данных при загрузке.
+
+Статистика по столбцам считается в том же проходе по записям, что и загрузка:
+число строк, число NULL, минимальная/максимальная длина, приблизительное
+число различных значений (HyperLogLog) и самые частые значения.
+Результат сохраняется в TableStats/ColumnStats и показывается на страницах
+поиска и шаблона — без отдельного полного сканирования таблицы.
+"""
+import heapq
+import math
+from collections import Counter
+
+from django.db import transaction
+
+from .models import ColumnStats, TableStats
+
+MASK64 = 0xFFFFFFFFFFFFFFFF
+TOP_VALUES_COUNT = 10 # Сколько самых частых значений хранится для столбца
+
+
+def _mix64(value):
+    """
+    Перемешивание битов хэша (финализатор splitmix64).
+    hash() целых чисел в Python равен самому числу — без перемешивания
+    HyperLogLog давал бы для них неверную оценку.
+    """
+    z = (hash(value) + 0x9E3779B97F4A7C15) & MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK64
+    return z ^ (z >> 31)
+
+
+class HyperLogLog:
+    """
+    Оценка числа различных значений за O(2^p) памяти.
+    При p=12 — 4096 регистров, погрешность около 1.6%.
+    hash() строк случаен между процессами, но постоянен внутри одной загрузки — этого достаточно.
+    """
+    def __init__(self, p=12):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(self.m)
+        self._rank_bits = 64 - p
+
+    def add(self, value):
+        h = _mix64(value)
+        index = h >> self._rank_bits
+        rest = h & ((1 << self._rank_bits) - 1)
+        rank = self._rank_bits - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self):
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Поправка для малых мощностей (linear counting)
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+
+class TopK:
+    """
+    Приблизительные самые частые значения.
+    Хранится не более 2*capacity счётчиков; при переполнении остаются capacity самых частых.
+    """
+    def __init__(self, k=10, capacity=200):
+        self.k = k
+        self.capacity = capacity
+        self.counts = {}
+
+    def add(self, value):
+        counts = self.counts
+        counts[value] = counts.get(value, 0) + 1
+        if len(counts) > self.capacity * 2:
+            self.counts = dict(heapq.nlargest(self.capacity, counts.items(), key=lambda item: item[1]))
+
+    def add_counts(self, value_counts):
+        """
+        Добавляет сразу {значение: сколько раз встретилось} (пачка строк).
+        """
+        counts = self.counts
+        for value, count in value_counts.items():
+            counts[value] = counts.get(value, 0) + count
+        if len(counts) > self.capacity * 2:
+            self.counts = dict(heapq.nlargest(self.capacity, counts.items(), key=lambda item: item[1]))
+
+    def top(self):
+        return heapq.nlargest(self.k, self.counts.items(), key=lambda item: item[1])
+
+
+class ColumnProfiler:
+    """
+    Статистика одного столбца.
+    """
+    def __init__(self, name, top_k=TOP_VALUES_COUNT):
+        self.name = name
+        self.null_count = 0
+        self.min_length = None
+        self.max_length = None
+        self.distinct = HyperLogLog()
+        self.top_values = TopK(k=top_k)
+
+    def add(self, value):
+        if value is None:
+            self.null_count += 1
+            return
+        length = len(value) if isinstance(value, str) else len(str(value))
+        if self.max_length is None or length > self.max_length:
+            self.max_length = length
+        if self.min_length is None or length < self.min_length:
+            self.min_length = length
+        self.distinct.add(value)
+        self.top_values.add(value)
+
+    def add_values(self, values):
+        """
+        Пачка значений столбца. Длина, HyperLogLog и счётчики обновляются
+        по одному разу на различное значение — в пачке они часто повторяются.
+        """
+        counts = Counter(values)
+        self.null_count += counts.pop(None, 0)
+        if not counts:
+            return
+        lengths = [len(value) if isinstance(value, str) else len(str(value)) for value in counts]
+        if self.max_length is None or max(lengths) > self.max_length:
+            self.max_length = max(lengths)
+        if self.min_length is None or min(lengths) < self.min_length:
+            self.min_length = min(lengths)
+        for value in counts:
+            self.distinct.add(value)
+        self.top_values.add_counts(counts)
+
+
+class TableProfiler:
+    """
+    Статистика таблицы: профили всех столбцов и число строк.
+    """
+    def __init__(self, column_names, top_k=TOP_VALUES_COUNT):
+        self.row_count = 0
+        self.columns = [ColumnProfiler(name, top_k=top_k) for name in column_names]
+
+    def add_row(self, values):
+        """
+        Строка как последовательность значений в порядке столбцов.
+        """
+        self.row_count += 1
+        for profile, value in zip(self.columns, values):
+            profile.add(value)
+
+    def add_rows(self, rows):
+        """
+        Пачка строк (последовательностей значений в порядке столбцов) — по столбцам.
+        """
+        if not rows:
+            return
+        self.row_count += len(rows)
+        for profile, values in zip(self.columns, zip(*rows)):
+            profile.add_values(values)
+
+    @transaction.atomic
+    def save(self, table_name, partition='', dbf_upload=None, excel_upload=None):
+        """
+        Сохраняет статистику, заменяя предыдущую для этой таблицы или, если задана
+        partition, для этой секции общей таблицы table_name.
+        """
+        stats = TableStats.objects.filter(table_name=table_name)
+        if partition:
+            # Прежняя статистика секции и статистика таблицы до секционирования
+            stats = stats.filter(partition__in=[partition, ''])
+        stats.delete()
+        table_stats = TableStats.objects.create(
+            table_name=table_name,
+            partition=partition,
+            dbf_upload=dbf_upload,
+            excel_upload=excel_upload,
+            row_count=self.row_count,
+        )
+        ColumnStats.objects.bulk_create([
+            ColumnStats(
+                table_stats=table_stats,
+                column_name=profile.name,
+                position=position,
+                null_count=profile.null_count,
+                min_length=profile.min_length,
+                max_length=profile.max_length,
+                approx_distinct=min(profile.distinct.count(), self.row_count - profile.null_count),
+                top_values=[[str(value), count] for value, count in profile.top_values.top()],
+            )
+            for position, profile in enumerate(self.columns)
+        ])
+        return table_stats
+
+
+def _merge_partition_stats(table_name, partition_stats):
+    """
+    Сводная статистика секционированной таблицы по статистике секций (не сохраняется).
+    Строки и NULL складываются; различных значений — точно, если в каждой секции
+    частые значения охватывают все её значения, иначе — как в самой «разнообразной»
+    секции (HyperLogLog секций не хранится, точнее не оценить);
+    частые значения — по сумме счётчиков секций. Столбец, которого не было
+    в секции при её загрузке, считается в ней NULL.
+    """
+    merged = TableStats(
+        table_name=table_name,
+        row_count=sum(stats.row_count for stats in partition_stats),
+        computed_at=max(stats.computed_at for stats in partition_stats),
+    )
+    merged.partition_count = len(partition_stats)
+
+    # partition_stats — от последней загрузки к первой: порядок столбцов — по последней секции
+    columns = {}
+    for stats in partition_stats:
+        for column in stats.columns.all():
+            columns.setdefault(column.column_name, []).append((stats, column))
+    merged._column_list = []
+    for position, (column_name, items) in enumerate(columns.items()):
+        lengths = [column for _, column in items if column.max_length is not None]
+        top_values = Counter()
+        for _, column in items:
+            top_values.update({value: count for value, count in column.top_values})
+        if all(column.approx_distinct <= len(column.top_values) for _, column in items):
+            approx_distinct = len(top_values) # В каждой секции частые значения — все её значения
+        else:
+            approx_distinct = max(column.approx_distinct for _, column in items)
+        null_count = merged.row_count - sum(stats.row_count - column.null_count for stats, column in items)
+        merged._column_list.append(ColumnStats(
+            table_stats=merged,
+            column_name=column_name,
+            position=position,
+            null_count=null_count,
+            min_length=min((column.min_length for column in lengths), default=None),
+            max_length=max((column.max_length for column in lengths), default=None),
+            approx_distinct=approx_distinct,
+            top_values=[[value, count] for value, count in top_values.most_common(TOP_VALUES_COUNT)],
+        ))
+    return merged
+
+
+def get_latest_stats(table_name):
+    """
+    Последняя статистика таблицы (со столбцами) или None.
+    Для секционированной таблицы — сводная по последним загрузкам всех секций.
+    """
+    if not table_name:
+        return None
+    stats = list(TableStats.objects.filter(table_name=table_name).prefetch_related('columns'))
+    if not stats:
+        return None
+    if not stats[0].partition:
+        return stats[0]
+    return _merge_partition_stats(table_name, stats)
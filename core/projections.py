@@ -0,0 +1,191 @@
+# core/projections.py
+"""
+Узкие поисковые проекции для шаблонов таблиц.
+
+Импортированные таблицы широкие (100+ столбцов VARCHAR(255+)), а шаблон
+использует для поиска и вывода лишь несколько полей. Если у шаблона включён
+флаг use_projection, строится материализованное представление proj_<таблица>,
+в котором есть только поля поиска и вывода шаблона, а для полей поиска —
+ещё и заранее вычисленные нормализованные ключи "<поле>__key"
+(см. search_keys) с индексами.
+
+Проекция перестраивается после загрузки таблицы (сигнал table_loaded)
+и после изменения шаблона (сигнал template_changed). Новая проекция
+строится под временным именем, пока поиски читают прежнюю, и подменяет
+её (DROP + RENAME) в одной короткой транзакции.
+
+Описание проекции (get_projection) кэшируется по версии таблицы
+(catalog.get_table_version: поколение таблицы и изменение шаблона).
+"""
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.dispatch import receiver
+
+from . import catalog
+from .db_routing import get_read_connection
+from .models import TableTemplate, TableTemplateFieldConfig
+from .search_keys import key_expression
+from .signals import table_loaded, template_changed
+from .sql_utils import short_identifier
+
+PROJECTION_PREFIX = 'proj_'
+KEY_SUFFIX = '__key'
+CACHE_PREFIX = 'core:projection'
+# В кэше: проекции нет
+NO_PROJECTION = 'none'
+
+
+def projection_name(table_name):
+    return short_identifier(f"{PROJECTION_PREFIX}{table_name}")
+
+
+def key_column(field_name):
+    return short_identifier(f"{field_name}{KEY_SUFFIX}")
+
+
+def index_name(proj_name, field_name):
+    return short_identifier(f"{proj_name}_{key_column(field_name)}_idx")
+
+
+def _cache_key(table_name):
+    return f"{CACHE_PREFIX}:{table_name}:{catalog.get_table_version(table_name)[0]}"
+
+
+def drop_projection(cursor, table_name):
+    """
+    Удаляет проекцию таблицы (если есть).
+    Вызывается перед DROP TABLE при перезагрузке таблицы — иначе
+    PostgreSQL не даст удалить таблицу, от которой зависит представление.
+    """
+    cursor.execute(f'DROP MATERIALIZED VIEW IF EXISTS "{projection_name(table_name)}";')
+
+
+def build_projection(table_name):
+    """
+    (Пере)создаёт проекцию для таблицы по её шаблону.
+    Если шаблона нет или флаг use_projection выключен — проекция удаляется.
+    Возвращает True, если проекция построена.
+    """
+    try:
+        return _build_projection(table_name)
+    finally:
+        # Описание проекции в кэше этого процесса могло сохраниться до подмены
+        cache.delete(_cache_key(table_name))
+
+
+def _build_projection(table_name):
+    template = TableTemplate.objects.prefetch_related('field_configs').filter(table_name=table_name).first()
+    if template is None or not template.use_projection:
+        with connection.cursor() as cursor:
+            drop_projection(cursor, table_name)
+        return False
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT column_name FROM information_schema.columns WHERE table_name = %s ORDER BY ordinal_position;",
+            [table_name],
+        )
+        table_columns = {row[0] for row in cursor.fetchall()}
+
+    # Поля шаблона без повторов, в порядке: сначала поиск, затем вывод
+    search_fields = []
+    projected_fields = []
+    for cfg in template.field_configs.all():
+        if cfg.field_name not in table_columns:
+            continue
+        if cfg.template_type == 'search' and cfg.field_name not in search_fields:
+            search_fields.append(cfg.field_name)
+        if cfg.field_name not in projected_fields:
+            projected_fields.append(cfg.field_name)
+
+    if not projected_fields:
+        # Таблицы нет (например, шаблон создан заранее) или в ней нет полей шаблона
+        with connection.cursor() as cursor:
+            drop_projection(cursor, table_name)
+        return False
+
+    select_parts = [f'"{field_name}"' for field_name in projected_fields]
+    select_parts += [f'{key_expression(f)} AS "{key_column(f)}"' for f in search_fields]
+    proj_name = projection_name(table_name)
+    # Строим под временным именем: прежняя проекция до подмены остаётся доступной поискам
+    build_name = short_identifier(f"{proj_name}_{uuid.uuid4().hex[:8]}")
+    with connection.cursor() as cursor:
+        # При ошибке транзакция откатывается вместе с недостроенной проекцией
+        with transaction.atomic():
+            cursor.execute(f'CREATE MATERIALIZED VIEW "{build_name}" AS SELECT {", ".join(select_parts)} FROM "{table_name}";')
+            # Индексы по ключам: text_pattern_ops подходит для LIKE 'префикс%'
+            for field_name in search_fields:
+                cursor.execute(
+                    f'CREATE INDEX "{index_name(build_name, field_name)}" '
+                    f'ON "{build_name}" ("{key_column(field_name)}" text_pattern_ops);'
+                )
+            cursor.execute(f'ANALYZE "{build_name}";')
+
+        # Подмена — одна короткая транзакция: поиск видит либо прежнюю проекцию, либо новую
+        with transaction.atomic():
+            drop_projection(cursor, table_name)
+            cursor.execute(f'ALTER MATERIALIZED VIEW "{build_name}" RENAME TO "{proj_name}";')
+            for field_name in search_fields:
+                cursor.execute(
+                    f'ALTER INDEX "{index_name(build_name, field_name)}" RENAME TO "{index_name(proj_name, field_name)}";'
+                )
+
+    print(f"DEBUG: projection {proj_name} built with fields {projected_fields}")
+    return True
+
+
+def get_projection(table_name):
+    """
+    Возвращает описание проекции таблицы или None, если её нет:
+    {'name': ..., 'columns': set(...), 'result_fields': [...]}.
+    result_fields — поля вывода шаблона в заданном порядке.
+    """
+    cache_key = _cache_key(table_name)
+    projection = cache.get(cache_key)
+    if projection is None:
+        projection = _read_projection(table_name) or NO_PROJECTION
+        cache.set(cache_key, projection, settings.CATALOG_CACHE_TIMEOUT)
+    return None if projection == NO_PROJECTION else projection
+
+
+def _read_projection(table_name):
+    proj_name = projection_name(table_name)
+    with get_read_connection().cursor() as cursor:
+        # information_schema не показывает материализованные представления, смотрим pg_attribute
+        cursor.execute("""
+            SELECT a.attname
+            FROM pg_attribute a
+            JOIN pg_class c ON c.oid = a.attrelid
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = 'public'
+              AND c.relname = %s
+              AND c.relkind = 'm'
+              AND a.attnum > 0
+              AND NOT a.attisdropped
+            ORDER BY a.attnum;
+        """, [proj_name])
+        columns = {row[0] for row in cursor.fetchall()}
+    if not columns:
+        return None
+
+    result_fields = [
+        field_name for field_name in TableTemplateFieldConfig.objects.filter(
+            table_template__table_name=table_name,
+            template_type='result',
+        ).values_list('field_name', flat=True)
+        if field_name in columns
+    ]
+    return {'name': proj_name, 'columns': columns, 'result_fields': result_fields}
+
+
+@receiver(table_loaded)
+def rebuild_after_load(sender, table_name, **kwargs):
+    build_projection(table_name)
+
+
+@receiver(template_changed)
+def rebuild_after_template_change(sender, table_name, **kwargs):
+    build_projection(table_name)
@@ -0,0 +1,60 @@
+# core/query_builder.py
+"""
+Построение условий WHERE для поиска по импортированным таблицам.
+"""
+from . import projections
+from .search_keys import key_expression, like_pattern
+
+
+def build_conditions(search_values, key_fields, projection=None, exact_fields=(), facet_values=None):
+    """
+    Формирует условия WHERE и параметры для заполненных полей поиска.
+
+    search_values — {поле: значение из формы};
+    key_fields    — поля поиска шаблона: по ним ищем по нормализованному ключу
+                    (префикс, индекс core_search_key), по остальным — ILIKE '%...%';
+    projection    — описание проекции (projections.get_projection), если поиск идёт по ней;
+    exact_fields  — поля, которые сравниваются точно (столбец секционирования:
+                    условие "поле" = значение позволяет отбросить лишние секции);
+    facet_values  — {поле: значение фасета} из ссылок «сузить поиск»: точное
+                    совпадение без обработки значения (PostgreSQL приведёт его
+                    к типу столбца, в том числе INTEGER/NUMERIC).
+
+    Возвращает (where_parts, params).
+    """
+    where_parts = []
+    params = []
+    for field_name, search_value in search_values.items():
+        if not search_value:
+            continue
+        # ПРЕОБРАЗУЕМ поисковое значение ИЗ UTF-8 В CP866 (если база в cp866)
+        try:
+            search_value_cp866 = search_value.encode('cp866').decode('cp866')
+        except UnicodeEncodeError:
+            # Обработка ошибки, если строку нельзя закодировать в cp866
+            print(f"Warning: Could not encode search value '{search_value}' to cp866 for field '{field_name}'. Skipping this field.")
+            continue # Пропускаем это поле в поиске
+
+        key_name = projections.key_column(field_name)
+        if field_name in exact_fields:
+            # Значение без приведения типа: PostgreSQL сам приведёт его к типу столбца
+            where_parts.append(f'"{field_name}" = %s')
+            params.append(search_value_cp866.strip())
+        elif projection and key_name in projection['columns']:
+            # В проекции ключ уже вычислен и проиндексирован
+            where_parts.append(f'"{key_name}" LIKE %s')
+            params.append(like_pattern(search_value_cp866))
+        elif field_name in key_fields:
+            # Выражение совпадает с индексом core_search_key — получаем индексную пробу
+            where_parts.append(f'{key_expression(field_name)} LIKE %s')
+            params.append(like_pattern(search_value_cp866))
+        else:
+            # Поле не из шаблона поиска: ищем часть строки без учёта регистра
+            where_parts.append(f'"{field_name}" ILIKE %s')
+            params.append(f'%{search_value_cp866}%')
+    for field_name, facet_value in (facet_values or {}).items():
+        # Значение взято из счётчиков фасета (из базы) — сравниваем как есть, чтобы
+        # результат совпал с числом на ссылке
+        where_parts.append(f'"{field_name}" = %s')
+        params.append(facet_value)
+    return where_parts, params
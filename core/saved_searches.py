@@ -0,0 +1,136 @@
+# core/saved_searches.py
+"""
+Сохранённые поиски и снимки их результатов.
+
+Отделы ежедневно выполняют одни и те же поиски по реестрам. Такой поиск можно
+сохранить (SavedSearch): таблица, значения полей поиска и поля вывода.
+Команда refresh_saved_searches (запускается по расписанию) выполняет поиск
+и сохраняет результат в компактную таблицу-снимок core_snapshot_<id> —
+только поля вывода, не больше SAVED_SEARCH_MAX_ROWS строк. Открытие
+сохранённого поиска — чтение готового снимка.
+
+Снимок привязан к поколению таблицы (TableGeneration): после перезагрузки
+таблицы он считается устаревшим, и до следующего запуска команды поиск
+выполняется как обычно.
+"""
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.http import urlencode
+
+from . import catalog
+from .db_routing import get_read_connection, pin_to_primary
+from .models import SavedSearch
+from .search_query import SearchQuery
+from .sql_utils import short_identifier
+
+SNAPSHOT_PREFIX = 'core_snapshot_'
+
+
+def snapshot_name(saved_search_id):
+    return short_identifier(f"{SNAPSHOT_PREFIX}{saved_search_id}")
+
+
+def build_query(table_name, filters, result_fields):
+    """
+    SELECT для поиска — тот же, что у представления search (core/search_query.py).
+    Возвращает (sql без точки с запятой, params) или None, если в таблице нет
+    нужных столбцов или не заполнено ни одно поле поиска.
+    """
+    if not result_fields:
+        return None
+    query = SearchQuery(table_name, filters, result_fields)
+    if not query.columns or query.missing_fields or query.is_empty:
+        return None
+    return query.sql, query.params
+
+
+def search_query(saved_search):
+    """
+    Строка запроса обычного поиска (представление search) с параметрами сохранённого.
+    """
+    return urlencode({
+        'table': saved_search.table_name,
+        **saved_search.filters,
+        'result_fields': saved_search.result_fields,
+    }, doseq=True)
+
+
+def is_fresh(saved_search):
+    """
+    Снимок построен для текущего поколения таблицы.
+    """
+    return (
+        saved_search.snapshot_generation is not None
+        and saved_search.snapshot_generation == catalog.get_generation(saved_search.table_name)
+    )
+
+
+def refresh_snapshot(saved_search):
+    """
+    Перестраивает снимок результатов в основной базе. Новый снимок строится рядом
+    и заменяет прежний в одной транзакции — читатели видят либо старый, либо новый.
+    Возвращает число строк; при ошибке сохраняет её в refresh_error и пробрасывает.
+    """
+    # Поколение — до выполнения поиска: если таблицу перезагрузят во время
+    # построения, снимок сразу окажется устаревшим
+    with pin_to_primary():
+        generation = catalog.get_generation(saved_search.table_name)
+        query = build_query(saved_search.table_name, saved_search.filters, saved_search.result_fields)
+    if query is None:
+        saved_search.snapshot_generation = None
+        saved_search.refresh_error = 'В таблице нет полей сохранённого поиска или не заполнено ни одно поле поиска.'
+        saved_search.save(update_fields=['snapshot_generation', 'refresh_error'])
+        raise ValueError(saved_search.refresh_error)
+
+    sql_query, params = query
+    name = snapshot_name(saved_search.pk)
+    staging = short_identifier(f"{name}__new")
+    max_rows = settings.SAVED_SEARCH_MAX_ROWS
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("SET LOCAL statement_timeout = %s;", [settings.SAVED_SEARCH_REFRESH_TIMEOUT_MS])
+            cursor.execute(f'DROP TABLE IF EXISTS "{staging}";')
+            cursor.execute(f'CREATE TABLE "{staging}" AS {sql_query} LIMIT %s;', params + [max_rows])
+            cursor.execute(f'SELECT count(*) FROM "{staging}";')
+            row_count = cursor.fetchone()[0]
+            cursor.execute(f'DROP TABLE IF EXISTS "{name}";')
+            cursor.execute(f'ALTER TABLE "{staging}" RENAME TO "{name}";')
+    except Exception as e:
+        saved_search.refresh_error = str(e)
+        saved_search.save(update_fields=['refresh_error'])
+        raise
+
+    saved_search.snapshot_generation = generation
+    saved_search.snapshot_rows = row_count
+    # Результат упёрся в лимит — вероятно, строк больше
+    saved_search.snapshot_truncated = row_count >= max_rows
+    saved_search.refreshed_at = timezone.now()
+    saved_search.refresh_error = ''
+    saved_search.save(update_fields=[
+        'snapshot_generation', 'snapshot_rows', 'snapshot_truncated', 'refreshed_at', 'refresh_error',
+    ])
+    print(f"DEBUG: saved search {saved_search.pk} snapshot {name}: {saved_search.snapshot_rows} rows (generation {generation})")
+    return saved_search.snapshot_rows
+
+
+def read_snapshot(saved_search):
+    """
+    Результаты из снимка: список словарей {поле: значение} в порядке полей вывода.
+    """
+    with get_read_connection().cursor() as cursor:
+        cursor.execute(f'SELECT * FROM "{snapshot_name(saved_search.pk)}";')
+        columns = [col[0] for col in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def drop_snapshot(saved_search_id):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS "{snapshot_name(saved_search_id)}";')
+
+
+@receiver(post_delete, sender=SavedSearch)
+def drop_snapshot_after_delete(sender, instance, **kwargs):
+    drop_snapshot(instance.pk)
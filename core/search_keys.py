@@ -0,0 +1,117 @@
+# core/search_keys.py
+"""
+Нормализованные ключи поиска.
+
+Операторы вводят фамилии в разном регистре, с Ё/Е и лишними пробелами.
+Вместо ILIKE '%...%' (который не может использовать btree-индекс) для полей
+поиска шаблона строятся индексы по выражению core_search_key("поле"):
+нижний регистр, Ё -> Е, пробелы схлопнуты. Значение из формы нормализуется
+так же (normalize_search_value), и поиск идёт по префиксу — индексной пробой.
+
+Функция core_search_key создаётся миграцией 0008_core_search_key.
+Индексы (пере)создаются после загрузки таблицы и изменения шаблона.
+"""
+from django.db import connection
+from django.dispatch import receiver
+
+from .models import TableTemplateFieldConfig
+from .signals import table_loaded, template_changed
+from .sql_utils import short_identifier
+
+KEY_FUNCTION = 'core_search_key'
+INDEX_SUFFIX = '__skey'
+
+
+def normalize_search_value(value):
+    """
+    Нормализует значение так же, как SQL-функция core_search_key:
+    нижний регистр, Ё -> Е, пробелы схлопнуты и обрезаны по краям.
+    """
+    return ' '.join(value.lower().replace('ё', 'е').split())
+
+
+def key_expression(field_name):
+    """
+    SQL-выражение нормализованного ключа столбца.
+    Должно совпадать с выражением индекса, иначе индекс не будет использован.
+    """
+    return f'{KEY_FUNCTION}("{field_name}"::text)'
+
+
+def like_pattern(value):
+    """
+    Шаблон LIKE для нормализованного значения.
+    Поиск всегда по префиксу ('иванов%'), что покрывает и точное совпадение.
+    Символ * в значении — подстановочный знак внутри префикса: 'ив*ов' -> 'ив%ов%',
+    '*ванов' -> '%ванов%' (поиск по подстроке индексом по префиксу не ускоряется).
+    Введённые % и _ ищутся как обычные символы ('50%' -> '50\\%%').
+    """
+    normalized = normalize_search_value(value)
+    escaped = normalized.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    pattern = escaped.replace('*', '%')
+    # Завершающий подстановочный знак — только если его ввели (*), а не экранированный %
+    return pattern if normalized.endswith('*') else f'{pattern}%'
+
+
+def index_name(table_name, field_name):
+    return short_identifier(f"{table_name}__{field_name}{INDEX_SUFFIX}")
+
+
+def get_key_fields(table_name):
+    """
+    Поля поиска шаблона таблицы — для них поиск идёт по нормализованному ключу.
+    """
+    return set(
+        TableTemplateFieldConfig.objects.filter(
+            table_template__table_name=table_name,
+            template_type='search',
+        ).values_list('field_name', flat=True)
+    )
+
+
+def ensure_search_indexes(table_name):
+    """
+    Создаёт индексы по нормализованным ключам для полей поиска шаблона
+    и удаляет такие индексы для полей, которых в шаблоне больше нет.
+    """
+    key_fields = get_key_fields(table_name)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT column_name FROM information_schema.columns WHERE table_name = %s ORDER BY ordinal_position;",
+            [table_name],
+        )
+        table_columns = {row[0] for row in cursor.fetchall()}
+        if not table_columns:
+            return # Таблицы ещё нет
+
+        wanted = {index_name(table_name, f): f for f in key_fields if f in table_columns}
+
+        # Существующие индексы по core_search_key у этой таблицы
+        cursor.execute(
+            "SELECT indexname FROM pg_indexes WHERE schemaname = 'public' AND tablename = %s AND indexdef LIKE %s;",
+            [table_name, f'%{KEY_FUNCTION}(%'],
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+
+        for name in existing - set(wanted):
+            cursor.execute(f'DROP INDEX IF EXISTS "{name}";')
+        for name, field_name in wanted.items():
+            if name in existing:
+                continue
+            # text_pattern_ops нужен для LIKE 'префикс%' при любой сортировке (collation) базы
+            cursor.execute(
+                f'CREATE INDEX "{name}" ON "{table_name}" ({key_expression(field_name)} text_pattern_ops);'
+            )
+            print(f"DEBUG: created search key index {name} on {table_name}.{field_name}")
+        if set(wanted) - existing:
+            cursor.execute(f'ANALYZE "{table_name}";')
+
+
+@receiver(table_loaded)
+def build_indexes_after_load(sender, table_name, **kwargs):
+    ensure_search_indexes(table_name)
+
+
+@receiver(template_changed)
+def build_indexes_after_template_change(sender, table_name, **kwargs):
+    ensure_search_indexes(table_name)
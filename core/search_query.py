@@ -0,0 +1,159 @@
+# core/search_query.py
+"""
+Поиск по импортированной таблице: построение запроса и его выполнение.
+
+Одни и те же параметры поиска (таблица, значения полей, поля вывода)
+приходят из страницы поиска, сохранённых поисков, выгрузки в DBF и команд.
+SearchQuery один раз решает, как их выполнить:
+
+- столбцы таблицы — из кэшируемого каталога (core/catalog.py);
+- поля вывода — выбранные пользователем, иначе поля вывода проекции шаблона,
+  иначе все столбцы;
+- источник — узкая проекция шаблона, если в ней есть все нужные поля
+  и в условиях нет столбца секционирования (его сравниваем точно по самой
+  таблице, чтобы PostgreSQL отбросил лишние секции);
+- условия WHERE — query_builder.build_conditions (ключи полей поиска шаблона);
+  выбранные значения фасетов (facet__<поле>) сравниваются точно.
+
+execute() выполняет поиск пользователя под governor.governed_search
+(очередь тяжёлых поисков, statement_timeout по роли, отмена при уходе
+клиента), измеряет время, считает фасеты и отправляет медленные поиски
+на снятие плана — во всех местах одинаково.
+"""
+import time
+
+from . import catalog, diagnostics, facets, governor, partitions, projections, query_builder, search_keys
+from .db_routing import get_read_alias
+from .facets import FACET_PARAM_PREFIX
+
+
+def _field_of(key):
+    """
+    Имя поля по ключу условия (facet__<поле> -> <поле>).
+    """
+    return key[len(FACET_PARAM_PREFIX):] if key.startswith(FACET_PARAM_PREFIX) else key
+
+
+class SearchQuery:
+    def __init__(self, table_name, filters, result_fields=()):
+        """
+        filters — {поле: значение} (пустые значения не участвуют в поиске);
+        ключ facet__<поле> — выбранное значение фасета (точное совпадение);
+        result_fields — поля вывода (пусто — по умолчанию).
+        Поля, которых нет в таблице, отбрасываются и запоминаются в missing_fields.
+        """
+        self.table_name = table_name
+        self.columns = catalog.get_table_columns(table_name)
+        column_set = set(self.columns)
+        self.filters = {
+            key: value for key, value in filters.items() if value and _field_of(key) in column_set
+        }
+        self.missing_fields = ({_field_of(key) for key in filters} | set(result_fields)) - column_set
+        search_values = {key: value for key, value in self.filters.items() if not key.startswith(FACET_PARAM_PREFIX)}
+        facet_values = {
+            _field_of(key): value for key, value in self.filters.items() if key.startswith(FACET_PARAM_PREFIX)
+        }
+
+        # Узкая проекция шаблона (если для таблицы она построена)
+        projection = projections.get_projection(table_name)
+        self.result_fields = [f for f in result_fields if f in column_set]
+        if not self.result_fields:
+            if projection and projection['result_fields']:
+                self.result_fields = [f for f in projection['result_fields'] if f in column_set]
+            else:
+                self.result_fields = list(self.columns)
+
+        partition_column = partitions.get_partition_column(table_name)
+        exact_fields = {partition_column} & set(search_values) if partition_column else set()
+
+        # Ищем по проекции, только если в ней есть все нужные поля
+        needed = set(search_values) | set(facet_values) | set(self.result_fields)
+        if not (projection and not exact_fields and needed <= projection['columns']):
+            projection = None
+        self.projection = projection
+        self.source_table = projection['name'] if projection else table_name
+
+        self.where_parts, self.params = query_builder.build_conditions(
+            search_values, search_keys.get_key_fields(table_name), projection, exact_fields, facet_values,
+        )
+
+    @classmethod
+    def from_params(cls, table_name, params):
+        """
+        Поиск по параметрам страницы поиска (QueryDict): значения полей таблицы,
+        выбранные значения фасетов (facet__<поле>) и result_fields.
+        """
+        columns = catalog.get_table_columns(table_name)
+        keys = columns + [f'{FACET_PARAM_PREFIX}{field_name}' for field_name in columns]
+        filters = {key: params[key] for key in keys if params.get(key)}
+        return cls(table_name, filters, params.getlist('result_fields'))
+
+    @property
+    def is_empty(self):
+        """
+        Условий нет: не заполнено ни одно поле или ни одно значение не закодировалось в cp866.
+        """
+        return not self.where_parts
+
+    @property
+    def sql(self):
+        """
+        SELECT полей вывода (без точки с запятой — запрос можно обернуть в CREATE TABLE AS, LIMIT).
+        """
+        select_cols = ', '.join(f'"{col}"' for col in self.result_fields)
+        return f'SELECT {select_cols} FROM "{self.source_table}" WHERE {" AND ".join(self.where_parts)}'
+
+    @property
+    def is_heavy(self):
+        return governor.is_heavy(self.params)
+
+    def facet_fields(self):
+        """
+        Фасетные поля шаблона, которые есть в источнике поиска: [(поле, подпись)].
+        """
+        source_columns = self.projection['columns'] if self.projection else set(self.columns)
+        return [(f, label) for f, label in facets.get_facet_fields(self.table_name) if f in source_columns]
+
+    def fetch(self, cursor):
+        """
+        Выполняет запрос на cursor (внутри транзакции). Возвращает (столбцы, строки, время в мс).
+        """
+        # Данные в базе в cp866; SET LOCAL — только до конца транзакции поиска
+        cursor.execute("SET LOCAL client_encoding = 'WIN866';")
+        started = time.monotonic()
+        cursor.execute(f'{self.sql};', self.params)
+        rows = cursor.fetchall()
+        duration_ms = (time.monotonic() - started) * 1000
+        return [col[0] for col in cursor.description], rows, duration_ms
+
+    def execute(self, request):
+        """
+        Выполняет поиск пользователя на реплике (если она есть и не отстаёт).
+        Возвращает {'columns', 'rows', 'facet_fields', 'facet_counts', 'duration_ms'};
+        SearchRejected — поиск отклонён очередью, прерван по тайм-ауту или клиент ушёл.
+        """
+        read_alias = get_read_alias()
+        sql_query = f'{self.sql};'
+        print(f"DEBUG SQL Query: {sql_query}") # <-- Отладка: выводим SQL
+        with governor.governed_search(request, read_alias, self.is_heavy) as cursor:
+            columns, rows, duration_ms = self.fetch(cursor)
+
+            # Счётчики значений по фасетным полям — по тем же условиям и той же таблице/проекции
+            facet_fields = self.facet_fields()
+            facet_counts = facets.compute_facets(
+                self.table_name, self.source_table, self.where_parts, self.params, [f for f, _ in facet_fields],
+            )
+        print(f"DEBUG: search in {self.source_table}: {len(rows)} rows in {duration_ms:.1f} ms")
+
+        # Медленные поиски отправляем на снятие плана (в фоне)
+        diagnostics.capture_slow_search(
+            self.table_name, sorted({_field_of(key) for key in self.filters}), sql_query, self.params,
+            duration_ms, rows_returned=len(rows), user_id=request.user.id, using=read_alias,
+        )
+        return {
+            'columns': columns,
+            'rows': rows,
+            'facet_fields': facet_fields,
+            'facet_counts': facet_counts,
+            'duration_ms': duration_ms,
+        }
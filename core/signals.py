@@ -0,0 +1,14 @@
+# core/signals.py
+"""
+Сигналы приложения core.
+
+table_loaded     — таблица (пере)загружена из DBF/Excel. Аргумент: table_name;
+                   partition — имя секции, если загружена только она (иначе None или нет).
+template_changed — изменён или удалён шаблон таблицы. Аргумент: table_name.
+
+Обработчики подключаются в CoreConfig.ready().
+"""
+from django.dispatch import Signal
+
+table_loaded = Signal()
+template_changed = Signal()
@@ -0,0 +1,168 @@
+# core/snapshots.py
+"""
+Снимки импортированных таблиц в Parquet для аналитики.
+
+Тяжёлые аналитические запросы (группировки по всей таблице и т.п.) лучше
+выполнять над локальными файлами (pandas, DuckDB, Spark), а не над рабочей
+базой, где они мешают поиску. export_table выгружает таблицу в файл
+<SNAPSHOT_DIR>/<таблица>.parquet:
+
+- строки читаются с реплики (db_routing) серверным курсором — пачками
+  по SNAPSHOT_ROW_GROUP_SIZE строк, без чтения всей таблицы в память;
+- каждая пачка записывается отдельной группой строк (row group) со сжатием
+  SNAPSHOT_COMPRESSION, так что память процесса ограничена одной пачкой;
+- файл пишется под временным именем и заменяет прежний снимок только
+  целиком: читатели не видят недописанный файл.
+
+В метаданных файла — имя таблицы, её поколение (catalog.get_generation)
+и время выгрузки: по ним видно, устарел ли снимок.
+
+Запуск: python manage.py export_snapshot [таблица ...] или действие
+«Выгрузить снимок в Parquet» в админке загрузок.
+
+pyarrow импортируется при первой выгрузке: модуль подключает админка, и
+веб-процессы, которые снимков не делают, не должны его загружать.
+"""
+import functools
+import os
+import threading
+import uuid
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from . import catalog
+from .db_routing import get_read_connection
+from .sql_utils import ROW_ID_COLUMN
+
+SNAPSHOT_EXTENSION = '.parquet'
+
+
+
+@functools.lru_cache(maxsize=None)
+def arrow_types():
+    """
+    Тип столбца PostgreSQL (information_schema.columns.data_type) -> (тип Arrow, приведение в SELECT).
+    Ключ None — для остальных типов: они выгружаются текстом.
+    """
+    import pyarrow as pa
+    return {
+        'smallint': (pa.int16(), ''),
+        'integer': (pa.int32(), ''),
+        'bigint': (pa.int64(), ''),
+        'real': (pa.float32(), ''),
+        'double precision': (pa.float64(), ''),
+        # NUMERIC загружаемых таблиц без точности и масштаба — для аналитики достаточно float64
+        'numeric': (pa.float64(), '::double precision'),
+        'boolean': (pa.bool_(), ''),
+        'date': (pa.date32(), ''),
+        'timestamp without time zone': (pa.timestamp('us'), ''),
+        'timestamp with time zone': (pa.timestamp('us', tz='UTC'), ''),
+        'character varying': (pa.string(), ''),
+        'character': (pa.string(), ''),
+        'text': (pa.string(), ''),
+        None: (pa.string(), '::text'),
+    }
+
+
+def snapshot_path(table_name, directory=None):
+    return os.path.join(directory or settings.SNAPSHOT_DIR, f"{table_name}{SNAPSHOT_EXTENSION}")
+
+
+def _table_columns(cursor, table_name):
+    cursor.execute("""
+        SELECT column_name, data_type
+        FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = %s AND column_name <> %s
+        ORDER BY ordinal_position;
+    """, [table_name, ROW_ID_COLUMN])
+    return cursor.fetchall()
+
+
+def export_table(table_name, directory=None, row_group_size=None, compression=None):
+    """
+    Выгружает таблицу в <directory>/<таблица>.parquet. Возвращает (путь, число строк).
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if table_name not in catalog.get_available_tables():
+        raise ValueError(f'Таблица "{table_name}" не найдена.')
+    row_group_size = row_group_size or settings.SNAPSHOT_ROW_GROUP_SIZE
+    compression = compression or settings.SNAPSHOT_COMPRESSION
+    path = snapshot_path(table_name, directory)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+
+    connection = get_read_connection()
+    generation = catalog.get_generation(table_name)
+    rows = 0
+    try:
+        # Серверный курсор внутри транзакции: вне её Django объявляет курсор WITH HOLD,
+        # и PostgreSQL материализует весь результат ещё до первой пачки
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                columns = _table_columns(cursor, table_name)
+            if not columns:
+                raise ValueError(f'Таблица "{table_name}" не содержит столбцов.')
+            fields = []
+            select_parts = []
+            types = arrow_types()
+            for column_name, data_type in columns:
+                arrow_type, cast = types.get(data_type, types[None])
+                fields.append(pa.field(column_name, arrow_type))
+                select_parts.append(f'"{column_name}"{cast}')
+            schema = pa.schema(fields, metadata={
+                'table_name': table_name,
+                'generation': str(generation),
+                'exported_at': timezone.now().isoformat(),
+            })
+
+            with connection.chunked_cursor() as cursor, \
+                    pq.ParquetWriter(temp_path, schema, compression=compression) as writer:
+                cursor.execute(f'SELECT {", ".join(select_parts)} FROM "{table_name}";')
+                while True:
+                    batch = cursor.fetchmany(row_group_size)
+                    if not batch:
+                        break
+                    arrays = [pa.array(values, type=field.type) for field, values in zip(fields, zip(*batch))]
+                    writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema), row_group_size=row_group_size)
+                    rows += len(batch)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+
+    print(f"DEBUG: snapshot of {table_name} (generation {generation}): {rows} rows -> {path}")
+    return path, rows
+
+
+def export_tables(table_names, directory=None, row_group_size=None, compression=None):
+    """
+    Выгружает таблицы по очереди. Возвращает {таблица: (путь, число строк) или исключение}.
+    """
+    results = {}
+    for table_name in table_names:
+        try:
+            results[table_name] = export_table(table_name, directory, row_group_size, compression)
+        except Exception as e:
+            print(f"Warning: snapshot of {table_name} failed: {e}")
+            results[table_name] = e
+    return results
+
+
+def export_in_background(table_names):
+    """
+    Выгрузка из админки: в отдельном потоке, чтобы не держать запрос
+    на всё время выгрузки больших таблиц.
+    """
+    def run():
+        try:
+            export_tables(table_names)
+        finally:
+            connections.close_all()
+
+    thread = threading.Thread(target=run, name='core-snapshot-export', daemon=True)
+    thread.start()
+    return thread
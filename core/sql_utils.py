@@ -0,0 +1,25 @@
+# core/sql_utils.py
+"""
+Вспомогательные функции для построения SQL по импортированным таблицам.
+"""
+import hashlib
+
+# Ограничение PostgreSQL на длину идентификатора
+MAX_IDENTIFIER_LENGTH = 63
+
+# Служебный столбец импортированных таблиц — постоянный номер строки (общая
+# последовательность, миграция 0021). Заполняется при загрузке, не меняется
+# при VACUUM и UPDATE (в отличие от ctid); в поиске и выгрузках не показывается.
+ROW_ID_COLUMN = 'core_row_id'
+ROW_ID_COLUMN_SQL = f"\"{ROW_ID_COLUMN}\" BIGINT NOT NULL DEFAULT nextval('core_row_id_seq')"
+
+
+def short_identifier(name):
+    """
+    Укорачивает идентификатор до 63 символов, добавляя хэш,
+    чтобы длинные имена не совпадали после обрезки.
+    """
+    if len(name) <= MAX_IDENTIFIER_LENGTH:
+        return name
+    digest = hashlib.md5(name.encode('utf-8')).hexdigest()[:8]
+    return f"{name[:MAX_IDENTIFIER_LENGTH - 9]}_{digest}"
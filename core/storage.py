@@ -0,0 +1,16 @@
+# core/storage.py
+"""
+Хранилище статических файлов с хэшем содержимого в именах.
+"""
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+
+class StaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    ManifestStaticFilesStorage без переписывания ссылок sourceMappingURL:
+    в поставке bootstrap нет .map-файлов, и collectstatic падал бы на ссылках на них.
+    """
+    patterns = tuple(
+        (extension, tuple(pattern for pattern in extension_patterns if 'sourceMappingURL' not in str(pattern)))
+        for extension, extension_patterns in ManifestStaticFilesStorage.patterns
+    )
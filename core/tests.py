@@ -1,3 +1,273 @@
-from django.test import TestCase
+# core/tests.py
+"""
+Тесты движков, которым не нужна база: разбор DBF, запись DBF, удаление
+дубликатов, ключи поиска, HyperLogLog и условия WHERE.
 
-# Create your tests here.
+    python manage.py test core
+"""
+import io
+import os
+import random
+import struct
+import tempfile
+
+from django.test import SimpleTestCase, override_settings
+
+from .dbf_export import DBFWriter
+from .dbf_stream import END_OF_FILE, HEADER_TERMINATOR, DBFFormatError, DBFStreamParser
+from .dedup import MODE_COUNT, MODE_DROP, RowDeduplicator
+from .profiling import HyperLogLog
+from .query_builder import build_conditions
+from .search_keys import key_expression, like_pattern, normalize_search_value
+
+
+def make_dbf(fields, records, deleted=(), eof=True):
+    """
+    DBF из готовых текстов записей: fields — [(имя, тип, длина, знаков после запятой)],
+    records — строки без признака удаления; deleted — номера (с нуля) удалённых записей.
+    """
+    record_length = 1 + sum(length for _, _, length, _ in fields)
+    header_length = 32 + 32 * len(fields) + 1
+    parts = [struct.pack('<BBBBLHH20x', 0x03, 124, 1, 1, len(records), header_length, record_length)]
+    for name, field_type, length, decimal_count in fields:
+        if field_type == 'C':
+            length, decimal_count = length & 0xFF, length >> 8
+        parts.append(struct.pack('<11sc4xBB14x', name.encode('ascii'), field_type.encode('ascii'), length, decimal_count))
+    parts.append(bytes([HEADER_TERMINATOR]))
+    for index, record in enumerate(records):
+        flag = '*' if index in deleted else ' '
+        parts.append((flag + record).encode('cp866'))
+    if eof:
+        parts.append(bytes([END_OF_FILE]))
+    return b''.join(parts)
+
+
+def parse_in_chunks(data, sizes):
+    """
+    Разбор data кусками длиной из sizes (по кругу). Возвращает (парсер, записи).
+    """
+    parser = DBFStreamParser()
+    records = []
+    position = 0
+    index = 0
+    while position < len(data):
+        size = sizes[index % len(sizes)]
+        records += parser.feed(data[position:position + size])
+        position += size
+        index += 1
+    parser.close()
+    return parser, records
+
+
+PEOPLE_FIELDS = [('FAM', 'C', 10, 0), ('AGE', 'N', 3, 0), ('DR', 'D', 8, 0)]
+PEOPLE_RECORDS = [
+    'Иванов     3019900201',
+    'Петров     4119800101',
+    'Сидоров     7        ',
+    'Ёлкин      5520000229',
+]
+
+
+class DBFStreamParserTests(SimpleTestCase):
+    def test_chunk_boundaries_do_not_change_records(self):
+        data = make_dbf(PEOPLE_FIELDS, PEOPLE_RECORDS)
+        _, expected = parse_in_chunks(data, [len(data)])
+        self.assertEqual(expected, [
+            ('Иванов', 30, '1990-02-01'),
+            ('Петров', 41, '1980-01-01'),
+            ('Сидоров', 7, None),
+            ('Ёлкин', 55, '2000-02-29'),
+        ])
+        for sizes in ([1], [7], [31, 2, 64], [33, 1]):
+            with self.subTest(sizes=sizes):
+                parser, records = parse_in_chunks(data, sizes)
+                self.assertEqual(records, expected)
+                self.assertEqual(parser.field_types, {'FAM': 'VARCHAR(255)', 'AGE': 'INTEGER', 'DR': 'VARCHAR(255)'})
+
+    def test_data_after_eof_marker_is_ignored(self):
+        data = make_dbf(PEOPLE_FIELDS, PEOPLE_RECORDS[:2]) + b'garbage after end of file'
+        parser, records = parse_in_chunks(data, [5])
+        self.assertTrue(parser.finished)
+        self.assertEqual(len(records), 2)
+
+    def test_file_without_eof_marker(self):
+        parser, records = parse_in_chunks(make_dbf(PEOPLE_FIELDS, PEOPLE_RECORDS, eof=False), [10])
+        self.assertFalse(parser.finished)
+        self.assertEqual(len(records), 4)
+
+    def test_truncated_record_is_an_error(self):
+        data = make_dbf(PEOPLE_FIELDS, PEOPLE_RECORDS, eof=False)[:-5]
+        with self.assertRaisesMessage(DBFFormatError, 'последняя запись неполная'):
+            parse_in_chunks(data, [16])
+
+    def test_truncated_header_is_an_error(self):
+        with self.assertRaisesMessage(DBFFormatError, 'заголовок получен не полностью'):
+            parse_in_chunks(make_dbf(PEOPLE_FIELDS, [])[:40], [16])
+
+    def test_rejects_keep_record_numbers_in_file(self):
+        records = PEOPLE_RECORDS + [
+            'Кузнецов   2919901301', # Неверный месяц
+            'Орлов     1.519900101', # Дробное число в целом поле
+        ]
+        records[2:2] = ['Удалённый  10        ']
+        data = make_dbf(PEOPLE_FIELDS, records, deleted={2})
+        for sizes in ([len(data)], [3], [29]):
+            with self.subTest(sizes=sizes):
+                parser, parsed = parse_in_chunks(data, sizes)
+                self.assertEqual([record[0] for record in parsed], ['Иванов', 'Петров', 'Сидоров', 'Ёлкин'])
+                self.assertEqual([(number, reason.split(':')[0]) for number, reason, _ in parser.rejected], [(6, 'DR'), (7, 'AGE')])
+                self.assertTrue(parser.rejected[0][2].startswith('Кузнецов'))
+
+    def test_char_field_longer_than_255(self):
+        text = 'А' * 200 + 'Б' * 99 + 'В'
+        data = make_dbf([('NOTE', 'C', 300, 0), ('N', 'N', 2, 0)], [text + ' 1'])
+        parser, records = parse_in_chunks(data, [100])
+        self.assertEqual(parser.fields[0].length, 300)
+        self.assertEqual(parser.field_types['NOTE'], 'VARCHAR(300)')
+        self.assertEqual(records, [(text, 1)])
+
+
+class DBFRoundTripTests(SimpleTestCase):
+    FIELDS = [
+        {'name': 'FAM', 'type': 'C', 'length': 20, 'decimal_count': 0},
+        {'name': 'NOTE', 'type': 'C', 'length': 400, 'decimal_count': 0},
+        {'name': 'AGE', 'type': 'N', 'length': 3, 'decimal_count': 0},
+        {'name': 'SUMMA', 'type': 'N', 'length': 10, 'decimal_count': 2},
+        {'name': 'DR', 'type': 'D', 'length': 8, 'decimal_count': 0},
+        {'name': 'ALIVE', 'type': 'L', 'length': 1, 'decimal_count': 0},
+    ]
+
+    def test_written_file_reads_back(self):
+        rows = [
+            ('Иванов', 'Ё' * 400, 30, 1234.5, '1990-02-01', 'true'),
+            ('Петров', None, None, None, None, None),
+            ('Сидорова-Длиннофамильная', 'x', 999, -0.25, '2000-12-31', 'false'),
+        ]
+        fileobj = io.BytesIO()
+        writer = DBFWriter(fileobj, self.FIELDS, block_size=100)
+        writer.write_rows(rows[:1])
+        writer.write_rows(rows[1:])
+        writer.close()
+
+        parser, records = parse_in_chunks(fileobj.getvalue(), [7, 500])
+        self.assertEqual(parser.header.numrecords, 3)
+        self.assertEqual(parser.field_names, ['FAM', 'NOTE', 'AGE', 'SUMMA', 'DR', 'ALIVE'])
+        self.assertEqual(parser.field_types['NOTE'], 'VARCHAR(400)')
+        self.assertEqual(records, [
+            ('Иванов', 'Ё' * 400, 30, 1234.5, '1990-02-01', 'true'),
+            ('Петров', '', None, None, None, None),
+            ('Сидорова-Длиннофамил', 'x', 999, -0.25, '2000-12-31', 'false'),
+        ])
+        self.assertEqual(parser.rejected, [])
+
+
+@override_settings(INGEST_DEDUP_SPILL_DIR=tempfile.gettempdir())
+class RowDeduplicatorTests(SimpleTestCase):
+    FIELD_NAMES = ['FAM', 'IM', 'AGE']
+
+    def run_deduplicator(self, records, mode, keys=(), batch_size=3):
+        deduplicator = RowDeduplicator(self.FIELD_NAMES, mode, keys)
+        unique = []
+        for start in range(0, len(records), batch_size):
+            unique += deduplicator.filter(records[start:start + batch_size])
+        counts = {}
+        for batch in deduplicator.iter_repeat_counts():
+            counts.update(batch)
+        spill_path = deduplicator._spill_path
+        deduplicator.close()
+        return unique, deduplicator, counts, spill_path
+
+    def test_normalized_values_are_duplicates(self):
+        records = [('Иванов', 'Пётр', 30), ('  ИВАНОВ ', 'петр', 30.0), ('Иванов', 'Петр', 31)]
+        unique, deduplicator, _, _ = self.run_deduplicator(records, MODE_DROP)
+        self.assertEqual(unique, [records[0], records[2]])
+        self.assertEqual(deduplicator.duplicates, 1)
+
+    def test_key_fields(self):
+        records = [('Иванов', 'Пётр', 30), ('Иванов', 'Иван', 31)]
+        unique, _, _, _ = self.run_deduplicator(records, MODE_DROP, keys=['FAM'])
+        self.assertEqual(unique, records[:1])
+        with self.assertRaises(ValueError):
+            RowDeduplicator(self.FIELD_NAMES, MODE_DROP, ['XX'])
+
+    def test_count_mode_same_with_spill(self):
+        rng = random.Random(7)
+        records = [(f'Фамилия{rng.randint(0, 40)}', rng.choice(['А', 'Б']), 1) for _ in range(500)]
+        in_memory = self.run_deduplicator(records, MODE_COUNT, batch_size=17)
+        self.assertIsNone(in_memory[3])
+        with override_settings(INGEST_DEDUP_MEMORY_KEYS=5):
+            spilled = self.run_deduplicator(records, MODE_COUNT, batch_size=17)
+        self.assertIsNotNone(spilled[3])
+        self.assertFalse(os.path.exists(spilled[3])) # Файл удаляется в close()
+
+        self.assertEqual(spilled[0], in_memory[0])
+        self.assertEqual(spilled[1].duplicates, in_memory[1].duplicates)
+        self.assertEqual(spilled[2], in_memory[2])
+        # Первая запись каждой группы — с числом 1 и хэшем; повторы — в счётчиках
+        self.assertTrue(all(record[-2] == 1 for record in in_memory[0]))
+        self.assertEqual(len(in_memory[0]) + sum(in_memory[2].values()), len(records))
+
+
+class SearchKeysTests(SimpleTestCase):
+    def test_normalize_search_value(self):
+        self.assertEqual(normalize_search_value('  Ёлкин   Пётр\t'), 'елкин петр')
+        self.assertEqual(normalize_search_value('ЕЛКИН'), 'елкин')
+
+    def test_like_pattern(self):
+        cases = [
+            ('Иванов', 'иванов%'),
+            ('  Ёлкин ', 'елкин%'),
+            ('ив*ов', 'ив%ов%'),
+            ('*ванов', '%ванов%'),
+            ('иванов*', 'иванов%'),
+            ('50%', '50\\%%'),
+            ('a_b', 'a\\_b%'),
+            ('c:\\', 'c:\\\\%'),
+        ]
+        for value, pattern in cases:
+            with self.subTest(value=value):
+                self.assertEqual(like_pattern(value), pattern)
+
+
+class HyperLogLogTests(SimpleTestCase):
+    def test_error_bounds(self):
+        # Погрешность при p=12 около 1.6%; проверяем с запасом в три раза
+        for n in (10, 1000, 50000):
+            with self.subTest(n=n):
+                hll = HyperLogLog()
+                for i in range(n):
+                    hll.add(f'значение {i}')
+                    hll.add(f'значение {i}') # Повторы не увеличивают оценку
+                self.assertLess(abs(hll.count() - n), max(1, n * 0.05))
+
+    def test_integers(self):
+        hll = HyperLogLog()
+        for i in range(20000):
+            hll.add(i)
+        self.assertLess(abs(hll.count() - 20000), 20000 * 0.05)
+
+
+class BuildConditionsTests(SimpleTestCase):
+    def test_field_kinds(self):
+        where_parts, params = build_conditions(
+            {'FAM': 'Иванов', 'NOTE': 'текст', 'YR': ' 2023 ', 'EMPTY': ''},
+            key_fields={'FAM'}, exact_fields={'YR'},
+        )
+        self.assertEqual(where_parts, [f'{key_expression("FAM")} LIKE %s', '"NOTE" ILIKE %s', '"YR" = %s'])
+        self.assertEqual(params, ['иванов%', '%текст%', '2023'])
+
+    def test_projection_key_column(self):
+        projection = {'name': 'proj_people', 'columns': {'FAM', 'FAM__key'}, 'result_fields': []}
+        where_parts, params = build_conditions({'FAM': 'Пётр*'}, {'FAM'}, projection)
+        self.assertEqual(where_parts, ['"FAM__key" LIKE %s'])
+        self.assertEqual(params, ['петр%'])
+
+    def test_facet_values_are_exact(self):
+        where_parts, params = build_conditions({}, set(), facet_values={'CITY': 'Москва', 'ST': '10'})
+        self.assertEqual(where_parts, ['"CITY" = %s', '"ST" = %s'])
+        self.assertEqual(params, ['Москва', '10'])
+
+    def test_value_outside_cp866_is_skipped(self):
+        where_parts, params = build_conditions({'FAM': 'Ivanov€', 'IM': 'Пётр'}, {'FAM', 'IM'})
+        self.assertEqual(where_parts, [f'{key_expression("IM")} LIKE %s'])
+        self.assertEqual(params, ['петр%'])
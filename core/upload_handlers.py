@@ -0,0 +1,97 @@
+# core/upload_handlers.py
+"""
+Обработчик загрузки DBF из формы upload_dbf: части файла разбираются
+и уходят в базу (ingest.DBFStreamLoad), пока тело запроса ещё принимается.
+Временный файл не создаётся, и загрузка в базу заканчивается почти
+одновременно с передачей файла.
+
+Подключается в представлении до разбора тела запроса:
+    request.upload_handlers.insert(0, StreamingDBFUploadHandler(request))
+Остальные поля и файлы формы обрабатываются стандартными обработчиками.
+
+Параметры, которые нужны до приёма файла (удаление дубликатов: dedup,
+dedup_keys; общая таблица секции: partition_table), берутся из строки
+запроса — поля формы обработчику ещё не видны.
+
+Таблица загрузки (partition_table или имя файла) блокируется
+(ingest.table_lock) до приёма файла и до конца запроса: вторая загрузка
+той же таблицы сразу получает отказ (IngestBusy, 409), не передавая файл.
+"""
+from contextlib import ExitStack
+
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopFutureHandlers
+
+from . import ingest
+
+
+class StreamedDBFFile(UploadedFile):
+    """
+    DBF из формы, уже загруженный в промежуточную таблицу (load). Содержимого
+    файла нет; ошибка загрузки — в load.error.
+    """
+    def __init__(self, load, name, content_type, size, charset, content_type_extra=None):
+        super().__init__(None, name, content_type, size, charset, content_type_extra)
+        self.load = load
+
+
+class StreamingDBFUploadHandler(FileUploadHandler):
+    def __init__(self, request=None, field_name='dbf_file'):
+        super().__init__(request)
+        self.dbf_field_name = field_name
+        self.load = None
+        # Все начатые загрузки — чтобы удалить промежуточные таблицы, если запрос не дошёл до publish_dbf
+        self.loads = []
+        # Блокировки таблиц загрузок — до discard() (конец запроса)
+        self.locks = ExitStack()
+
+    def new_file(self, field_name, file_name, *args, **kwargs):
+        super().new_file(field_name, file_name, *args, **kwargs)
+        self.load = None
+        if field_name != self.dbf_field_name or not file_name.lower().endswith(ingest.DBF_EXTENSIONS):
+            return
+        try:
+            dedup_mode, dedup_keys = ingest.resolve_dedup_options(
+                self.request.GET.get('dedup', ''), self.request.GET.get('dedup_keys', ''),
+            )
+        except ingest.IngestError:
+            dedup_mode, dedup_keys = '', [] # Неверные параметры отклонит представление
+        self.load = ingest.DBFStreamLoad(file_name, dedup_mode, dedup_keys)
+        self.loads.append(self.load)
+        try:
+            target = self.request.GET.get('partition_table', '').strip() or ingest.table_name_from_filename(file_name)
+            self.locks.enter_context(ingest.table_lock(target, wait=False))
+        except ingest.IngestError as e:
+            # Таблица занята (или имя неверное): файл только вычитывается, в базу ничего не пишется
+            self.load.error = e
+        # Этот файл не нужно сохранять во временный файл или в память
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.load is None:
+            return raw_data
+        self.load.feed(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if self.load is None:
+            return None
+        load, self.load = self.load, None
+        try:
+            load.finish()
+        except Exception as e:
+            # Ошибка остаётся в load.error — её покажет представление
+            print(f"Warning: streaming DBF load of {self.file_name} failed: {e}")
+        return StreamedDBFFile(load, self.file_name, self.content_type, file_size, self.charset, self.content_type_extra)
+
+    def discard(self):
+        """
+        Удаляет промежуточные таблицы загрузок, которые не стали таблицами,
+        и снимает блокировки таблиц.
+        """
+        try:
+            for load in self.loads:
+                if not load.published:
+                    load.discard()
+        finally:
+            self.locks.close()
@@ -9,8 +9,19 @@ urlpatterns = [
     path('upload_dbf/', views.upload_dbf, name='upload_dbf'), # Новый путь
     path('upload_dbf/', views.upload_dbf, name='upload_dbf'), # <-- Это должно быть
     path('upload_excel/', views.upload_excel, name='upload_excel'), # <-- Это должно быть
+    path('upload/chunked/', views.chunked_upload_init, name='chunked_upload_init'), # Загрузка больших файлов по частям
+    path('upload/chunked/<uuid:upload_id>/', views.chunked_upload_detail, name='chunked_upload_detail'),
+    path('upload/chunked/<uuid:upload_id>/complete/', views.chunked_upload_complete, name='chunked_upload_complete'),
     path('get_table_columns/', views.get_table_columns, name='get_table_columns'), # <-- Это должно быть
     path('download_search_template/', views.download_search_template, name='download_search_template'), # <-- Это должно быть
+    path('autocomplete/', views.autocomplete, name='autocomplete'), # Подсказки для полей поиска
+    path('federated/', views.federated_search, name='federated_search'), # Поиск по всем таблицам
+    path('linked/', views.linked_records, name='linked_records'), # Связанные записи в разных таблицах
+    path('saved/', views.saved_search_list, name='saved_search_list'), # Сохранённые поиски
+    path('saved/save/', views.saved_search_save, name='saved_search_save'),
+    path('saved/<int:pk>/', views.saved_search_open, name='saved_search_open'),
+    path('saved/<int:pk>/delete/', views.saved_search_delete, name='saved_search_delete'),
+    path('search/dbf/', views.download_search_dbf, name='download_search_dbf'), # Результаты поиска файлом DBF
     path('manage_table_template/', views.manage_table_template, name='manage_table_template'), # <-- Новый маршрут
     path('manage_table_template/<str:table_name>/', views.manage_table_template, name='manage_table_template_with_table'), # <-- Для редиректа
     # Убедитесь, что другие маршруты также правильно названы
@@ -1,21 +1,24 @@
 # core/views.py
-from django.shortcuts import render, redirect
+from django.shortcuts import get_object_or_404, render, redirect
+from django.conf import settings
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
-from django.db import connection
+from django.db import DatabaseError
 from django.contrib import messages
-import dbfread
-import tempfile
 import os
-import re # Для проверки имени таблицы
-import pandas as pd # Используем pandas для удобного чтения Excel
-from django.http import JsonResponse, HttpResponse
-import io
-from openpyxl import Workbook
-from openpyxl.utils import get_column_letter
-from psycopg2 import sql
-from .models import DBFUpload, ExcelUpload, TableTemplate, TableTemplateFieldConfig # Импортируем новую модель
+import tempfile
+from django.http import FileResponse, JsonResponse, HttpResponse, QueryDict
+from django.urls import reverse
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from .models import SavedSearch, TableTemplate, TableTemplateFieldConfig # Импортируем новую модель
+from . import autocomplete as autocomplete_engine
+from . import catalog, chunked_uploads, dbf_export, entity_links, facets, federated, governor, ingest, profiling, saved_searches, search_keys, workbooks
+from .search_query import SearchQuery
+from .signals import template_changed
+from .upload_handlers import StreamingDBFUploadHandler
 
 # Вспомогательная функция для проверки, является ли пользователь суперпользователем
 def is_superuser(user):
@@ -29,266 +32,337 @@ def can_search(user):
 @login_required # Пользователь должен быть аутентифицирован
 @user_passes_test(can_search) # Пользователь должен пройти проверку can_search
 def search(request):
-    results = []
+    """
+    Страница поиска — лёгкая «оболочка» (выбор таблицы, форма, статистика).
+    Результаты запрашиваются той же страницей с параметром format=json
+    и отрисовываются в браузере виртуализированной таблицей: в HTML нет
+    строк результата, а сервер не рендерит их шаблоном ячейка за ячейкой.
+    """
+    columns = []
+    rows = []
+    facet_blocks = []
     available_tables = []
+    search_error = None
+    status = 200
+    searched = False
 
-    # --- Получаем список таблиц ---
-    with connection.cursor() as cursor:
-        cursor.execute("""
-            SELECT tablename
-            FROM pg_tables
-            WHERE schemaname = 'public'
-              AND tablename NOT LIKE 'pg_%'
-              AND tablename NOT LIKE 'sql_%'
-              AND tablename NOT LIKE 'django_%'
-              AND tablename NOT LIKE 'auth_%'
-              AND tablename NOT LIKE 'contenttype_%'
-              AND tablename NOT LIKE 'core_%'; -- <-- Исключаем таблицы core
-        """)
-        all_tables = [row[0] for row in cursor.fetchall()]
-        available_tables = all_tables
+    # --- Получаем список таблиц (из кэшируемого каталога; секции не показываются) ---
+    available_tables = catalog.get_available_tables()
 
     # --- Выбираем таблицу для поиска ---
     # ПЕРЕМЕННАЯ ОБЯЗАТЕЛЬНО ОБЪЯВЛЯЕТСЯ ЗДЕСЬ
     table_to_search = request.GET.get('table', '')
 
+    if request.GET.get('format') != 'json':
+        # Параметры поиска (для запроса результатов и кнопки «Сохранить поиск»), если что-то введено
+        search_query = ''
+        if any(value for key, value in request.GET.items() if key not in ('table', 'result_fields')):
+            search_query = request.GET.urlencode()
+        return render(request, 'core/search.html', {
+            'available_tables': available_tables,
+            'catalog_version': catalog.catalog_version(),
+            'selected_table': table_to_search, # <-- Теперь переменная всегда определена
+            'table_stats': profiling.get_latest_stats(table_to_search if table_to_search in available_tables else None),
+            'search_query': search_query,
+            'fragment_cache_timeout': settings.CATALOG_CACHE_TIMEOUT,
+        })
+
     # Проверяем, что выбранная таблица существует в списке
     if table_to_search and table_to_search in available_tables:
         print(f"DEBUG: search view - Processing table: {table_to_search}") # <-- Отладка
-        # --- Получаем все столбцы таблицы для формирования условий ---
-        with connection.cursor() as cursor:
-            # ИСПОЛЬЗУЕМ обычную строку с параметром
-            query = "SELECT column_name FROM information_schema.columns WHERE table_name = %s ORDER BY ordinal_position;"
-            print(f"DEBUG: search view - Executing query for table: {table_to_search}") # <-- Отладка
-            cursor.execute(query, [table_to_search])
-            all_columns = [row[0] for row in cursor.fetchall()]
-            print(f"DEBUG: search view - Fetched columns: {all_columns}") # <-- Отладка
-
-        # --- Собираем значения из формы (GET параметров) для *всех возможных* столбцов ---
-        # и только для тех, которые были отправлены
-        search_values = {}
-        for field_name in all_columns:
-            value = request.GET.get(field_name, '')
-            if value: # Только если значение введено
-                search_values[field_name] = value
-
-        print(f"DEBUG search_values: {search_values}") # <-- Отладка
-
-        # --- Собираем поля для вывода ---
-        # Получаем список полей из параметра result_fields
-        result_fields = request.GET.getlist('result_fields') # Используем getlist для множественных значений
-        # Если не выбраны, выводим все
-        if not result_fields:
-            result_fields = all_columns
-
-        # Проверяем, что выбранные поля вывода существуют в таблице
-        result_fields = [f for f in result_fields if f in all_columns]
-
-        print(f"DEBUG result_fields: {result_fields}") # <-- Отладка
-
-        # Формируем условия WHERE и параметры для SQL, только для заполненных полей
-        where_parts = []
-        params = []
-        for field_name, search_value in search_values.items():
-            if search_value: # Только если значение введено
-                # ПРЕОБРАЗУЕМ поисковое значение ИЗ UTF-8 В CP866 (если база в cp866)
-                try:
-                    search_value_cp866 = search_value.encode('cp866').decode('cp866')
-                    # Используем ILIKE для поиска части строки (регистронезависимо)
-                    # Экранируем имя столбца с помощью двойных кавычек
-                    # %s - плейсхолдер для psycopg2
-                    where_parts.append(f'"{field_name}" ILIKE %s')
-                    # Добавляем значение (уже в cp866) с подстановочными знаками % для поиска части строки
-                    params.append(f'%{search_value_cp866}%')
-                except UnicodeEncodeError:
-                    # Обработка ошибки, если строку нельзя закодировать в cp866
-                    print(f"Warning: Could not encode search value '{search_value}' to cp866 for field '{field_name}'. Skipping this field.")
-                    continue # Пропускаем это поле в поиске
-
-        print(f"DEBUG where_parts: {where_parts}") # <-- Отладка
-        print(f"DEBUG params: {params}")           # <-- Отладка
+        # Поля поиска и вывода, источник (таблица или проекция) и условия — core/search_query.py
+        query = SearchQuery.from_params(table_to_search, request.GET)
+        print(f"DEBUG search_values: {query.filters}") # <-- Отладка
+        print(f"DEBUG result_fields: {query.result_fields}") # <-- Отладка
 
         # Выполняем поиск, если есть условия (хотя бы одно поле заполнено и закодировалось)
-        if where_parts:
-            # Составляем SQL-запрос
-            # SELECT - выбираем *только* выбранные поля результата (экранируем имена)
-            # WHERE - условия, объединённые через AND, только для заполненных и закодированных полей
-            select_cols = ', '.join([f'"{col}"' for col in result_fields])
-            where_clause = ' AND '.join(where_parts)
-            # Экранируем имя таблицы
-            sql_query = f'SELECT {select_cols} FROM "{table_to_search}" WHERE {where_clause};'
-
-            print(f"DEBUG SQL Query: {sql_query}") # <-- Отладка: выводим SQL
-
-            with connection.cursor() as cursor:
-                # Устанавливаем client_encoding для текущей сессии, если данные в базе в cp866
-                cursor.execute("SET client_encoding = 'WIN866';") # Или 'cp866'
-                cursor.execute(sql_query, params)
-                rows = cursor.fetchall()
-                columns = [col[0] for col in cursor.description]
-                results = [dict(zip(columns, row)) for row in rows]
+        if not query.is_empty:
+            searched = True
+            try:
+                # Реплика, тайм-аут по роли, очередь для тяжёлых поисков, отмена при уходе пользователя
+                result = query.execute(request)
+            except governor.SearchRejected as e:
+                print(f"Warning: search in {table_to_search} rejected: {e}")
+                search_error = str(e)
+                status = e.status
+            else:
+                columns = result['columns']
+                rows = result['rows']
+                for field_name, field_label in result['facet_fields']:
+                    values = []
+                    for value, count in result['facet_counts'][field_name]:
+                        # Ссылка «сузить поиск»: текущие параметры + значение фасета (для пустых значений ссылки нет)
+                        facet_query = None
+                        if value is not None:
+                            facet_query = request.GET.copy()
+                            facet_query.pop('format', None)
+                            # Отдельный параметр: значение сравнивается точно, а не как текст поиска
+                            facet_query[f'{facets.FACET_PARAM_PREFIX}{field_name}'] = value
+                            facet_query = facet_query.urlencode()
+                        values.append({'value': value, 'count': count, 'query': facet_query})
+                    facet_blocks.append({'field': field_name, 'label': field_label, 'values': values})
         else:
             print("DEBUG: No conditions for WHERE clause, skipping query execution.")
             pass # Если не заполнены поля или закодировать не удалось, возвращаем пустой результат
-    # else: # Необязательно, но логично
-    #     table_to_search = None # Уже равно '', но можно явно указать
 
-    # --- Передаём данные в шаблон ---
-    # Передаём значения формы для отображения (теперь динамически)
-    # search_form_values = {field: request.GET.get(field, '') for field in ['P2', 'ST2', 'DNR']} # <-- Больше не нужно
+    # --- Результаты: столбцы и строки списками (без повторения имён полей в каждой строке) ---
+    return JsonResponse({
+        'columns': columns,
+        'rows': rows,
+        'facets': facet_blocks,
+        'error': search_error,
+        'searched': searched,
+    }, status=status, json_dumps_params={'ensure_ascii': False, 'separators': (',', ':')}) # Кириллица без \uXXXX — ответ втрое меньше
 
-    return render(request, 'core/search.html', {
-        'results': results,
-        'available_tables': available_tables,
-        'selected_table': table_to_search, # <-- Теперь переменная всегда определена
-        # 'search_values': search_form_values, # <-- Больше не нужно
+@login_required
+@user_passes_test(can_search)
+def federated_search(request):
+    """
+    Поиск по всем таблицам сразу: общие критерии (роли полей шаблонов),
+    результаты сводятся в одну таблицу с именем таблицы-источника.
+    """
+    roles = TableTemplateFieldConfig.ROLE_CHOICES
+    criteria = {role: request.GET.get(role, '') for role, _ in roles}
+    search_error = None
+    status = 200
+    try:
+        # Поиск по всем таблицам считается тяжёлым — занимает место в очереди
+        with governor.admit(request.user, heavy=any(value.strip() for value in criteria.values())):
+            table_results = federated.federated_search(criteria)
+    except governor.SearchRejected as e:
+        search_error = str(e)
+        status = e.status
+        table_results = []
+
+    # Столбцы сводной таблицы — роли, которые есть хотя бы в одном результате
+    shown_roles = {role for outcome in table_results for row in outcome['rows'] for role in row}
+    columns = [(role, label) for role, label in roles if role in shown_roles]
+    rows = [
+        {
+            'table': outcome['table'],
+            'search_query': outcome['search_query'],
+            'values': [row.get(role) for role, _ in columns],
+            # Ссылка на связанные записи в других таблицах по значениям строки
+            'links_query': entity_links.link_query(row),
+        }
+        for outcome in table_results
+        for row in outcome['rows']
+    ]
+
+    return render(request, 'core/federated_search.html', {
+        'roles': [(role, label, criteria[role]) for role, label in roles],
+        'searched': any(value.strip() for value in criteria.values()),
+        'table_results': table_results,
+        'columns': columns,
+        'rows': rows,
+        'search_error': search_error,
+    }, status=status)
+
+@login_required
+@user_passes_test(can_search)
+def linked_records(request):
+    """
+    Связанные записи: строки всех таблиц с тем же человеком (фамилия, имя и дата
+    рождения или документ — по ролям полей шаблонов), найденные по индексу связей.
+    """
+    role_labels = dict(TableTemplateFieldConfig.ROLE_CHOICES)
+    criteria = {role: request.GET.get(role, '') for role in entity_links.LINK_ROLES}
+    outcome = entity_links.find_linked(criteria)
+    return render(request, 'core/linked_records.html', {
+        'roles': [(role, role_labels[role], criteria[role]) for role in entity_links.LINK_ROLES],
+        'searched': any(value.strip() for value in criteria.values()),
+        'key_labels': list(entity_links.KEY_LABELS.values()),
+        'outcome': outcome,
     })
 
+@login_required
+@user_passes_test(can_search)
+def saved_search_list(request):
+    """
+    Сохранённые поиски пользователя.
+    """
+    items = [
+        {'search': saved_search, 'fresh': saved_searches.is_fresh(saved_search)}
+        for saved_search in SavedSearch.objects.filter(user=request.user)
+    ]
+    return render(request, 'core/saved_searches.html', {'items': items})
+
+
+@login_required
+@user_passes_test(can_search)
+def saved_search_save(request):
+    """
+    Сохраняет текущий поиск (параметры страницы поиска) под именем.
+    Поиск с тем же именем перезаписывается, его снимок строится заново.
+    """
+    if request.method != 'POST':
+        return redirect('core:saved_search_list')
+
+    name = request.POST.get('name', '').strip()
+    query = QueryDict(request.POST.get('query', ''))
+    table_name = query.get('table', '')
+    if not name or table_name not in catalog.get_available_tables():
+        messages.error(request, 'Укажите имя поиска и выберите таблицу.')
+        return redirect('core:saved_search_list')
+
+    # Поля поиска и вывода — как в search
+    search = SearchQuery.from_params(table_name, query)
+    if not search.filters:
+        messages.error(request, 'Заполните хотя бы одно поле поиска.')
+        return redirect('core:saved_search_list')
+
+    SavedSearch.objects.update_or_create(
+        user=request.user, name=name,
+        defaults={
+            'table_name': table_name,
+            'filters': search.filters,
+            'result_fields': search.result_fields,
+            'snapshot_generation': None,
+        },
+    )
+    messages.success(request, f'Поиск "{name}" сохранён. Результаты будут подготовлены при ближайшем обновлении.')
+    return redirect('core:saved_search_list')
+
+
+@login_required
+@user_passes_test(can_search)
+def saved_search_open(request, pk):
+    """
+    Результаты сохранённого поиска из снимка. Если снимок устарел
+    (таблица перезагружена) или ещё не построен — обычный поиск.
+    """
+    saved_search = get_object_or_404(SavedSearch, pk=pk, user=request.user)
+    if saved_searches.is_fresh(saved_search):
+        try:
+            results = saved_searches.read_snapshot(saved_search)
+        except DatabaseError as e:
+            # Снимок ещё не дошёл до реплики или удалён вручную
+            print(f"Warning: could not read snapshot of saved search {pk}: {e}")
+        else:
+            return render(request, 'core/saved_search.html', {
+                'saved_search': saved_search,
+                'results': results,
+                'search_query': saved_searches.search_query(saved_search),
+            })
+    return redirect(f"{reverse('core:search')}?{saved_searches.search_query(saved_search)}")
+
+
+@login_required
+@user_passes_test(can_search)
+def saved_search_delete(request, pk):
+    if request.method == 'POST':
+        saved_search = get_object_or_404(SavedSearch, pk=pk, user=request.user)
+        saved_search.delete() # Снимок удаляется обработчиком post_delete
+        messages.success(request, f'Поиск "{saved_search.name}" удалён.')
+    return redirect('core:saved_search_list')
+
+
+@login_required
+@user_passes_test(can_search)
+def download_search_dbf(request):
+    """
+    Результаты поиска (те же параметры, что у страницы поиска) файлом DBF.
+    Файл собирается во временном файле (число записей пишется в заголовок в конце)
+    и отдаётся по частям.
+    """
+    table_name = request.GET.get('table', '')
+    if table_name not in catalog.get_available_tables():
+        return HttpResponse('Таблица не найдена.', status=404)
+
+    dbf_file = tempfile.TemporaryFile()
+    try:
+        dbf_export.export_search(SearchQuery.from_params(table_name, request.GET), dbf_file)
+    except dbf_export.DBFExportError as e:
+        dbf_file.close()
+        return HttpResponse(str(e), status=400)
+    except Exception:
+        dbf_file.close()
+        raise
+    dbf_file.seek(0)
+    return FileResponse(dbf_file, as_attachment=True, filename=f'{table_name}.dbf', content_type='application/x-dbf')
+
 # ... (остальные функции) ...
 
+def _report_rejects(request, rejected):
+    if rejected:
+        messages.warning(
+            request,
+            f'Пропущено записей с ошибками: {rejected}. Номера записей и причины — '
+            f'в администрировании, раздел «Отклонённые записи».',
+        )
+
+def _render_upload_dbf(request, error=None, status=200):
+    return render(request, 'core/upload_dbf.html', {
+        'error': error,
+        # Файлы больше порога форма отправляет по частям (static/js/chunked_upload.js)
+        'chunked_upload_threshold': settings.CHUNKED_UPLOAD_THRESHOLD,
+    }, status=status)
+
+
 @login_required
 @user_passes_test(is_superuser) # Только суперпользователи
+@csrf_exempt # Обработчик загрузки подключается до разбора тела запроса, CSRF проверяется в _upload_dbf
 def upload_dbf(request):
+    # DBF загружается в базу, пока файл ещё передаётся (core/upload_handlers.py)
+    handler = StreamingDBFUploadHandler(request)
+    request.upload_handlers.insert(0, handler)
+    try:
+        return _upload_dbf(request)
+    finally:
+        handler.discard() # Промежуточные таблицы, не ставшие таблицами (ошибка, неверные параметры)
+
+
+@csrf_protect
+def _upload_dbf(request):
     if request.method == 'POST' and request.FILES.get('dbf_file'):
         uploaded_file = request.FILES['dbf_file']
         filename = uploaded_file.name
 
         # Проверка расширения
-        if not filename.lower().endswith('.dbf'):
+        if not filename.lower().endswith(ingest.DBF_EXTENSIONS):
             # Обработка ошибки: неверный формат файла
-            return render(request, 'core/upload_dbf.html', {'error': 'Файл должен быть в формате .dbf'})
-
-        # Получаем имя таблицы из имени файла (без расширения)
-        table_name = os.path.splitext(filename)[0]
-        print(f"DEBUG: Original filename: {filename}, Derived table_name: {table_name}") # <-- Отладка
-
-        # Проверка имени таблицы на безопасность (только буквы, цифры, подчеркивания)
-        if not re.match(r'^[a-zA-Z_][a-zA-Z0-9_]*$', table_name):
-             return render(request, 'core/upload_dbf.html', {'error': 'Имя файла содержит недопустимые символы для имени таблицы.'})
+            return _render_upload_dbf(request, 'Файл должен быть в формате .dbf')
 
+        # Загрузка секции в общую секционированную таблицу (необязательно)
+        partition_table = request.POST.get('partition_table', '').strip()
         try:
-            # Создаем временный файл
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.dbf') as temp_file:
-                for chunk in uploaded_file.chunks():
-                    temp_file.write(chunk)
-                temp_file_path = temp_file.name
-
-            # Читаем DBF-файл с кодировкой cp866 (DOS)
-            table = dbfread.DBF(temp_file_path, encoding='cp866')
-            records = list(table)
-
-            if not records:
-                os.unlink(temp_file_path)
-                return render(request, 'core/upload_dbf.html', {'error': 'Файл DBF пуст.'})
-
-            # Получаем имена полей из DBF
-            field_names = list(records[0].keys())
-
-            # --- Определение максимальных длин строковых полей по ВСЕМ записям и определение типов ---
-            max_lengths = {}
-            type_hints = {} # Словарь для хранения признака, что поле содержит числа (пока грубо)
-
-            for record in records:
-                for field_name, value in record.items():
-                    # Определяем тип значения в Python
-                    val_type = type(value)
-                    str_val = str(value) if value is not None else ""
-
-                    # Обновляем максимальную длину для строк, независимо от "типа" в DBF
-                    # Если значение - строка или None, проверяем его длину
-                    if isinstance(value, str) or value is None:
-                         current_len = len(str_val)
-                         if field_name not in max_lengths or current_len > max_lengths[field_name]:
-                             max_lengths[field_name] = current_len
-                    # Если значение - число, запоминаем это (грубо)
-                    elif isinstance(value, (int, float)):
-                         # Пока просто отметим, что в этом поле был числовой тип
-                         # Это не идеально, но помогает в грубой классификации
-                         if field_name not in type_hints:
-                             type_hints[field_name] = set()
-                         type_hints[field_name].add(val_type.__name__)
-
-            # --- Определение типов полей для SQL ---
-            field_types = {}
-            for field_name in field_names:
-                 # Берём значение из первой записи для грубой типизации
-                 first_val = records[0][field_name]
-                 first_val_type = type(first_val)
-
-                 # Проверяем, было ли в этом поле числовое значение (грубо)
-                 was_numeric = type_hints.get(field_name, set()).intersection({'int', 'float'})
-
-                 # Если первое значение - число (int/float) и в других записях тоже были числа
-                 if isinstance(first_val, (int, float)) and was_numeric:
-                     if isinstance(first_val, int):
-                         field_types[field_name] = 'INTEGER'
-                     else: # float
-                         field_types[field_name] = 'NUMERIC'
-                 else:
-                     # Для всех остальных случаев (включая строки, None, и числа, которые не числа в других записях)
-                     # Используем строковый тип с максимальной длиной
-                     max_len_for_field = max_lengths.get(field_name, 0)
-                     final_length = max(255, max_len_for_field) # Минимум 255
-                     field_types[field_name] = f'VARCHAR({final_length})'
-
-            # print(f"DEBUG: field_types = {field_types}") # Для отладки
-            # print(f"DEBUG: max_lengths = {max_lengths}") # Для отладки
-            # print(f"DEBUG: type_hints = {type_hints}") # Для отладки
-            # Удаляем временный файл
-            os.unlink(temp_file_path)
-
-            # Создаем таблицу в PostgreSQL
-            with connection.cursor() as cursor:
-                # --- УДАЛЯЕМ ТАБЛИЦУ, ЕСЛИ ОНА СУЩЕСТВУЕТ ---
-                drop_sql = f"DROP TABLE IF EXISTS \"{table_name}\";"
-                cursor.execute(drop_sql)
-                # ---
-
-                # Составляем SQL для создания таблицы
-                create_sql_parts = []
-                for field_name, field_type in field_types.items():
-                    # Экранируем имя поля, на случай если оно совпадает с ключевым словом
-                    escaped_field_name = f'"{field_name}"'
-                    create_sql_parts.append(f"{escaped_field_name} {field_type}")
-
-                create_sql = f"CREATE TABLE \"{table_name}\" ({', '.join(create_sql_parts)});"
-                cursor.execute(create_sql)
-
-                # Составляем SQL для вставки данных
-                if records:
-                    # Подготавливаем столбцы
-                    columns = ', '.join([f'"{name}"' for name in field_names])
-                    # Подготавливаем плейсхолдеры для значений
-                    placeholders = ', '.join(['%s'] * len(field_names))
-                    insert_sql = f"INSERT INTO \"{table_name}\" ({columns}) VALUES ({placeholders});"
-
-                    # Подготавливаем данные для вставки
-                    data_to_insert = []
-                    for record in records:
-                        row_data = [record[field_name] for field_name in field_names]
-                        data_to_insert.append(tuple(row_data))
-
-                    # Выполняем вставку
-                    cursor.executemany(insert_sql, data_to_insert)
-
-            # Сохраняем запись о загрузке (если используем модель)
-            # DBFUpload.objects.create(
-            #     filename=filename,
-            #     table_name=table_name,
-            #     uploaded_by=request.user
-            # )
+            # Имя таблицы — из имени файла (без расширения), только буквы, цифры, подчеркивания
+            table_name = ingest.table_name_from_filename(filename)
+            print(f"DEBUG: Original filename: {filename}, Derived table_name: {table_name}") # <-- Отладка
+            partition_column = ingest.resolve_partition_target(
+                table_name, partition_table, request.POST.get('partition_column', '').strip(),
+            )
+            # Удаление дубликатов нужно до приёма файла — параметры приходят в строке запроса (см. StreamingDBFUploadHandler)
+            dedup_mode, _ = ingest.resolve_dedup_options(request.GET.get('dedup', ''), request.GET.get('dedup_keys', ''))
+            if request.POST.get('dedup', '') != dedup_mode:
+                raise ingest.IngestError('Параметры удаления дубликатов не переданы — обновите страницу и повторите загрузку.')
+            # Таблицу обработчик заблокировал по строке запроса — она должна совпадать с формой
+            if request.GET.get('partition_table', '').strip() != partition_table:
+                raise ingest.IngestError('Параметры секции не переданы — обновите страницу и повторите загрузку.')
+        except ingest.IngestError as e:
+            return _render_upload_dbf(request, str(e))
 
+        try:
+            # Записи уже в промежуточной таблице — остаётся сделать её таблицей или секцией
+            load = uploaded_file.load
+            if load.error is not None:
+                raise load.error
+            _, _, duplicates, rejected = ingest.publish_dbf(load, filename, request.user, partition_table, partition_column)
+            if dedup_mode:
+                messages.info(request, f'Удалено дубликатов: {duplicates}.')
+            _report_rejects(request, rejected)
             # Успешно
             return redirect('core:search') # Перенаправляем на страницу поиска или другую
-
+        except ingest.IngestBusy as e:
+            # Таблица загружается другим пользователем (409) или нет свободного места загрузки (503)
+            return _render_upload_dbf(request, str(e), status=e.status)
+        except ingest.IngestError as e:
+            return _render_upload_dbf(request, str(e))
         except Exception as e:
-            # Удаляем временный файл в случае ошибки
-            if 'temp_file_path' in locals() and os.path.exists(temp_file_path):
-                os.unlink(temp_file_path)
             # Обработка ошибки
-            return render(request, 'core/upload_dbf.html', {'error': f'Ошибка обработки файла: {str(e)}'})
+            return _render_upload_dbf(request, f'Ошибка обработки файла: {str(e)}')
 
-    return render(request, 'core/upload_dbf.html')
+    return _render_upload_dbf(request)
 
 # --- НОВАЯ ФУНКЦИЯ ДЛЯ ЗАГРУЗКИ EXCEL ---
 @login_required
@@ -300,102 +374,17 @@ def upload_excel(request):
         filename = excel_file.name
         print(f"DEBUG: Received file: {filename}") # <-- Отладка
 
-        if not filename.lower().endswith(('.xlsx', '.xls')):
+        if not filename.lower().endswith(ingest.EXCEL_EXTENSIONS):
             messages.error(request, 'Пожалуйста, загрузите файл Excel (.xlsx или .xls).')
             return redirect('core:upload_excel')
 
-        # Получаем имя таблицы из имени файла (без расширения)
-        table_name = os.path.splitext(filename)[0]
-        print(f"DEBUG: Derived table_name: {table_name}") # <-- Отладка
-
-        # Проверка имени таблицы на безопасность (только буквы, цифры, подчеркивания)
-        if not re.match(r'^[a-zA-Z_][a-zA-Z0-9_]*$', table_name):
-             messages.error(request, 'Имя файла содержит недопустимые символы для имени таблицы.')
-             print(f"DEBUG: Invalid table name: {table_name}") # <-- Отладка
-             return redirect('core:upload_excel')
-
         try:
-            # Читаем Excel файл с помощью pandas
-            # force_strings=True заставляет pandas читать ВСЁ как строки
-            print(f"DEBUG: Attempting to read file with pandas (force_strings=True): {filename}") # <-- Отладка
-            df = pd.read_excel(excel_file, engine='openpyxl' if filename.endswith('.xlsx') else 'xlrd', dtype=str)
-            print(f"DEBUG: Successfully read file. DataFrame shape: {df.shape}") # <-- Отладка
-            print(f"DEBUG: DataFrame head (first 5 rows):\n{df.head()}") # <-- Отладка: первые 5 строк
-            print(f"DEBUG: DataFrame columns: {df.columns.tolist()}") # <-- Отладка: имена колонок
-            print(f"DEBUG: DataFrame dtypes:\n{df.dtypes}") # <-- Отладка: типы данных после force_strings
-
-            if df.empty:
-                messages.error(request, f'Файл Excel {filename} пуст (DataFrame пуст).')
-                print(f"DEBUG: DataFrame is empty") # <-- Отладка
-                return redirect('core:upload_excel')
-
-            # --- Определение типов полей для SQL: ВСЕ как VARCHAR ---
-            # Так как dtype=str в read_excel, все колонки будут object (str в pandas)
-            field_types = {}
-            for col_name in df.columns:
-                # Определяем максимальную длину строки в колонке
-                # Преобразуем в строку (на случай, если в данных были NaN, которые стали 'nan')
-                max_len_series = df[col_name].astype(str).str.len()
-                # Находим максимальное значение длины
-                max_len = max_len_series.max()
-                # Учитываем, что NaN может стать строкой 'nan' длиной 3, берем длину NaN как 3
-                # Устанавливаем минимальную длину 255, как в DBF
-                final_length = max(255, max_len if pd.notna(max_len) else 3)
-                field_types[col_name] = f'VARCHAR({final_length})'
-
-            print(f"DEBUG: Final field_types (all VARCHAR): {field_types}") # <-- Отладка
-
-            # --- Создание таблицы в PostgreSQL ---
-            with connection.cursor() as cursor:
-                print(f"DEBUG: Attempting to drop table: {table_name}") # <-- Отладка
-                # --- УДАЛЯЕМ ТАБЛИЦУ, ЕСЛИ ОНА СУЩЕСТВУЕТ ---
-                drop_sql = f"DROP TABLE IF EXISTS \"{table_name}\";"
-                cursor.execute(drop_sql)
-                print(f"DEBUG: Dropped table: {table_name}") # <-- Отладка
-
-                # Составляем SQL для создания таблицы
-                create_sql_parts = []
-                for field_name, field_type in field_types.items():
-                    escaped_field_name = f'"{field_name}"'
-                    create_sql_parts.append(f"{escaped_field_name} {field_type}")
-
-                create_sql = f"CREATE TABLE \"{table_name}\" ({', '.join(create_sql_parts)});"
-                print(f"DEBUG: Creating table with SQL: {create_sql}") # <-- Отладка
-                cursor.execute(create_sql)
-                print(f"DEBUG: Created table: {table_name}") # <-- Отладка
-
-                # --- Подготовка и вставка данных ---
-                # Все данные уже строки (dtype=str), но нужно обработать NaN, которые стали 'nan', 'None', 'NaT'
-                # Заменим их на None (NULL в SQL)
-                df_for_insert = df.where(pd.notna(df), None)
-
-                # Преобразуем в список кортежей
-                records_to_insert = [tuple(row) for row in df_for_insert.values]
-                print(f"DEBUG: Prepared {len(records_to_insert)} records for insertion (values: {df_for_insert.values[:5]})") # <-- Отладка: первые 5 записей
-
-                if records_to_insert:
-                    columns = ', '.join([f'"{name}"' for name in df.columns])
-                    placeholders = ', '.join(['%s'] * len(df.columns))
-                    insert_sql = f'INSERT INTO "{table_name}" ({columns}) VALUES ({placeholders});'
-
-                    print(f"DEBUG: Attempting to insert records into {table_name}") # <-- Отладка
-                    # Устанавливаем client_encoding для текущей сессии, если данные в базе в cp866
-                    cursor.execute("SET client_encoding = 'WIN866';") # Или 'cp866'
-                    cursor.executemany(insert_sql, records_to_insert)
-                    print(f"DEBUG: Successfully inserted {len(records_to_insert)} records") # <-- Отладка
-
-            records_count = len(records_to_insert)
-
-            # --- Создание записи о загрузке Excel ---
-            ExcelUpload.objects.create(
-                filename=filename,
-                table_name=table_name,
-                uploaded_by=request.user
-            )
-            print(f"DEBUG: Created ExcelUpload record for {filename} -> {table_name}") # <-- Отладка
-
+            with ingest.uploaded_file_path(excel_file, os.path.splitext(filename)[1]) as path:
+                table_name, records_count, rejected = ingest.load_excel(path, filename, request.user)
             messages.success(request, f'Успешно создана таблица "{table_name}" и загружено {records_count} записей из {filename} как строки.')
-
+            _report_rejects(request, rejected)
+        except ingest.IngestError as e:
+            messages.error(request, str(e))
         except Exception as e:
             print(f"DEBUG: Exception occurred: {str(e)}") # <-- Отладка
             messages.error(request, f'Ошибка при обработке файла: {str(e)}')
@@ -404,10 +393,104 @@ def upload_excel(request):
 
     # Если GET запрос, просто отображаем страницу
     print("DEBUG: GET request, rendering page") # <-- Отладка
-    context = {}
+    context = {'chunked_upload_threshold': settings.CHUNKED_UPLOAD_THRESHOLD}
     return render(request, 'core/upload_excel.html', context)
 
 
+# --- Загрузка больших файлов по частям (протокол — в core/chunked_uploads.py) ---
+def _chunked_upload_state(upload):
+    return {
+        'id': str(upload.pk),
+        'url': reverse('core:chunked_upload_detail', args=[upload.pk]),
+        'complete_url': reverse('core:chunked_upload_complete', args=[upload.pk]),
+        'offset': upload.offset,
+        'size': upload.size,
+        'status': upload.status,
+        'chunk_size': settings.CHUNKED_UPLOAD_CHUNK_SIZE,
+    }
+
+
+def _chunked_upload_error(e):
+    data = {'error': str(e)}
+    if e.offset is not None:
+        data['offset'] = e.offset
+    return JsonResponse(data, status=e.status)
+
+
+@login_required
+@user_passes_test(is_superuser) # Только суперпользователи
+def chunked_upload_init(request):
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Нужен POST.'}, status=405)
+    try:
+        size = int(request.POST.get('size', ''))
+    except ValueError:
+        return JsonResponse({'error': 'Не указан размер файла.'}, status=400)
+    try:
+        upload = chunked_uploads.start(
+            request.user,
+            os.path.basename(request.POST.get('filename', '')),
+            size,
+            request.POST.get('sha256', '').strip().lower(),
+            request.POST.get('partition_table', '').strip(),
+            request.POST.get('partition_column', '').strip(),
+            request.POST.get('dedup', ''),
+            request.POST.get('dedup_keys', ''),
+        )
+    except chunked_uploads.UploadRejected as e:
+        return _chunked_upload_error(e)
+    return JsonResponse(_chunked_upload_state(upload), status=201)
+
+
+@login_required
+@user_passes_test(is_superuser) # Только суперпользователи
+def chunked_upload_detail(request, upload_id):
+    """
+    GET — состояние загрузки (с какого байта продолжать), PUT — очередная часть, DELETE — отмена.
+    """
+    try:
+        if request.method == 'PUT':
+            offset = chunked_uploads.write_chunk(
+                upload_id, request.user, request,
+                request.META.get('HTTP_CONTENT_RANGE'), request.META.get('HTTP_X_CHUNK_SHA256', ''),
+            )
+            return JsonResponse({'offset': offset})
+        if request.method == 'DELETE':
+            chunked_uploads.abort(upload_id, request.user)
+            return JsonResponse({'deleted': True})
+        if request.method == 'GET':
+            return JsonResponse(_chunked_upload_state(chunked_uploads.get_upload(upload_id, request.user)))
+    except chunked_uploads.UploadRejected as e:
+        return _chunked_upload_error(e)
+    return JsonResponse({'error': 'Метод не поддерживается.'}, status=405)
+
+
+@login_required
+@user_passes_test(is_superuser) # Только суперпользователи
+def chunked_upload_complete(request, upload_id):
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Нужен POST.'}, status=405)
+    try:
+        table_name, records_count, duplicates, rejected = chunked_uploads.complete(upload_id, request.user)
+    except chunked_uploads.UploadRejected as e:
+        return _chunked_upload_error(e)
+    except ingest.IngestError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except Exception as e:
+        print(f"DEBUG: Exception occurred: {str(e)}") # <-- Отладка
+        return JsonResponse({'error': f'Ошибка обработки файла: {str(e)}'}, status=500)
+    messages.success(request, f'Успешно создана таблица "{table_name}" и загружено {records_count} записей.')
+    # Куда вернуть пользователя — как после обычной отправки формы
+    upload = chunked_uploads.get_upload(upload_id, request.user)
+    if upload.options.get('dedup'):
+        messages.info(request, f'Удалено дубликатов: {duplicates}.')
+    _report_rejects(request, rejected)
+    next_url = reverse('core:upload_excel' if upload.filename.lower().endswith(ingest.EXCEL_EXTENSIONS) else 'core:search')
+    return JsonResponse({
+        'table_name': table_name, 'rows': records_count, 'duplicates': duplicates, 'rejected': rejected, 'redirect': next_url,
+    })
+
+
 @login_required
 @user_passes_test(can_search) # Используем существующую проверку, или измените на is_superuser
 def download_search_template(request):
@@ -421,67 +504,36 @@ def download_search_template(request):
         return HttpResponse("Не указана таблица", status=400)
 
     # Проверяем, что имя таблицы "безопасно", чтобы избежать SQL-инъекции
-    if not re.match(r'^[a-zA-Z_][a-zA-Z0-9_]*$', table_name):
+    if not ingest.TABLE_NAME_RE.match(table_name):
         messages.error(request, 'Недопустимое имя таблицы.')
         return HttpResponse("Недопустимое имя таблицы", status=400)
 
-    # Получаем структуру таблицы (имена столбцов)
+    # Готовая книга из кэша (строится заново только после изменения таблицы или шаблона)
     try:
-        with connection.cursor() as cursor:
-            query = sql.SQL("SELECT column_name FROM information_schema.columns WHERE table_name = %s ORDER BY ordinal_position;")
-            cursor.execute(query, [table_name])
-            columns = [row[0] for row in cursor.fetchall()]
-
-        if not columns:
-            messages.error(request, f'Таблица "{table_name}" не содержит столбцов.')
-            return HttpResponse(f'Таблица "{table_name}" не содержит столбцов.', status=404)
-
+        template_file = workbooks.get_search_template(table_name)
     except Exception as e:
         messages.error(request, f'Ошибка при получении структуры таблицы: {str(e)}')
         return HttpResponse(f'Ошибка при получении структуры таблицы: {str(e)}', status=500)
 
-    # Создаём Excel-файл в памяти
-    wb = Workbook()
-
-    # --- Лист 1: Шаблон с заголовками ---
-    ws_template = wb.active
-    ws_template.title = f"Шаблон_{table_name}"
-
-    # Записываем имена столбцов в первую строку (это и есть подписи)
-    for col_num, column_title in enumerate(columns, 1):
-        cell = ws_template.cell(row=1, column=col_num, value=column_title)
-        # Опционально: стиль заголовка
-        # cell.font = Font(bold=True)
-
-    # --- Лист 2: Пустой лист для данных ---
-    ws_data = wb.create_sheet(title=f"Данные_{table_name}")
-    # Оставляем его пустым
-
-    # Устанавливаем ширину столбцов (опционально, для обоих листов)
-    for ws in [ws_template, ws_data]:
-        for column in ws.columns:
-            max_length = 0
-            column_letter_name = get_column_letter(column[0].column)
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = (max_length + 2)
-            ws.column_dimensions[column_letter_name].width = adjusted_width
-
-    # Сохраняем в BytesIO
-    buffer = io.BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
-
-    # Формируем имя файла
-    filename = f"{table_name}_search_template.xlsx"
-
-    # Возвращаем файл как HTTP-ответ
-    response = HttpResponse(buffer.getvalue(), content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    if template_file is None:
+        messages.error(request, f'Таблица "{table_name}" не содержит столбцов.')
+        return HttpResponse(f'Таблица "{table_name}" не содержит столбцов.', status=404)
+
+    # Браузер уже получал эту версию — отвечаем 304 без тела
+    etag = quote_etag(template_file['etag'])
+    last_modified = int(template_file['last_modified'].timestamp())
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        # Формируем имя файла
+        filename = f"{table_name}_search_template.xlsx"
+
+        # Возвращаем файл как HTTP-ответ
+        response = HttpResponse(template_file['content'], content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # Кэшировать можно, но перед использованием — проверять версию (дешёвый условный запрос)
+    patch_cache_control(response, private=True, no_cache=True)
     return response
 
 
@@ -489,77 +541,64 @@ def download_search_template(request):
 @user_passes_test(can_search)
 def get_table_columns(request):
     """
-    Возвращает JSON с именами столбцов, их конфигурацией для поиска и вывода для указанной таблицы.
+    Возвращает JSON с полями таблицы (в порядке столбцов) и их ролями в шаблоне:
+    {'version': ..., 'fields': [...]}, формат — см. catalog.get_field_metadata.
+    Поддерживает условные запросы (If-None-Match -> 304).
     """
     table_name = request.GET.get('table_name')
     if not table_name:
         return JsonResponse({'error': 'Table name is required'}, status=400)
 
     # Проверяем, что имя таблицы "безопасно", чтобы избежать SQL-инъекции
-    if not re.match(r'^[a-zA-Z_][a-zA-Z0-9_]*$', table_name):
+    if not ingest.TABLE_NAME_RE.match(table_name):
         return JsonResponse({'error': 'Invalid table name'}, status=400)
 
     try:
-        with connection.cursor() as cursor:
-            # ИСПОЛЬЗУЕМ обычную строку с параметром, как в manage_table_template
-            query = "SELECT column_name FROM information_schema.columns WHERE table_name = %s ORDER BY ordinal_position;"
-            print(f"DEBUG: Executing query for table (get_table_columns): '{table_name}'") # <-- Отладка
-            cursor.execute(query, [table_name])
-            columns = [row[0] for row in cursor.fetchall()]
-            print(f"DEBUG: Fetched columns (get_table_columns): {columns}") # <-- Отладка
-
-        # Проверяем, есть ли шаблон для этой таблицы
-        try:
-            template_obj = TableTemplate.objects.prefetch_related('field_configs').get(table_name=table_name)
-            # Получаем настройки полей из связанной модели
-            field_configs = template_obj.field_configs.all()
-
-            # Разделяем настройки по типу
-            search_configs = {cfg.field_name: cfg.field_label for cfg in field_configs if cfg.template_type == 'search'}
-            result_configs = {cfg.field_name: cfg.field_label for cfg in field_configs if cfg.template_type == 'result'}
-
-            # Получаем порядок из связанной модели, отсортированной по 'order'
-            search_order = [cfg.field_name for cfg in field_configs if cfg.template_type == 'search']
-            result_order = [cfg.field_name for cfg in field_configs if cfg.template_type == 'result']
-
-            # Если порядок не задан через Inline (например, все поля имеют order=0),
-            # используем порядок из базы данных для отсутствующих в шаблоне
-            if not search_order:
-                search_order = columns
-            else:
-                # Добавляем столбцы, которые не были в шаблоне, в конец списка
-                search_order.extend([col for col in columns if col not in search_order])
-
-            if not result_order:
-                result_order = columns
-            else:
-                # Добавляем столбцы, которые не были в шаблоне, в конец списка
-                result_order.extend([col for col in columns if col not in result_order])
-
-
-            # Подписи для поиска: используем настройку, если есть, иначе имя столбца
-            search_labels = {col: search_configs.get(col, col) for col in search_order if col in columns}
-            # Подписи для вывода: используем настройку, если есть, иначе имя столбца
-            result_labels = {col: result_configs.get(col, col) for col in result_order if col in columns}
-
-        except TableTemplate.DoesNotExist:
-            # Если шаблона нет, используем имена столбцов как есть
-            search_labels = {col: col for col in columns}
-            result_labels = {col: col for col in columns}
-            search_order = columns
-            result_order = columns
-
-        return JsonResponse({
-            'columns': columns,
-            'search_labels': search_labels,
-            'result_labels': result_labels,
-            'search_order': search_order,
-            'result_order': result_order
-        })
+        # Описание полей кэшируется по версии таблицы и шаблона
+        metadata = catalog.get_field_metadata(table_name)
     except Exception as e:
         print(f"DEBUG: Database error in get_table_columns for table '{table_name}': {str(e)}") # <-- Отладка
         return JsonResponse({'error': f'Database error: {str(e)}'}, status=500)
 
+    # У браузера уже есть эта версия — 304 без тела
+    etag = quote_etag(metadata['version'])
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse(metadata, json_dumps_params={'ensure_ascii': False, 'separators': (',', ':')})
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@login_required
+@user_passes_test(can_search)
+def autocomplete(request):
+    """
+    Подсказки для поля поиска: JSON со списком различных значений по префиксу.
+    Параметры: table_name, field, q, limit (не больше AUTOCOMPLETE_MAX_LIMIT).
+    """
+    table_name = request.GET.get('table_name', '')
+    field_name = request.GET.get('field', '')
+    query = request.GET.get('q', '')
+    try:
+        limit = int(request.GET.get('limit', 10))
+    except ValueError:
+        return JsonResponse({'error': 'Invalid limit'}, status=400)
+    limit = max(1, min(limit, settings.AUTOCOMPLETE_MAX_LIMIT))
+
+    if table_name not in catalog.get_available_tables():
+        return JsonResponse({'error': 'Unknown table'}, status=404)
+    # Подсказки только для полей поиска шаблона: по остальным нет индекса
+    if field_name not in search_keys.get_key_fields(table_name) or field_name not in catalog.get_table_columns(table_name):
+        return JsonResponse({'error': 'Autocomplete is not available for this field'}, status=400)
+
+    suggestions, timed_out = autocomplete_engine.get_suggestions(table_name, field_name, query, limit)
+    response = JsonResponse({'suggestions': suggestions, 'timed_out': timed_out})
+    if not timed_out:
+        # Повторный ввод того же префикса браузер возьмёт из своего кэша
+        patch_cache_control(response, private=True, max_age=settings.AUTOCOMPLETE_CACHE_TIMEOUT)
+    return response
+
 
 # ... (остальные функции, если есть) ...
 @login_required
@@ -571,38 +610,22 @@ def manage_table_template(request, table_name=None):
     available_tables = []
     table_columns = []
     template_exists = False
+    use_projection = False
     existing_configs = []
     existing_search_fields = []
     existing_result_fields = []
 
-    # Получаем список таблиц
-    with connection.cursor() as cursor:
-        cursor.execute("""
-            SELECT tablename
-            FROM pg_tables
-            WHERE schemaname = 'public'
-              AND tablename NOT LIKE 'pg_%'
-              AND tablename NOT LIKE 'sql_%'
-              AND tablename NOT LIKE 'django_%'
-              AND tablename NOT LIKE 'auth_%'
-              AND tablename NOT LIKE 'contenttype_%'
-              AND tablename NOT LIKE 'core_%';
-        """)
-        all_tables = [row[0] for row in cursor.fetchall()]
-        available_tables = all_tables
+    # Получаем список таблиц (из кэшируемого каталога)
+    available_tables = catalog.get_available_tables()
 
     if request.method == 'POST':
         table_name = request.POST.get('table_name')
         if table_name and table_name in available_tables:
             # Получаем столбцы выбранной таблицы
-            with connection.cursor() as cursor:
-                query = "SELECT column_name FROM information_schema.columns WHERE table_name = %s ORDER BY ordinal_position;"
-                print(f"DEBUG: Executing query for table (POST): {table_name}") # <-- Отладка
-                cursor.execute(query, [table_name])
-                table_columns = [row[0] for row in cursor.fetchall()]
-                print(f"DEBUG: Fetched columns (POST): {table_columns}") # <-- Отладка
+            table_columns = catalog.get_table_columns(table_name)
 
             # Обработка сохранения
+            use_projection = request.POST.get('use_projection') == 'on'
             # Удаляем старые настройки для этой таблицы
             TableTemplateFieldConfig.objects.filter(table_template__table_name=table_name).delete()
             # Удаляем сам шаблон, если он был (чтобы создать заново с новым order)
@@ -611,7 +634,7 @@ def manage_table_template(request, table_name=None):
             # Создаём/обновляем шаблон
             template_obj, created = TableTemplate.objects.get_or_create(
                 table_name=table_name,
-                defaults={'created_by': request.user}
+                defaults={'created_by': request.user, 'use_projection': use_projection}
             )
             if not created:
                 template_obj.created_by = request.user # Обновляем автора, если нужно
@@ -634,7 +657,10 @@ def manage_table_template(request, table_name=None):
                     label = request.POST.get(label_key, field_name) # Если подпись пуста, используем имя поля
                     # Проверяем, что поле существует в таблице
                     if field_name and field_name in table_columns:
-                        search_configs[unique_id] = {'field': field_name, 'label': label}
+                        role = request.POST.get(f'search_role_{unique_id}', '')
+                        if role not in dict(TableTemplateFieldConfig.ROLE_CHOICES):
+                            role = ''
+                        search_configs[unique_id] = {'field': field_name, 'label': label, 'role': role}
 
             # Сохраняем поля поиска
             for idx, (unique_id, config_data) in enumerate(search_configs.items()):
@@ -643,7 +669,8 @@ def manage_table_template(request, table_name=None):
                     field_name=config_data['field'],
                     field_label=config_data['label'],
                     template_type='search',
-                    order=idx # Устанавливаем порядок
+                    order=idx, # Устанавливаем порядок
+                    role=config_data['role'],
                 )
 
             # --- Обработка полей вывода ---
@@ -661,7 +688,10 @@ def manage_table_template(request, table_name=None):
                     label = request.POST.get(label_key, field_name)
                     # Проверяем, что поле существует в таблице
                     if field_name and field_name in table_columns:
-                        result_configs[unique_id] = {'field': field_name, 'label': label}
+                        result_configs[unique_id] = {
+                            'field': field_name, 'label': label,
+                            'is_facet': request.POST.get(f'result_facet_{unique_id}') == 'on',
+                        }
 
             # Сохраняем поля вывода
             for idx, (unique_id, config_data) in enumerate(result_configs.items()):
@@ -670,9 +700,13 @@ def manage_table_template(request, table_name=None):
                     field_name=config_data['field'],
                     field_label=config_data['label'],
                     template_type='result',
-                    order=idx # Устанавливаем порядок
+                    order=idx, # Устанавливаем порядок
+                    is_facet=config_data['is_facet'],
                 )
 
+            # Перестраиваем зависящие от шаблона объекты (проекцию и т.п.)
+            template_changed.send(sender=TableTemplate, table_name=table_name)
+
             messages.success(request, f'Шаблон для таблицы "{table_name}" успешно сохранён.')
             # Перенаправляем, чтобы избежать повторной отправки формы при обновлении страницы
             return redirect('core:manage_table_template_with_table', table_name=table_name)
@@ -681,17 +715,13 @@ def manage_table_template(request, table_name=None):
         table_name = request.GET.get('table_name')
         if table_name in available_tables:
             # Получаем столбцы выбранной таблицы
-            with connection.cursor() as cursor:
-                query = "SELECT column_name FROM information_schema.columns WHERE table_name = %s ORDER BY ordinal_position;"
-                print(f"DEBUG: Executing query for table (GET): {table_name}") # <-- Отладка
-                cursor.execute(query, [table_name])
-                table_columns = [row[0] for row in cursor.fetchall()]
-                print(f"DEBUG: Fetched columns (GET): {table_columns}") # <-- Отладка
+            table_columns = catalog.get_table_columns(table_name)
 
             # Проверяем, есть ли шаблон
             try:
                 template_obj = TableTemplate.objects.prefetch_related('field_configs').get(table_name=table_name)
                 template_exists = True
+                use_projection = template_obj.use_projection
                 existing_configs = template_obj.field_configs.all()
 
                 # Подготовим списки существующих полей для поиска и вывода
@@ -710,6 +740,9 @@ def manage_table_template(request, table_name=None):
         'selected_table': table_name,
         'table_columns': table_columns,
         'template_exists': template_exists,
+        'use_projection': use_projection,
+        'role_choices': TableTemplateFieldConfig.ROLE_CHOICES,
+        'table_stats': profiling.get_latest_stats(table_name),
         'existing_configs': existing_configs,
         'existing_search_fields': existing_search_fields, # Передаём в шаблон
         'existing_result_fields': existing_result_fields, # Передаём в шаблон
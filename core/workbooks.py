@@ -0,0 +1,93 @@
+# core/workbooks.py
+"""
+Excel-шаблоны поиска (download_search_template).
+
+Книга строится один раз на версию таблицы и её шаблона и хранится в кэше
+готовыми байтами вместе с ETag и Last-Modified. Версия (catalog.get_table_version) —
+поколение таблицы и время изменения шаблона, поэтому после перезагрузки таблицы или правки шаблона книга строится заново,
+а повторные скачивания отдаются из кэша или ответом 304.
+"""
+import hashlib
+import io
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from . import catalog
+from .models import TableTemplateFieldConfig
+
+CACHE_PREFIX = 'core:workbooks'
+
+
+def get_field_labels(table_name):
+    """
+    Подписи полей из шаблона: {поле: подпись}. Подпись поля поиска важнее подписи поля вывода.
+    """
+    labels = {}
+    for field_name, field_label, template_type in TableTemplateFieldConfig.objects.filter(
+        table_template__table_name=table_name,
+    ).values_list('field_name', 'field_label', 'template_type'):
+        if field_label and (template_type == 'search' or field_name not in labels):
+            labels[field_name] = field_label
+    return labels
+
+
+def build_search_template(table_name, columns, labels):
+    """
+    Строит книгу: лист «Шаблон» (имена столбцов и подписи из шаблона) и пустой лист «Данные».
+    Возвращает содержимое .xlsx.
+    """
+    # openpyxl — только при построении книги: готовые книги отдаются из кэша,
+    # и процессам, которые их не строят, библиотека не нужна
+    from openpyxl import Workbook
+    from openpyxl.styles import Font
+    from openpyxl.utils import get_column_letter
+
+    wb = Workbook()
+
+    # --- Лист 1: Шаблон с заголовками ---
+    ws_template = wb.active
+    ws_template.title = f"Шаблон_{table_name}"
+    label_font = Font(italic=True)
+    for col_num, column_name in enumerate(columns, 1):
+        label = labels.get(column_name, '')
+        ws_template.cell(row=1, column=col_num, value=column_name)
+        if label:
+            ws_template.cell(row=2, column=col_num, value=label).font = label_font
+        # Ширина по заголовку — других значений на листе нет
+        ws_template.column_dimensions[get_column_letter(col_num)].width = max(len(column_name), len(label)) + 2
+    ws_template.freeze_panes = 'A3' if labels else 'A2'
+
+    # --- Лист 2: Пустой лист для данных ---
+    wb.create_sheet(title=f"Данные_{table_name}")
+
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def get_search_template(table_name):
+    """
+    Готовый шаблон таблицы из кэша (или только что построенный):
+    {'content', 'etag', 'last_modified'}; None, если у таблицы нет столбцов.
+    """
+    version, last_modified = catalog.get_table_version(table_name)
+    cache_key = f"{CACHE_PREFIX}:{table_name}:{version}"
+    entry = cache.get(cache_key)
+    if entry is not None:
+        return entry
+
+    columns = catalog.get_table_columns(table_name)
+    if not columns:
+        return None
+
+    entry = {
+        'content': build_search_template(table_name, columns, get_field_labels(table_name)),
+        # ETag зависит только от версии — одинаков во всех процессах
+        'etag': hashlib.md5(f"{table_name}:{version}".encode('utf-8')).hexdigest(),
+        'last_modified': last_modified or timezone.now(),
+    }
+    cache.set(cache_key, entry, settings.WORKBOOK_CACHE_TIMEOUT)
+    print(f"DEBUG: built search template for {table_name} (version {version})")
+    return entry
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 import os
+import tempfile
 import ldap
 from django_auth_ldap.config import LDAPSearch, NestedGroupOfNamesType
 from pathlib import Path
@@ -50,6 +51,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.db_routing.StickyPrimaryMiddleware', # Чтение с реплик / из основной базы после изменений
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -60,8 +62,15 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Скомпилированные шаблоны хранятся в памяти процесса (при DEBUG изменения
+            # файлов шаблонов всё равно подхватываются автоперезагрузкой runserver)
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -89,6 +98,27 @@ DATABASES = {
     }
 }
 
+# --- Реплики для чтения (core/db_routing.py) ---
+# Список "хост:порт" через запятую; имя базы, пользователь и пароль — как у основной
+DB_REPLICA_HOSTS = config('DB_REPLICA_HOSTS', default='', cast=lambda v: [s.strip() for s in v.split(',') if s.strip()])
+for _index, _replica in enumerate(DB_REPLICA_HOSTS, 1):
+    _host, _, _port = _replica.partition(':')
+    DATABASES[f'replica{_index}'] = {
+        **DATABASES['default'],
+        'HOST': _host,
+        'PORT': _port or DATABASES['default']['PORT'],
+        'OPTIONS': {'connect_timeout': 3}, # Недоступная реплика не должна надолго задерживать запрос
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['core.db_routing.PrimaryReplicaRouter']
+# Реплика с отставанием больше этого (сек) не используется
+REPLICA_MAX_LAG_SECONDS = config('REPLICA_MAX_LAG_SECONDS', default=30, cast=int)
+# Как часто (сек) проверять состояние реплик
+REPLICA_CHECK_INTERVAL = config('REPLICA_CHECK_INTERVAL', default=5, cast=int)
+# Сколько секунд после изменений пользователь читает из основной базы
+REPLICA_STICKY_SECONDS = config('REPLICA_STICKY_SECONDS', default=60, cast=int)
+
 
 
 # Password validation
@@ -131,6 +161,20 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = [
     BASE_DIR / 'static',
 ]
+# Сюда собирает файлы collectstatic; веб-сервер отдаёт их с долгим сроком кэширования
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# Имена собранных статических файлов содержат хэш содержимого (bootstrap.min.3f2a….css,
+# ManifestStaticFilesStorage — см. core/storage.py),
+# поэтому браузер может кэшировать их сколь угодно долго. При DEBUG используются исходные имена.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'core.storage.StaticFilesStorage',
+    },
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
@@ -138,6 +182,120 @@ STATICFILES_DIRS = [
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
+# --- Каталог таблиц ---
+# Сколько секунд хранить в кэше список таблиц и столбцов.
+# После загрузки через приложение кэш сбрасывается сразу (по поколению таблицы)
+CATALOG_CACHE_TIMEOUT = config('CATALOG_CACHE_TIMEOUT', default=300, cast=int)
+
+# --- Подсказки (autocomplete) для полей поиска ---
+AUTOCOMPLETE_MIN_CHARS = config('AUTOCOMPLETE_MIN_CHARS', default=2, cast=int)
+AUTOCOMPLETE_MAX_LIMIT = config('AUTOCOMPLETE_MAX_LIMIT', default=20, cast=int)
+# Сколько секунд кэшировать ответы (на сервере и в браузере)
+AUTOCOMPLETE_CACHE_TIMEOUT = config('AUTOCOMPLETE_CACHE_TIMEOUT', default=300, cast=int)
+# statement_timeout для запроса подсказок (мс)
+AUTOCOMPLETE_TIMEOUT_MS = config('AUTOCOMPLETE_TIMEOUT_MS', default=200, cast=int)
+
+# --- Фасеты (счётчики значений в результатах поиска) ---
+# Сколько самых частых значений показывать для каждого поля
+FACET_MAX_VALUES = config('FACET_MAX_VALUES', default=10, cast=int)
+# Сколько секунд кэшировать счётчики (после перезагрузки таблицы кэш сбрасывается по поколению)
+FACET_CACHE_TIMEOUT = config('FACET_CACHE_TIMEOUT', default=3600, cast=int)
+
+# --- Ограничения поиска (core/governor.py) ---
+# statement_timeout поиска (мс) по роли пользователя
+SEARCH_TIMEOUT_MS = config('SEARCH_TIMEOUT_MS', default=15000, cast=int)
+SEARCH_TIMEOUT_STAFF_MS = config('SEARCH_TIMEOUT_STAFF_MS', default=30000, cast=int)
+SEARCH_TIMEOUT_SUPERUSER_MS = config('SEARCH_TIMEOUT_SUPERUSER_MS', default=120000, cast=int)
+# Сколько тяжёлых поисков (без индекса) может выполняться одновременно у одного пользователя и всего
+SEARCH_HEAVY_PER_USER = config('SEARCH_HEAVY_PER_USER', default=2, cast=int)
+SEARCH_HEAVY_GLOBAL = config('SEARCH_HEAVY_GLOBAL', default=4, cast=int)
+# Сколько секунд тяжёлый поиск ждёт свободного места, прежде чем получить отказ
+SEARCH_QUEUE_TIMEOUT = config('SEARCH_QUEUE_TIMEOUT', default=10, cast=int)
+
+# --- Сохранённые поиски (core/saved_searches.py) ---
+# Сколько строк результата хранить в снимке сохранённого поиска
+SAVED_SEARCH_MAX_ROWS = config('SAVED_SEARCH_MAX_ROWS', default=10000, cast=int)
+# statement_timeout для построения снимка командой refresh_saved_searches (мс)
+SAVED_SEARCH_REFRESH_TIMEOUT_MS = config('SAVED_SEARCH_REFRESH_TIMEOUT_MS', default=600000, cast=int)
+
+# --- Поиск по всем таблицам ---
+# Сколько таблиц опрашивать одновременно (каждый поток — отдельное соединение с базой)
+FEDERATED_MAX_WORKERS = config('FEDERATED_MAX_WORKERS', default=4, cast=int)
+# statement_timeout для запроса к одной таблице (мс)
+FEDERATED_TIMEOUT_MS = config('FEDERATED_TIMEOUT_MS', default=5000, cast=int)
+# Сколько строк показывать из одной таблицы
+FEDERATED_MAX_ROWS_PER_TABLE = config('FEDERATED_MAX_ROWS_PER_TABLE', default=100, cast=int)
+
+# --- Связанные записи (core/entity_links.py) ---
+# Сколько связанных записей показывать (по всем таблицам вместе)
+ENTITY_LINKS_MAX_ROWS = config('ENTITY_LINKS_MAX_ROWS', default=500, cast=int)
+
+# --- Excel-шаблоны поиска ---
+# Сколько секунд хранить готовые книги в кэше (ключ включает версию таблицы и шаблона)
+WORKBOOK_CACHE_TIMEOUT = config('WORKBOOK_CACHE_TIMEOUT', default=86400, cast=int)
+
+# --- Диагностика медленных поисков ---
+# Порог (мс), после которого поиск считается медленным
+SLOW_SEARCH_THRESHOLD_MS = config('SLOW_SEARCH_THRESHOLD_MS', default=1000, cast=int)
+# Доля медленных поисков, для которых снимается EXPLAIN ANALYZE (0..1)
+SLOW_SEARCH_SAMPLE_RATE = config('SLOW_SEARCH_SAMPLE_RATE', default=0.2, cast=float)
+# Сколько планов может ждать в очереди, остальные пропускаются
+SLOW_SEARCH_MAX_PENDING = config('SLOW_SEARCH_MAX_PENDING', default=4, cast=int)
+# Ограничение времени на сам EXPLAIN ANALYZE (мс)
+SLOW_SEARCH_EXPLAIN_TIMEOUT_MS = config('SLOW_SEARCH_EXPLAIN_TIMEOUT_MS', default=60000, cast=int)
+
+# --- Загрузка больших файлов по частям (core/chunked_uploads.py) ---
+# Каталог для собираемых файлов (должен быть общим для всех процессов сервера)
+CHUNKED_UPLOAD_DIR = config('CHUNKED_UPLOAD_DIR', default=os.path.join(tempfile.gettempdir(), 'chunked_uploads'))
+# Размер части, которую отправляет браузер, и наибольший допустимый размер части (байт)
+CHUNKED_UPLOAD_CHUNK_SIZE = config('CHUNKED_UPLOAD_CHUNK_SIZE', default=8 * 1024 * 1024, cast=int)
+CHUNKED_UPLOAD_MAX_CHUNK_SIZE = config('CHUNKED_UPLOAD_MAX_CHUNK_SIZE', default=64 * 1024 * 1024, cast=int)
+# Наибольший размер файла (байт)
+CHUNKED_UPLOAD_MAX_SIZE = config('CHUNKED_UPLOAD_MAX_SIZE', default=20 * 1024 ** 3, cast=int)
+# Файлы больше этого размера форма загрузки отправляет по частям
+CHUNKED_UPLOAD_THRESHOLD = config('CHUNKED_UPLOAD_THRESHOLD', default=50 * 1024 * 1024, cast=int)
+# Через сколько часов незавершённая или неудачная загрузка удаляется (manage.py cleanup_chunked_uploads)
+CHUNKED_UPLOAD_EXPIRE_HOURS = config('CHUNKED_UPLOAD_EXPIRE_HOURS', default=48, cast=int)
+# Через сколько часов загрузка в базу считается прерванной (остановка сервера посреди complete)
+CHUNKED_UPLOAD_LOADING_TIMEOUT_HOURS = config('CHUNKED_UPLOAD_LOADING_TIMEOUT_HOURS', default=6, cast=int)
+# Через сколько секунд незаконченная запись части считается прерванной (часть можно передать заново)
+CHUNKED_UPLOAD_WRITE_TIMEOUT = config('CHUNKED_UPLOAD_WRITE_TIMEOUT', default=15 * 60, cast=int)
+
+# --- Потоковая загрузка DBF (core/ingest.py) ---
+# Сколько пачек разобранных записей может ждать записи в базу (одна пачка — одна часть тела запроса, 64 КБ)
+INGEST_QUEUE_BATCHES = config('INGEST_QUEUE_BATCHES', default=64, cast=int)
+# Размер блока при чтении DBF с диска (байт)
+INGEST_READ_BLOCK_SIZE = config('INGEST_READ_BLOCK_SIZE', default=1024 * 1024, cast=int)
+# Через сколько секунд без новых данных загрузка считается прерванной
+INGEST_STALL_TIMEOUT = config('INGEST_STALL_TIMEOUT', default=300, cast=int)
+# Удаление дубликатов (core/dedup.py): сколько хэшей записей держать в памяти (около 100 байт на хэш),
+# дальше они переносятся в файл в каталоге INGEST_DEDUP_SPILL_DIR (по умолчанию — системный временный)
+INGEST_DEDUP_MEMORY_KEYS = config('INGEST_DEDUP_MEMORY_KEYS', default=1000000, cast=int)
+INGEST_DEDUP_SPILL_DIR = config('INGEST_DEDUP_SPILL_DIR', default='') or None
+# Сколько записей с ошибками можно пропустить (они сохраняются в IngestReject); больше — загрузка прерывается
+INGEST_MAX_REJECTS = config('INGEST_MAX_REJECTS', default=1000, cast=int)
+# Сколько загрузок может писать в базу одновременно (по дискам и ядрам сервера базы); остальные ждут в очереди
+INGEST_MAX_CONCURRENT = config('INGEST_MAX_CONCURRENT', default=2, cast=int)
+# Сколько секунд загрузка ждёт свободного места, прежде чем получить отказ
+INGEST_QUEUE_TIMEOUT = config('INGEST_QUEUE_TIMEOUT', default=120, cast=int)
+# Сколько секунд загрузка ждёт, пока закончится другая загрузка в ту же таблицу
+INGEST_TABLE_LOCK_TIMEOUT = config('INGEST_TABLE_LOCK_TIMEOUT', default=30, cast=int)
+
+# --- Снимки таблиц в Parquet (core/snapshots.py) ---
+# Каталог для файлов <таблица>.parquet
+SNAPSHOT_DIR = config('SNAPSHOT_DIR', default=os.path.join(BASE_DIR, 'snapshots'))
+# Строк в одной группе строк (row group) — столько строк одновременно держится в памяти
+SNAPSHOT_ROW_GROUP_SIZE = config('SNAPSHOT_ROW_GROUP_SIZE', default=100000, cast=int)
+# Сжатие: zstd, snappy, gzip, brotli, lz4 или none
+SNAPSHOT_COMPRESSION = config('SNAPSHOT_COMPRESSION', default='zstd')
+
+# --- Выгрузка в DBF (core/dbf_export.py) ---
+# Сколько строк читать из базы за раз
+DBF_EXPORT_FETCH_SIZE = config('DBF_EXPORT_FETCH_SIZE', default=10000, cast=int)
+# Размер блока записи в файл (байт)
+DBF_EXPORT_BLOCK_SIZE = config('DBF_EXPORT_BLOCK_SIZE', default=4 * 1024 * 1024, cast=int)
+
+
 # --- Аутентификация ---
 AUTHENTICATION_BACKENDS = [
     'django_auth_ldap.backend.LDAPBackend', # ADDS бэкенд
@@ -0,0 +1,160 @@
+// static/js/chunked_upload.js
+// Загрузка больших файлов по частям (протокол — core/chunked_uploads.py).
+// Форма с атрибутом data-chunked-upload-url: если выбранный файл больше
+// data-chunked-upload-threshold байт, он отправляется частями вместо обычной
+// отправки формы. После обрыва (или перезагрузки страницы) загрузка того же
+// файла продолжается с последней принятой части.
+(function() {
+    const MAX_ATTEMPTS = 5;          // Попыток на одну часть
+    const RETRY_DELAY_MS = 2000;     // Пауза перед повтором (растёт с номером попытки)
+
+    function sleep(ms) {
+        return new Promise(resolve => setTimeout(resolve, ms));
+    }
+
+    function resumeKey(file) {
+        return `chunked-upload:${file.name}:${file.size}:${file.lastModified}`;
+    }
+
+    async function sha256Hex(blob) {
+        // crypto.subtle есть только на https и localhost — иначе часть отправляется без контрольной суммы
+        if (!window.crypto || !window.crypto.subtle) {
+            return '';
+        }
+        const digest = await window.crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+        return Array.from(new Uint8Array(digest), b => b.toString(16).padStart(2, '0')).join('');
+    }
+
+    async function requestJson(url, options) {
+        const response = await fetch(url, Object.assign({credentials: 'same-origin'}, options));
+        let data = {};
+        try {
+            data = await response.json();
+        } catch (e) {
+            data = {error: `Ошибка сервера (${response.status}).`};
+        }
+        return {status: response.status, ok: response.ok, data: data};
+    }
+
+    // Загрузка, начатая ранее для этого же файла, если сервер её ещё помнит
+    async function resumeUpload(file, csrfToken) {
+        const url = localStorage.getItem(resumeKey(file));
+        if (!url) {
+            return null;
+        }
+        const result = await requestJson(url, {headers: {'X-CSRFToken': csrfToken}});
+        // После ошибки загрузки в базу (failed) файл остался на сервере — complete можно повторить
+        if (result.ok && (result.data.status === 'uploading' || result.data.status === 'failed')) {
+            return result.data;
+        }
+        localStorage.removeItem(resumeKey(file));
+        return null;
+    }
+
+    async function startUpload(form, file, csrfToken) {
+        const body = new FormData();
+        body.append('filename', file.name);
+        body.append('size', file.size);
+        form.querySelectorAll('[data-chunked-upload-option]').forEach(input => {
+            body.append(input.name, input.value);
+        });
+        const result = await requestJson(form.dataset.chunkedUploadUrl, {
+            method: 'POST', body: body, headers: {'X-CSRFToken': csrfToken},
+        });
+        if (!result.ok) {
+            throw new Error(result.data.error);
+        }
+        localStorage.setItem(resumeKey(file), result.data.url);
+        return result.data;
+    }
+
+    async function sendChunk(upload, file, offset, csrfToken) {
+        const end = Math.min(offset + upload.chunk_size, file.size);
+        const chunk = file.slice(offset, end);
+        const headers = {
+            'X-CSRFToken': csrfToken,
+            'Content-Type': 'application/octet-stream',
+            'Content-Range': `bytes ${offset}-${end - 1}/${file.size}`,
+        };
+        const checksum = await sha256Hex(chunk);
+        if (checksum) {
+            headers['X-Chunk-SHA256'] = checksum;
+        }
+        for (let attempt = 1; ; attempt++) {
+            let result;
+            try {
+                result = await requestJson(upload.url, {method: 'PUT', body: chunk, headers: headers});
+            } catch (e) {
+                result = {status: 0, ok: false, data: {error: 'Нет связи с сервером.'}};
+            }
+            if (result.ok) {
+                return result.data.offset;
+            }
+            if (result.status === 409 && result.data.offset !== undefined) {
+                // Сервер уже принял больше (или меньше) — продолжаем с его смещения
+                return result.data.offset;
+            }
+            // Ошибки в запросе (кроме обрыва и ошибок сервера) повтором не исправить
+            const retriable = result.status === 0 || result.status >= 500 || result.data.offset !== undefined;
+            if (!retriable || attempt >= MAX_ATTEMPTS) {
+                throw new Error(result.data.error);
+            }
+            await sleep(RETRY_DELAY_MS * attempt);
+        }
+    }
+
+    function showError(form, message) {
+        const alert = document.createElement('div');
+        alert.className = 'alert alert-danger';
+        alert.textContent = message;
+        form.parentNode.insertBefore(alert, form);
+    }
+
+    async function upload(form, file, progress) {
+        const csrfToken = form.querySelector('[name=csrfmiddlewaretoken]').value;
+        const state = await resumeUpload(file, csrfToken) || await startUpload(form, file, csrfToken);
+        let offset = state.offset;
+        while (offset < file.size) {
+            progress.value = offset;
+            offset = await sendChunk(state, file, offset, csrfToken);
+        }
+        progress.value = file.size;
+        const result = await requestJson(state.complete_url, {
+            method: 'POST', headers: {'X-CSRFToken': csrfToken},
+        });
+        if (!result.ok) {
+            // Таблица занята другой загрузкой (ответ со смещением) или ошибка сервера: файл остался
+            // на сервере, повторная отправка формы сразу загрузит его в базу, без передачи частей.
+            // Ошибку в самом файле (400) повтор не исправит — такую загрузку начинаем заново
+            if (result.data.offset === undefined && result.status < 500) {
+                localStorage.removeItem(resumeKey(file));
+            }
+            throw new Error(result.data.error);
+        }
+        localStorage.removeItem(resumeKey(file));
+        window.location.href = result.data.redirect;
+    }
+
+    document.querySelectorAll('form[data-chunked-upload-url]').forEach(form => {
+        const threshold = parseInt(form.dataset.chunkedUploadThreshold, 10);
+        form.addEventListener('submit', event => {
+            const file = form.querySelector('input[type=file]').files[0];
+            if (!file || file.size <= threshold) {
+                return; // Небольшой файл — обычная отправка формы
+            }
+            event.preventDefault();
+            const button = form.querySelector('[type=submit]');
+            button.disabled = true;
+            const progress = document.createElement('progress');
+            progress.className = 'w-100 mt-3';
+            progress.max = file.size;
+            form.appendChild(progress);
+            upload(form, file, progress).catch(error => {
+                console.error('Chunked upload error:', error);
+                showError(form, error.message || 'Ошибка загрузки файла.');
+                progress.remove();
+                button.disabled = false;
+            });
+        });
+    });
+})();
@@ -0,0 +1,176 @@
+// static/js/search_results.js
+// Результаты поиска: JSON от представления search (format=json)
+// и виртуализированная таблица — в DOM только видимые строки и запас вокруг них,
+// поэтому десятки тысяч строк не замедляют страницу.
+(function() {
+    const ROW_BUFFER = 30;           // Строк сверху и снизу от видимой области
+    const DEFAULT_ROW_HEIGHT = 33;   // Если высоту строки не удалось измерить
+
+    function cellText(value) {
+        return value === null || value === undefined ? '' : String(value);
+    }
+
+    function renderFacets(container, facets) {
+        if (!facets.length) {
+            return;
+        }
+        const row = document.createElement('div');
+        row.className = 'row mb-3';
+        facets.forEach(facet => {
+            const col = document.createElement('div');
+            col.className = 'col-md-3';
+            const title = document.createElement('h6');
+            title.textContent = facet.label || facet.field;
+            const list = document.createElement('ul');
+            list.className = 'list-unstyled small mb-0';
+            facet.values.forEach(item => {
+                const li = document.createElement('li');
+                if (item.query) {
+                    const link = document.createElement('a');
+                    link.href = `?${item.query}`;
+                    link.textContent = cellText(item.value);
+                    li.appendChild(link);
+                } else {
+                    const empty = document.createElement('span');
+                    empty.className = 'text-muted';
+                    empty.textContent = '(пусто)';
+                    li.appendChild(empty);
+                }
+                const badge = document.createElement('span');
+                badge.className = 'badge bg-secondary ms-1';
+                badge.textContent = item.count;
+                li.appendChild(badge);
+                list.appendChild(li);
+            });
+            col.appendChild(title);
+            col.appendChild(list);
+            row.appendChild(col);
+        });
+        container.appendChild(row);
+    }
+
+    function renderVirtualTable(container, columns, rows) {
+        const viewport = document.createElement('div');
+        viewport.style.maxHeight = '70vh';
+        viewport.style.overflow = 'auto';
+        const table = document.createElement('table');
+        table.className = 'table table-striped table-sm text-nowrap mb-0';
+        const headRow = table.createTHead().insertRow();
+        columns.forEach(col => {
+            const th = document.createElement('th');
+            th.textContent = col;
+            th.className = 'bg-white';
+            th.style.position = 'sticky';
+            th.style.top = '0';
+            headRow.appendChild(th);
+        });
+        const tbody = table.createTBody();
+        viewport.appendChild(table);
+        container.appendChild(viewport);
+
+        let rowHeight = 0;
+        let renderedFirst = -1;
+        let renderedLast = -1;
+
+        function spacer(height) {
+            const tr = document.createElement('tr');
+            const td = document.createElement('td');
+            td.colSpan = columns.length;
+            td.style.height = `${height}px`;
+            td.style.padding = '0';
+            td.style.border = '0';
+            tr.appendChild(td);
+            return tr;
+        }
+
+        function buildRow(row) {
+            const tr = document.createElement('tr');
+            row.forEach(value => {
+                const td = document.createElement('td');
+                td.textContent = cellText(value);
+                tr.appendChild(td);
+            });
+            return tr;
+        }
+
+        function draw() {
+            if (!rowHeight) {
+                // Высота строки — по первой строке (ячейки не переносятся: text-nowrap)
+                const probe = buildRow(rows[0]);
+                tbody.replaceChildren(probe);
+                rowHeight = probe.offsetHeight || DEFAULT_ROW_HEIGHT;
+            }
+            const visible = Math.ceil((viewport.clientHeight || window.innerHeight) / rowHeight);
+            let first = Math.max(0, Math.floor(viewport.scrollTop / rowHeight) - ROW_BUFFER);
+            first -= first % 2; // Начинаем с чётной строки — чередование цветов не «прыгает» при прокрутке
+            const last = Math.min(rows.length, first + visible + 2 * ROW_BUFFER);
+            if (first === renderedFirst && last === renderedLast) {
+                return;
+            }
+            renderedFirst = first;
+            renderedLast = last;
+
+            const fragment = document.createDocumentFragment();
+            fragment.appendChild(spacer(first * rowHeight));
+            for (let i = first; i < last; i++) {
+                fragment.appendChild(buildRow(rows[i]));
+            }
+            fragment.appendChild(spacer((rows.length - last) * rowHeight));
+            tbody.replaceChildren(fragment);
+        }
+
+        let scheduled = false;
+        function scheduleDraw() {
+            if (!scheduled) {
+                scheduled = true;
+                requestAnimationFrame(() => {
+                    scheduled = false;
+                    draw();
+                });
+            }
+        }
+        viewport.addEventListener('scroll', scheduleDraw);
+        window.addEventListener('resize', scheduleDraw);
+        draw();
+    }
+
+    // Загружает результаты по data-url контейнера и отрисовывает их в нём
+    window.loadSearchResults = function(container) {
+        const url = container.dataset.url;
+        if (!url) {
+            return;
+        }
+        container.textContent = 'Поиск...';
+        fetch(url, {headers: {'Accept': 'application/json'}})
+            .then(response => response.json())
+            .then(data => {
+                container.replaceChildren();
+                if (data.error) {
+                    const alert = document.createElement('div');
+                    alert.className = 'alert alert-warning';
+                    alert.textContent = data.error;
+                    container.appendChild(alert);
+                    return;
+                }
+                if (!data.searched) {
+                    container.textContent = 'Введите критерии поиска и нажмите "Поиск".';
+                    return;
+                }
+                const header = document.createElement('h2');
+                header.textContent = `Результаты: ${data.rows.length}`;
+                container.appendChild(header);
+                if (!data.rows.length) {
+                    const empty = document.createElement('p');
+                    empty.textContent = 'Ничего не найдено.';
+                    container.appendChild(empty);
+                    return;
+                }
+                renderFacets(container, data.facets || []);
+                renderVirtualTable(container, data.columns, data.rows);
+            })
+            .catch(error => {
+                console.error('Fetch error:', error);
+                container.textContent = 'Ошибка при получении результатов поиска.';
+            });
+    };
+})();